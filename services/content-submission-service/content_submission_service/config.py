@@ -13,6 +13,32 @@ class Settings(BaseSettings):
     RETRY_DELAY: int = 5  # seconds
     PORT: int = 8000
 
+    # In-flight dedupe window for repeated submissions of the same URL
+    DEDUPE_BACKEND: str = "memory"  # memory | sqlite
+    DEDUPE_TTL: int = 1800  # seconds
+    DEDUPE_SQLITE_PATH: str = "data/in_flight.db"
+    # the workers publish the keys of submissions that left the pipeline, done or parked
+    DEDUPE_RELEASE_QUEUE: str = "dedupe_release_queue"
+
+    # Bulk bookmark imports
+    IMPORT_DIR: str = "data/imports"  # uploaded exports and resume checkpoints
+    IMPORT_QUEUE: str = "classify_queue.bulk"  # bulk lane of the classify queue
+    NOTIFY_QUEUE: str = "notify_queue"
+    IMPORT_BATCH_SIZE: int = 100
+    # bulk lanes further down the pipeline, an import also pauses while one of them is
+    # deeper than IMPORT_MAX_QUEUE_DEPTH so the slow stages don't pile up a backlog
+    IMPORT_DOWNSTREAM_QUEUES: List[str] = [
+        "crawl_queue.bulk",
+        "transcribe_queue.bulk",
+        "summary_queue.bulk",
+        "embedding_queue.bulk",
+    ]
+    IMPORT_MAX_QUEUE_DEPTH: int = 500  # pause the import while a queue holds more
+    IMPORT_POLL_INTERVAL: int = 5  # seconds between queue depth checks while paused
+    IMPORT_MAX_BYTES: int = 50 * 1024 * 1024  # larger uploads are rejected
+    IMPORT_STALE_AFTER: int = 600  # seconds without a checkpoint before a running import
+    # counts as interrupted and can be resumed
+
     def parse_cors_origins(self, v: str | List[str]) -> List[str]:
         """Custom parser for CORS_ORIGINS."""
         if isinstance(v, str):
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict
+
+import aio_pika
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# query parameters that don't change which document a URL points to
+TRACKING_PARAMS = {"ref", "fbclid", "gclid", "mc_cid", "mc_eid"}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so that trivially different spellings map to the same key."""
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if (parsed.scheme == "http" and netloc.endswith(":80")) or (
+        parsed.scheme == "https" and netloc.endswith(":443")
+    ):
+        netloc = netloc.rsplit(":", 1)[0]
+
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.startswith("utm_") and k not in TRACKING_PARAMS
+    )
+
+    return urlunparse(
+        (
+            parsed.scheme.lower(),
+            netloc,
+            parsed.path.rstrip("/"),
+            parsed.params,
+            urlencode(query, doseq=True),
+            "",  # Drop fragment
+        )
+    )
+
+
+def idempotency_key(url: str) -> str:
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+class InFlightRegistry(ABC):
+    """Tracks idempotency keys of submissions that are still moving through the pipeline."""
+
+    @abstractmethod
+    def acquire(self, key: str, ttl: float) -> bool:
+        """Register the key for `ttl` seconds. Returns False if it is already in flight."""
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        """Forget the key, e.g. when publishing the submission failed."""
+
+
+class MemoryInFlightRegistry(InFlightRegistry):
+    """Process-local registry, only suitable for a single replica."""
+
+    def __init__(self):
+        self._entries: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._entries[key] = now + ttl
+            # opportunistically drop expired keys so the dict doesn't grow unbounded
+            if len(self._entries) > 1024:
+                self._entries = {k: v for k, v in self._entries.items() if v > now}
+            return True
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SQLiteInFlightRegistry(InFlightRegistry):
+    """Registry backed by a SQLite file, shared by replicas that mount the same volume."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS in_flight ("
+                " key TEXT PRIMARY KEY,"
+                " expires_at REAL NOT NULL)"
+            )
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            # insert the key, or take over an expired one, in a single atomic statement
+            cursor = self._conn.execute(
+                "INSERT INTO in_flight (key, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE in_flight.expires_at <= ?",
+                (key, now + ttl, now),
+            )
+            acquired = cursor.rowcount == 1
+            self._conn.execute("DELETE FROM in_flight WHERE expires_at <= ?", (now,))
+            return acquired
+
+    def release(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM in_flight WHERE key = ?", (key,))
+
+
+registry_backends = {
+    "memory": lambda: MemoryInFlightRegistry(),
+    "sqlite": lambda: SQLiteInFlightRegistry(settings.DEDUPE_SQLITE_PATH),
+}
+
+_registry: InFlightRegistry | None = None
+
+
+def get_registry() -> InFlightRegistry:
+    global _registry
+    if _registry is None:
+        backend = registry_backends.get(settings.DEDUPE_BACKEND)
+        if backend is None:
+            raise ValueError(f"Unknown dedupe backend: {settings.DEDUPE_BACKEND}")
+        logger.info(f"Using {settings.DEDUPE_BACKEND} in-flight registry")
+        _registry = backend()
+    return _registry
+
+
+async def release_message(message: aio_pika.abc.AbstractIncomingMessage) -> None:
+    async with message.process():
+        await asyncio.to_thread(get_registry().release, message.body.decode())
+
+
+async def consume_releases() -> None:
+    """Release the keys the workers publish once a submission left the pipeline."""
+    while True:
+        try:
+            connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+            async with connection:
+                channel = await connection.channel()
+                queue = await channel.declare_queue(settings.DEDUPE_RELEASE_QUEUE, durable=True)
+                await queue.consume(release_message)
+                await asyncio.Future()  # until cancelled on shutdown
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # keys still expire after DEDUPE_TTL while the queue can't be reached
+            logger.warning(f"Consuming {settings.DEDUPE_RELEASE_QUEUE} failed: {e}")
+            await asyncio.sleep(settings.RETRY_DELAY)
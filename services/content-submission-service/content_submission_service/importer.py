@@ -0,0 +1,305 @@
+"""
+Bulk import of bookmark exports.
+
+Netscape bookmark HTML (browsers, Raindrop), Pocket/Raindrop CSV and plain URL lists are
+parsed as a stream, normalized and deduped up front, and published in batches to the bulk
+lane of the classify queue. Publishing pauses while that queue or one of the bulk lanes
+further down the pipeline (IMPORT_DOWNSTREAM_QUEUES) is deeper than
+IMPORT_MAX_QUEUE_DEPTH, and progress is checkpointed after every batch so an interrupted
+import resumes where it stopped. The submitter gets one progress notification that is
+edited as the import advances instead of one per link.
+
+    python -m content_submission_service.importer bookmarks.html [--format html] [--resume ID]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .config import settings
+from .dedupe import get_registry, idempotency_key, normalize_url
+from .models import ContentSource
+from .utils import QueuePublisher, extract_url
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("html", "csv", "text")
+CSV_URL_COLUMNS = ("url", "link", "href")
+SNIFF_SIZE = 4096
+
+
+class _AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.hrefs.append(href)
+
+
+def parse_netscape(lines: Iterable[str]) -> Iterator[str]:
+    parser = _AnchorParser()
+    for line in lines:
+        parser.feed(line)
+        yield from parser.hrefs
+        parser.hrefs.clear()
+    parser.close()
+    yield from parser.hrefs
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[str]:
+    reader = csv.DictReader(lines)
+    columns = {name.strip().lower(): name for name in reader.fieldnames or []}
+    column = next((columns[name] for name in CSV_URL_COLUMNS if name in columns), None)
+    if column is None:
+        raise ValueError(f"CSV export has none of the columns {', '.join(CSV_URL_COLUMNS)}")
+    for row in reader:
+        if row.get(column):
+            yield row[column].strip()
+
+
+def parse_text(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        url = extract_url(line)
+        if url:
+            yield url
+
+
+parsers = {
+    "html": parse_netscape,
+    "csv": parse_csv,
+    "text": parse_text,
+}
+
+
+def detect_format(head: str) -> str:
+    """Guess the export format from the first bytes of the file."""
+    lowered = head.lstrip().lower()
+    if lowered.startswith("<!doctype netscape") or "<a " in lowered or "<dl" in lowered:
+        return "html"
+    first_line = lowered.split("\n", 1)[0]
+    if "," in first_line and any(name in first_line for name in CSV_URL_COLUMNS):
+        return "csv"
+    return "text"
+
+
+def iter_urls(path: str, format: Optional[str] = None) -> Iterator[str]:
+    """Yield the normalized URLs of an export, without duplicates, in file order."""
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        format = format or detect_format(f.read(SNIFF_SIZE))
+        f.seek(0)
+        seen = set()
+        for url in parsers[format](f):
+            if not url.startswith(("http://", "https://")):
+                continue
+            normalized = normalize_url(url)
+            if normalized not in seen:
+                seen.add(normalized)
+                yield normalized
+
+
+def checkpoint_path(import_id: str) -> str:
+    return os.path.join(settings.IMPORT_DIR, f"{import_id}.json")
+
+
+def load_checkpoint(import_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(checkpoint_path(import_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    path = checkpoint_path(checkpoint["import_id"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    checkpoint["updated_at"] = datetime.now(timezone.utc).isoformat()
+    # write and rename so a crash never leaves a half written checkpoint behind
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def new_checkpoint(
+    path: str,
+    format: Optional[str] = None,
+    source: Optional[ContentSource] = None,
+    uploaded: bool = False,
+) -> Dict[str, Any]:
+    return {
+        "import_id": uuid.uuid4().hex,
+        "path": path,
+        "uploaded": uploaded,  # the file is removed once the import completed
+        "format": format,
+        "source": source.model_dump() if source else None,
+        "status": "pending",
+        "position": 0,  # unique URLs handled so far, where a resumed import continues
+        "submitted": 0,
+        "in_flight": 0,  # already moving through the pipeline, skipped
+        "error": None,
+    }
+
+
+def is_running(checkpoint: Dict[str, Any]) -> bool:
+    """Whether the import is running now, an interrupted one stops checkpointing."""
+    if checkpoint["status"] != "running":
+        return False
+    updated_at = datetime.fromisoformat(checkpoint["updated_at"])
+    age = datetime.now(timezone.utc) - updated_at
+    return age.total_seconds() < settings.IMPORT_STALE_AFTER
+
+
+def progress_message(checkpoint: Dict[str, Any]) -> str:
+    text = (
+        f"Import {checkpoint['status']}: {checkpoint['submitted']} links submitted, "
+        f"{checkpoint['in_flight']} already in progress"
+    )
+    if checkpoint["error"]:
+        text += f"\nError: {checkpoint['error']}"
+    return text
+
+
+async def notify_progress(publisher: QueuePublisher, checkpoint: Dict[str, Any]) -> None:
+    """Publish the import's progress notification, edited in place by the notifier."""
+    if checkpoint["source"] is None:
+        logger.info(progress_message(checkpoint))
+        return
+    try:
+        await publisher.publish(
+            settings.NOTIFY_QUEUE,
+            {
+                "url": f"import:{checkpoint['import_id']}",
+                "status": "submitted",
+                "notification_type": "error" if checkpoint["error"] else "info",
+                "source": checkpoint["source"],
+                "message": progress_message(checkpoint),
+                "stream_id": f"import:{checkpoint['import_id']}",
+                "partial": checkpoint["status"] == "running",
+            },
+        )
+    except Exception as e:
+        logger.warning(f"Failed to publish import progress: {e}")
+
+
+async def wait_for_capacity(
+    publisher: QueuePublisher, checkpoint: Dict[str, Any], queue_names: List[str]
+) -> None:
+    """Wait until none of the queues holds IMPORT_MAX_QUEUE_DEPTH messages or more."""
+    while True:
+        depths = {name: await publisher.queue_depth(name) for name in queue_names}
+        queue_name = max(depths, key=lambda name: depths[name])
+        depth = depths[queue_name]
+        if depth < settings.IMPORT_MAX_QUEUE_DEPTH:
+            return
+        logger.info(f"{queue_name} holds {depth} messages, pausing import")
+        save_checkpoint(checkpoint)  # still running, see is_running
+        await asyncio.sleep(settings.IMPORT_POLL_INTERVAL)
+
+
+async def publish_batch(
+    publisher: QueuePublisher, checkpoint: Dict[str, Any], batch: List[str]
+) -> None:
+    registry = get_registry()
+    await wait_for_capacity(
+        publisher, checkpoint, [settings.IMPORT_QUEUE, *settings.IMPORT_DOWNSTREAM_QUEUES]
+    )
+    for url in batch:
+        key = idempotency_key(url)
+        if not await asyncio.to_thread(registry.acquire, key, settings.DEDUPE_TTL):
+            checkpoint["in_flight"] += 1
+            continue
+        try:
+            await publisher.publish(
+                settings.IMPORT_QUEUE,
+                {"content": url, "source": None, "idempotency_key": key},
+                # bulk items are scheduled per import, not per chat (see LaneConsumer)
+                {"x-lane": "bulk", "x-source-key": f"import:{checkpoint['import_id']}"},
+            )
+        except Exception:
+            await asyncio.to_thread(registry.release, key)
+            raise
+        checkpoint["submitted"] += 1
+    checkpoint["position"] += len(batch)
+    save_checkpoint(checkpoint)
+
+
+async def run_import(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    """Run or resume the import described by the checkpoint and return the final one."""
+    start = checkpoint["position"]
+    checkpoint["status"] = "running"
+    checkpoint["error"] = None
+    save_checkpoint(checkpoint)
+    logger.info(f"Importing {checkpoint['path']} as {checkpoint['import_id']} from {start}")
+
+    try:
+        async with QueuePublisher() as publisher:
+            await notify_progress(publisher, checkpoint)
+            try:
+                batch: List[str] = []
+                for index, url in enumerate(iter_urls(checkpoint["path"], checkpoint["format"])):
+                    if index < start:
+                        continue
+                    batch.append(url)
+                    if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                        await publish_batch(publisher, checkpoint, batch)
+                        await notify_progress(publisher, checkpoint)
+                        batch = []
+                if batch:
+                    await publish_batch(publisher, checkpoint, batch)
+                checkpoint["status"] = "completed"
+            except Exception as e:
+                logger.error(f"Import {checkpoint['import_id']} failed: {e}")
+                checkpoint["status"] = "failed"
+                checkpoint["error"] = str(e)
+            save_checkpoint(checkpoint)
+            await notify_progress(publisher, checkpoint)
+    except Exception as e:
+        # could not reach the queue at all, the import can be resumed later
+        logger.error(f"Import {checkpoint['import_id']} failed: {e}")
+        checkpoint["status"] = "failed"
+        checkpoint["error"] = str(e)
+        save_checkpoint(checkpoint)
+
+    if checkpoint["status"] == "completed" and checkpoint.get("uploaded"):
+        try:
+            os.remove(checkpoint["path"])
+        except FileNotFoundError:
+            pass
+
+    logger.info(progress_message(checkpoint))
+    return checkpoint
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a bookmark export into the pipeline")
+    parser.add_argument("path", nargs="?", help="bookmark HTML, CSV or URL list")
+    parser.add_argument("--format", choices=FORMATS, help="detected from the file if omitted")
+    parser.add_argument("--resume", metavar="IMPORT_ID", help="resume an interrupted import")
+    args = parser.parse_args()
+
+    if args.resume:
+        checkpoint = load_checkpoint(args.resume)
+        if checkpoint is None:
+            parser.error(f"no checkpoint for import {args.resume}")
+    elif args.path:
+        checkpoint = new_checkpoint(os.path.abspath(args.path), args.format)
+    else:
+        parser.error("a path or --resume is required")
+
+    logging.basicConfig(level=logging.INFO)
+    result = asyncio.run(run_import(checkpoint))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
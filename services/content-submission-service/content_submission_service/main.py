@@ -1,12 +1,23 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import settings
+from .dedupe import consume_releases
 from .routes import router
 
-app = FastAPI(title="Content Submission Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    releases = asyncio.create_task(consume_releases())
+    yield
+    releases.cancel()
+
+
+app = FastAPI(title="Content Submission Service", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -14,3 +14,5 @@ class ContentSource(BaseModel):
 class ContentSubmission(BaseModel):
     content: str
     source: Optional[ContentSource] = None
+    # set by the service, released by the workers when the content leaves the pipeline
+    idempotency_key: Optional[str] = None
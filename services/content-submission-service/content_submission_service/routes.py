@@ -1,10 +1,15 @@
 import asyncio
 import logging
+import os
+import uuid
+from typing import Literal, Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, BackgroundTasks, Request
 from fastapi.responses import JSONResponse
 from .config import settings
-from .models import ContentSubmission
+from .dedupe import get_registry, idempotency_key
+from .importer import is_running, load_checkpoint, new_checkpoint, run_import, save_checkpoint
+from .models import ContentSource, ContentSubmission, TelegramSource
 from .utils import publish_to_queue, extract_url
 
 router = APIRouter()
@@ -15,25 +20,46 @@ logger = logging.getLogger(__name__)
 
 @router.post("/submit")
 async def submit_content(submission: ContentSubmission):
+    acquired = None  # the key this request holds, released again if it fails
     try:
         # NOTE: for now just simply forward to classifier
         # in future, we can add more AI logic here to see if this is a command
         # or if we need to do something else with the content
-        if not extract_url(submission.content):
+        url = extract_url(submission.content)
+        if not url:
             return JSONResponse(
                 status_code=400, content={"detail": "Content does not contain a URL"}
             )
 
+        # the same URL is already moving through the pipeline, don't start another run
+        key = idempotency_key(url)
+        registry = get_registry()
+        if not await asyncio.to_thread(registry.acquire, key, settings.DEDUPE_TTL):
+            logger.info(f"Duplicate submission for in-flight URL: {url}")
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "message": "Content is already being processed",
+                    "status": "pending",
+                    "idempotency_key": key,
+                    "content": submission.model_dump_json(),
+                },
+            )
+        acquired = key
+
         queue_name = "classify_queue"
+        message = submission.model_copy(update={"idempotency_key": key}).model_dump()
 
         for attempt in range(settings.RETRY_ATTEMPTS):
             try:
-                await publish_to_queue(queue_name, submission.model_dump())
+                await publish_to_queue(queue_name, message)
                 logger.info(f"Content submitted to queue: {queue_name}")
                 break
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
                 if attempt == settings.RETRY_ATTEMPTS - 1:
+                    await asyncio.to_thread(registry.release, key)
+                    acquired = None
                     return JSONResponse(
                         status_code=503,
                         content={
@@ -47,11 +73,78 @@ async def submit_content(submission: ContentSubmission):
             content={
                 "message": "Content submitted successfully",
                 "status": "pending",
+                "idempotency_key": key,
                 "content": submission.model_dump_json(),
             },
         )
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
+        if acquired is not None:
+            # not submitted, the URL can be sent again right away
+            await asyncio.to_thread(get_registry().release, acquired)
+        return JSONResponse(status_code=500, content={"detail": "An unexpected error occurred"})
+
+
+@router.post("/import", status_code=202)
+async def import_bookmarks(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: Optional[Literal["html", "csv", "text"]] = None,
+    chat_id: Optional[str] = None,
+    message_id: Optional[str] = None,
+):
+    """Import a bookmark export sent as the raw request body, in the background."""
+    os.makedirs(settings.IMPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.IMPORT_DIR, f"{uuid.uuid4().hex}.upload")
+    # spool the upload to disk, large exports are never held in memory
+    size = 0
+    f = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.IMPORT_MAX_BYTES:
+                break
+            # file I/O in a thread, a slow disk must not stall the event loop
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    if size > settings.IMPORT_MAX_BYTES:
+        await asyncio.to_thread(os.remove, path)
         return JSONResponse(
-            status_code=500, content={"detail": "An unexpected error occurred"}
+            status_code=413,
+            content={"detail": f"Export larger than {settings.IMPORT_MAX_BYTES} bytes"},
         )
+
+    source = None
+    if chat_id and message_id:
+        source = ContentSource(telegram=TelegramSource(chat_id=chat_id, message_id=message_id))
+    checkpoint = new_checkpoint(path, format, source, uploaded=True)
+    # marked running before the task starts, so a resume can't start a second run
+    checkpoint["status"] = "running"
+    save_checkpoint(checkpoint)
+    background_tasks.add_task(run_import, checkpoint)
+    logger.info(f"Started import {checkpoint['import_id']}")
+    return checkpoint
+
+
+@router.get("/import/{import_id}")
+async def import_status(import_id: str):
+    checkpoint = load_checkpoint(import_id)
+    if checkpoint is None:
+        return JSONResponse(status_code=404, content={"detail": "Import not found"})
+    return checkpoint
+
+
+@router.post("/import/{import_id}/resume", status_code=202)
+async def resume_import(import_id: str, background_tasks: BackgroundTasks):
+    checkpoint = load_checkpoint(import_id)
+    if checkpoint is None:
+        return JSONResponse(status_code=404, content={"detail": "Import not found"})
+    if checkpoint["status"] == "completed":
+        return JSONResponse(status_code=409, content={"detail": "Import already completed"})
+    if is_running(checkpoint):
+        return JSONResponse(status_code=409, content={"detail": "Import is already running"})
+    checkpoint["status"] = "running"
+    save_checkpoint(checkpoint)
+    background_tasks.add_task(run_import, checkpoint)
+    return checkpoint
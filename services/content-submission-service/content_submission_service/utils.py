@@ -1,7 +1,10 @@
 import json
 import re
+from datetime import datetime, timezone
+from typing import Optional
 
 import aio_pika
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
 
 from .config import settings
 
@@ -16,11 +19,55 @@ async def publish_to_queue(queue_name: str, message: dict):
             aio_pika.Message(
                 body=json.dumps(message).encode(),
                 delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                # lets the workers measure end-to-end latency per lane
+                timestamp=datetime.now(timezone.utc),
             ),
             routing_key=queue_name,
         )
 
 
+class QueuePublisher:
+    """Keeps one connection open to publish many messages, e.g. during a bulk import."""
+
+    def __init__(self):
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channel: Optional[AbstractChannel] = None
+        self.declared: set[str] = set()
+
+    async def __aenter__(self) -> "QueuePublisher":
+        self.connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        self.channel = await self.connection.channel()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+    async def _declare(self, queue_name: str):
+        assert self.channel is not None
+        queue = await self.channel.declare_queue(queue_name, durable=True)
+        self.declared.add(queue_name)
+        return queue
+
+    async def publish(self, queue_name: str, message: dict, headers: dict | None = None):
+        assert self.channel is not None
+        if queue_name not in self.declared:
+            await self._declare(queue_name)
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(message).encode(),
+                headers=headers or {},
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                timestamp=datetime.now(timezone.utc),
+            ),
+            routing_key=queue_name,
+        )
+
+    async def queue_depth(self, queue_name: str) -> int:
+        queue = await self._declare(queue_name)
+        return queue.declaration_result.message_count or 0
+
+
 def extract_url(content: str) -> str | None:
     # Simple regex to extract URLs
     url_pattern = re.compile(
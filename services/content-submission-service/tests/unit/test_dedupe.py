@@ -0,0 +1,100 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from content_submission_service.dedupe import (
+    MemoryInFlightRegistry,
+    SQLiteInFlightRegistry,
+    idempotency_key,
+    normalize_url,
+    release_message,
+)
+from content_submission_service.main import app
+from content_submission_service.models import ContentSubmission
+
+client = TestClient(app)
+
+
+def test_normalize_url():
+    assert (
+        normalize_url("HTTPS://Example.com:443/post/?utm_source=x&b=2&a=1#comments")
+        == "https://example.com/post?a=1&b=2"
+    )
+
+
+def test_idempotency_key_ignores_tracking_params():
+    assert idempotency_key("https://example.com/a") == idempotency_key(
+        "https://example.com/a/?utm_campaign=news"
+    )
+    assert idempotency_key("https://example.com/a") != idempotency_key("https://example.com/b")
+
+
+def test_memory_registry_ttl():
+    registry = MemoryInFlightRegistry()
+    assert registry.acquire("key", ttl=60)
+    assert not registry.acquire("key", ttl=60)
+    registry.release("key")
+    assert registry.acquire("key", ttl=60)
+    assert registry.acquire("expired", ttl=-1)
+    assert registry.acquire("expired", ttl=60)
+
+
+def test_sqlite_registry_shared_between_instances(tmp_path):
+    path = str(tmp_path / "in_flight.db")
+    first = SQLiteInFlightRegistry(path)
+    second = SQLiteInFlightRegistry(path)
+    assert first.acquire("key", ttl=60)
+    assert not second.acquire("key", ttl=60)
+    second.release("key")
+    assert first.acquire("key", ttl=60)
+    assert first.acquire("expired", ttl=-1)
+    assert second.acquire("expired", ttl=60)
+
+
+@patch("content_submission_service.routes.get_registry")
+@patch("content_submission_service.routes.publish_to_queue")
+def test_duplicate_submission_is_pending(mock_publish, mock_registry):
+    mock_registry.return_value = MemoryInFlightRegistry()
+    mock_publish.return_value = None
+
+    first = client.post("/submit", json={"content": "https://example.com/post"})
+    second = client.post("/submit", json={"content": "look https://example.com/post/"})
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json()["status"] == "pending"
+    assert second.json()["idempotency_key"] == first.json()["idempotency_key"]
+    mock_publish.assert_called_once()
+
+
+@patch("content_submission_service.routes.get_registry")
+@patch("content_submission_service.routes.publish_to_queue")
+def test_submission_carries_key_and_failure_releases_it(mock_publish, mock_registry):
+    registry = MemoryInFlightRegistry()
+    mock_registry.return_value = registry
+    mock_publish.return_value = None
+
+    response = client.post("/submit", json={"content": "https://example.com/carried"})
+
+    key = response.json()["idempotency_key"]
+    assert mock_publish.call_args.args[1]["idempotency_key"] == key
+    registry.release(key)
+
+    # fails after the key was acquired
+    with patch.object(ContentSubmission, "model_copy", side_effect=RuntimeError):
+        response = client.post("/submit", json={"content": "https://example.com/carried"})
+    assert response.status_code == 500
+    assert registry.acquire(key, ttl=60)
+
+
+async def test_release_message_releases_key():
+    registry = MemoryInFlightRegistry()
+    assert registry.acquire("key", ttl=60)
+    message = MagicMock(body=b"key")
+    message.process.return_value.__aenter__ = AsyncMock()
+    message.process.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch("content_submission_service.dedupe.get_registry", return_value=registry):
+        await release_message(message)
+
+    assert registry.acquire("key", ttl=60)
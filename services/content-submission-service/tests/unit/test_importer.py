@@ -0,0 +1,211 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from content_submission_service import importer
+from content_submission_service.dedupe import MemoryInFlightRegistry
+from content_submission_service.main import app
+
+client = TestClient(app)
+
+BOOKMARKS_HTML = """<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<DL><p>
+    <DT><H3>Reading</H3>
+    <DL><p>
+        <DT><A HREF="https://example.com/a?utm_source=x" ADD_DATE="1">A</A>
+        <DT><A HREF="https://example.com/b">B</A>
+        <DT><A HREF="https://Example.com/a/">A again</A>
+        <DT><A HREF="javascript:void(0)">bookmarklet</A>
+    </DL><p>
+</DL><p>
+"""
+
+POCKET_CSV = """title,url,time_added,tags
+A,https://example.com/a,1,
+B,https://example.com/b,2,news
+"""
+
+
+class FakePublisher:
+    def __init__(self):
+        self.published = []
+        self.depths = {}
+        self.checked = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def publish(self, queue_name, message, headers=None):
+        self.published.append((queue_name, message, headers))
+
+    async def queue_depth(self, queue_name):
+        # a queue is deep until it is checked once
+        self.checked.append(queue_name)
+        return self.depths.pop(queue_name, 0)
+
+
+@pytest.fixture
+def import_dir(tmp_path):
+    with patch.object(importer.settings, "IMPORT_DIR", str(tmp_path)):
+        yield tmp_path
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_detect_format():
+    assert importer.detect_format(BOOKMARKS_HTML) == "html"
+    assert importer.detect_format(POCKET_CSV) == "csv"
+    assert importer.detect_format("https://example.com/a\nhttps://example.com/b\n") == "text"
+
+
+def test_iter_urls_normalizes_and_dedupes(tmp_path):
+    assert list(importer.iter_urls(write(tmp_path, "bookmarks.html", BOOKMARKS_HTML))) == [
+        "https://example.com/a",
+        "https://example.com/b",
+    ]
+    assert list(importer.iter_urls(write(tmp_path, "pocket.csv", POCKET_CSV))) == [
+        "https://example.com/a",
+        "https://example.com/b",
+    ]
+
+
+def test_csv_without_url_column(tmp_path):
+    with pytest.raises(ValueError):
+        list(importer.iter_urls(write(tmp_path, "export.csv", "title,tags\nA,x\n"), "csv"))
+
+
+async def test_run_import_resumes_from_checkpoint(import_dir):
+    urls = "\n".join(f"https://example.com/{i}" for i in range(5))
+    checkpoint = importer.new_checkpoint(write(import_dir, "urls.txt", urls))
+    checkpoint["position"] = 2
+    publisher = FakePublisher()
+
+    with (
+        patch.object(importer.settings, "IMPORT_BATCH_SIZE", 2),
+        patch.object(importer, "QueuePublisher", lambda: publisher),
+        patch.object(importer, "get_registry", lambda: MemoryInFlightRegistry()),
+    ):
+        result = await importer.run_import(checkpoint)
+
+    assert result["status"] == "completed"
+    assert result["position"] == 5
+    assert result["submitted"] == 3
+    assert [message["content"] for _, message, _ in publisher.published] == [
+        "https://example.com/2",
+        "https://example.com/3",
+        "https://example.com/4",
+    ]
+    queue_name, _, headers = publisher.published[0]
+    assert queue_name == "classify_queue.bulk"
+    assert headers["x-lane"] == "bulk"
+    assert importer.load_checkpoint(checkpoint["import_id"])["status"] == "completed"
+
+
+async def test_run_import_skips_in_flight_and_notifies_once(import_dir):
+    registry = MemoryInFlightRegistry()
+    registry.acquire(importer.idempotency_key("https://example.com/a"), ttl=60)
+    source = importer.ContentSource.model_validate(
+        {"telegram": {"chat_id": "1", "message_id": "2"}}
+    )
+    checkpoint = importer.new_checkpoint(
+        write(import_dir, "bookmarks.html", BOOKMARKS_HTML), source=source
+    )
+    publisher = FakePublisher()
+
+    with (
+        patch.object(importer, "QueuePublisher", lambda: publisher),
+        patch.object(importer, "get_registry", lambda: registry),
+    ):
+        result = await importer.run_import(checkpoint)
+
+    assert result["submitted"] == 1
+    assert result["in_flight"] == 1
+    notifications = [
+        message for queue, message, _ in publisher.published if queue == "notify_queue"
+    ]
+    assert {message["stream_id"] for message in notifications} == {
+        f"import:{checkpoint['import_id']}"
+    }
+    assert not notifications[-1]["partial"]
+    assert "1 links submitted" in notifications[-1]["message"]
+
+
+async def test_run_import_pauses_on_deep_downstream_queue(import_dir):
+    checkpoint = importer.new_checkpoint(write(import_dir, "urls.txt", "https://example.com/a\n"))
+    publisher = FakePublisher()
+    publisher.depths["summary_queue.bulk"] = importer.settings.IMPORT_MAX_QUEUE_DEPTH
+
+    with (
+        patch.object(importer, "QueuePublisher", lambda: publisher),
+        patch.object(importer, "get_registry", lambda: MemoryInFlightRegistry()),
+        patch.object(importer.settings, "IMPORT_POLL_INTERVAL", 0),
+    ):
+        result = await importer.run_import(checkpoint)
+
+    assert result["submitted"] == 1
+    # checked every queue twice, paused once for the summary lane
+    assert publisher.checked.count("classify_queue.bulk") == 2
+    assert publisher.checked.count("summary_queue.bulk") == 2
+    assert "embedding_queue.bulk" in publisher.checked
+
+
+async def test_completed_upload_is_removed(import_dir):
+    path = write(import_dir, "export.upload", "https://example.com/a\n")
+    checkpoint = importer.new_checkpoint(path, uploaded=True)
+
+    with (
+        patch.object(importer, "QueuePublisher", FakePublisher),
+        patch.object(importer, "get_registry", lambda: MemoryInFlightRegistry()),
+    ):
+        result = await importer.run_import(checkpoint)
+
+    assert result["status"] == "completed"
+    assert not os.path.exists(path)
+
+
+def test_resume_rejects_running_import(import_dir):
+    checkpoint = importer.new_checkpoint(write(import_dir, "urls.txt", "https://example.com/a"))
+    checkpoint["status"] = "running"
+    importer.save_checkpoint(checkpoint)
+
+    with patch("content_submission_service.routes.run_import") as mock_run:
+        response = client.post(f"/import/{checkpoint['import_id']}/resume")
+        assert response.status_code == 409
+        mock_run.assert_not_called()
+
+        # an interrupted import stopped checkpointing, it can be resumed
+        with patch.object(importer.settings, "IMPORT_STALE_AFTER", 0):
+            response = client.post(f"/import/{checkpoint['import_id']}/resume")
+        assert response.status_code == 202
+        mock_run.assert_called_once()
+
+
+def test_import_rejects_large_upload(import_dir):
+    with (
+        patch.object(importer.settings, "IMPORT_MAX_BYTES", 10),
+        patch("content_submission_service.routes.run_import") as mock_run,
+    ):
+        response = client.post("/import", content=b"https://example.com/a\n")
+
+    assert response.status_code == 413
+    mock_run.assert_not_called()
+    assert os.listdir(import_dir) == []
+
+
+def test_import_spools_upload(import_dir):
+    with patch("content_submission_service.routes.run_import") as mock_run:
+        response = client.post("/import", content=b"https://example.com/a\n")
+
+    assert response.status_code == 202
+    mock_run.assert_called_once()
+    with open(response.json()["path"], "rb") as f:
+        assert f.read() == b"https://example.com/a\n"
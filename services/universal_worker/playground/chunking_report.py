@@ -0,0 +1,121 @@
+"""
+Chunk counts and vector storage of the structure-aware chunker (embedding_processor/
+chunker.py) against the 500 / 50 character RecursiveCharacterTextSplitter the embedding
+stage used before, on a synthetic corpus per content type or on given markdown files:
+
+    python playground/chunking_report.py
+    python playground/chunking_report.py --content-type publication paper.md other.md
+
+Storage is estimated per langchain_pg_embedding row: the float32 vector, the chunk text,
+its metadata and ~60 bytes of row overhead. Without langchain installed the old splitter
+is approximated by 500 character windows with 50 characters of overlap.
+"""
+
+import argparse
+import json
+import random
+from typing import Dict, List
+
+from universal_worker.config import settings
+from universal_worker.models import ContentType
+from universal_worker.processors.embedding_processor.chunker import chunk_content
+from universal_worker.processors.embedding_processor.evaluation import character_splits
+from universal_worker.utils.tokens import EMBEDDING_ENCODING, count_tokens
+
+ROW_OVERHEAD = 60  # bytes: tuple header, id, collection id
+WORDS = (
+    "the pipeline stores every summary and its chunks in a vector index so questions about "
+    "saved articles papers and videos can be answered from the most relevant passages"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(8, 24))).capitalize() + "."
+
+
+def paragraph(rng: random.Random) -> str:
+    return " ".join(sentence(rng) for _ in range(rng.randint(2, 7)))
+
+
+def make_markdown(rng: random.Random, sections: int) -> str:
+    lines = ["# Title"]
+    for section in range(sections):
+        lines.append(f"## Section {section}")
+        for subsection in range(rng.randint(0, 3)):
+            lines.append(f"### Part {section}.{subsection}")
+            lines.extend(paragraph(rng) for _ in range(rng.randint(1, 4)))
+            if rng.random() < 0.3:
+                lines.append("```python\n" + "\n".join(f"x{i} = {i}" for i in range(8)) + "\n```")
+            if rng.random() < 0.3:
+                lines.append("\n".join(f"- {sentence(rng)}" for _ in range(4)))
+    return "\n\n".join(lines)
+
+
+def make_transcript(rng: random.Random, words: int) -> str:
+    # auto-generated captions, no punctuation
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def corpus() -> Dict[ContentType, List[str]]:
+    rng = random.Random(1)
+    return {
+        ContentType.WEB_ARTICLE: [make_markdown(rng, rng.randint(3, 8)) for _ in range(50)],
+        ContentType.PUBLICATION: [make_markdown(rng, rng.randint(10, 20)) for _ in range(20)],
+        ContentType.YOUTUBE_VIDEO: [
+            make_transcript(rng, rng.randint(1500, 8000)) for _ in range(20)
+        ],
+    }
+
+
+def storage(texts: List[str], metadata: List[dict]) -> int:
+    vector = 4 * settings.EMBEDDING_DIMENSIONS + 8
+    return sum(
+        vector + len(text.encode()) + len(json.dumps(meta)) + ROW_OVERHEAD
+        for text, meta in zip(texts, metadata)
+    )
+
+
+def report(content_type: ContentType, documents: List[str]) -> None:
+    old_texts: List[str] = []
+    new_texts: List[str] = []
+    new_metadata: List[dict] = []
+    for document in documents:
+        old_texts += character_splits(document)
+        for index, chunk in enumerate(chunk_content(document, content_type)):
+            new_texts.append(chunk.embedded_text)
+            new_metadata.append({"kind": "content", "chunk": index, "headings": chunk.headings})
+    base_metadata = {"source": "https://example.com/some/article", "content_id": "0" * 36}
+    old_metadata = [base_metadata] * len(old_texts)
+    new_metadata = [{**base_metadata, **meta} for meta in new_metadata]
+
+    old_bytes = storage(old_texts, old_metadata)
+    new_bytes = storage(new_texts, new_metadata)
+    old_tokens = sum(count_tokens(text, EMBEDDING_ENCODING) for text in old_texts)
+    new_tokens = sum(count_tokens(text, EMBEDDING_ENCODING) for text in new_texts)
+    print(
+        f"{content_type.value:<14} {len(documents):4} docs  "
+        f"chunks {len(old_texts):6} -> {len(new_texts):6} "
+        f"({1 - len(new_texts) / len(old_texts):.0%} fewer)  "
+        f"storage {old_bytes / 1e6:6.1f} -> {new_bytes / 1e6:6.1f} MB "
+        f"({1 - new_bytes / old_bytes:.0%} less)  "
+        f"embedded tokens {old_tokens} -> {new_tokens}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*", help="markdown files (default: synthetic corpus)")
+    parser.add_argument(
+        "--content-type", default="web_article", choices=[t.value for t in ContentType]
+    )
+    args = parser.parse_args()
+
+    if args.files:
+        documents = []
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                documents.append(f.read())
+        report(ContentType(args.content_type), documents)
+    else:
+        for content_type, documents in corpus().items():
+            report(content_type, documents)
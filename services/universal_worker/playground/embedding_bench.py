@@ -0,0 +1,108 @@
+"""
+Throughput of an embedding backend on chunks shaped like the embedding stage's splits,
+and optionally of the whole path into pgvector. The hashing backend needs no network, so
+this load-tests the vector store without paying for embeddings:
+
+    python playground/embedding_bench.py
+    python playground/embedding_bench.py --chunks 50000 --batch-sizes 64 256 1024
+    python playground/embedding_bench.py --store --collection pkms_bench  # needs VECTOR_DB_*
+
+The stored chunks are left in the collection's table, use a throwaway one.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from universal_worker.config import settings
+from universal_worker.processors.embedding_processor.backends import (
+    HashingBackend,
+    embedding_backends,
+    get_embedding_backend,
+)
+
+WORDS = (
+    "pipeline worker summary queue markdown vector embedding chunk transcript crawler "
+    "paper result method model latency throughput index storage retrieval question"
+).split()
+
+
+def make_chunks(count: int, size: int) -> list:
+    random.seed(1)
+    chunks = []
+    for _ in range(count):
+        words = []
+        while sum(map(len, words)) + len(words) < size:
+            words.append(random.choice(WORDS))
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def bench_embed(backend_name: str, chunks: list, batch_sizes: list) -> None:
+    for batch_size in batch_sizes:
+        if backend_name == "hashing":
+            backend = HashingBackend(settings.EMBEDDING_DIMENSIONS, batch_size)
+        else:
+            backend = embedding_backends[backend_name](
+                settings.EMBEDDING_DIMENSIONS, batch_size, settings.EMBEDDING_MODEL
+            )
+        started_at = time.perf_counter()
+        vectors = backend.embed_documents(chunks)
+        elapsed = time.perf_counter() - started_at
+        megabytes = sum(map(len, chunks)) / 1e6
+        print(
+            f"{backend_name:<8} batch {batch_size:5}  {len(chunks) / elapsed:9.0f} chunks/s "
+            f"{megabytes / elapsed:7.1f} MB/s  ({len(vectors)} x {len(vectors[0])})"
+        )
+
+
+def check_similarity(chunks: list) -> None:
+    """Near duplicates score higher than unrelated chunks (lexical overlap only)."""
+    backend = HashingBackend(settings.EMBEDDING_DIMENSIONS, settings.EMBEDDING_BATCH_SIZE)
+    edited = chunks[0].replace(WORDS[0], "pipelines", 1) + " appended words"
+    a, b, c = np.array(backend.embed_documents([chunks[0], edited, "unrelated text entirely"]))
+    print(f"cosine near duplicate {a @ b:.3f}, unrelated {a @ c:.3f}")
+
+
+def bench_store(chunks: list, collection: str) -> None:
+    from langchain_core.documents import Document
+
+    from universal_worker.processors.embedding_processor.vector_store import get_vector_store
+
+    documents = [
+        Document(page_content=chunk, metadata={"source": "bench", "content_id": str(i % 100)})
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def store() -> None:
+        vector_store = get_vector_store(collection)
+        try:
+            vectors = get_embedding_backend().embed_documents(chunks)
+            await vector_store.add(documents, vectors)
+        finally:
+            await vector_store.close()
+
+    started_at = time.perf_counter()
+    asyncio.run(store())
+    elapsed = time.perf_counter() - started_at
+    print(f"pgvector {settings.EMBEDDING_BACKEND}  {len(chunks) / elapsed:9.0f} chunks/s stored")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="hashing", choices=sorted(embedding_backends))
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=500, help="characters")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 256, 1024])
+    parser.add_argument("--store", action="store_true", help="also add them to pgvector")
+    parser.add_argument("--collection", default="pkms_bench")
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks, args.chunk_size)
+    bench_embed(args.backend, chunks, args.batch_sizes)
+    check_similarity(chunks)
+    if args.store:
+        settings.EMBEDDING_BACKEND = args.backend
+        bench_store(chunks, args.collection)
@@ -0,0 +1,86 @@
+"""
+Startup import time and memory of a worker per PROCESSOR_NAME: each processor is loaded
+in a fresh interpreter the way main.py does (lazily, only its own implementation), and
+again with every processor imported, as the worker did before processors were resolved
+from their dotted paths.
+
+    python playground/import_bench.py
+    python playground/import_bench.py --runs 5 crawler notifier
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, resource, sys, time
+started_at = time.perf_counter()
+from universal_worker.workflow_config import WorkflowConfig
+config = WorkflowConfig()
+names = list(config.processor_specs) if sys.argv[2] == "eager" else [sys.argv[1]]
+for name in names:
+    config.processors[name].implementation
+elapsed = time.perf_counter() - started_at
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on linux
+print(json.dumps({"seconds": elapsed, "rss_mb": rss, "modules": len(sys.modules)}))
+"""
+
+
+def measure(processor_name: str, mode: str, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD, processor_name, mode],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr else "failed"
+            return {"error": error}
+        samples.append(json.loads(result.stdout))
+    return {
+        "seconds": statistics.median(sample["seconds"] for sample in samples),
+        "rss_mb": statistics.median(sample["rss_mb"] for sample in samples),
+        "modules": samples[0]["modules"],
+    }
+
+
+def main(processor_names: list, runs: int) -> None:
+    if not processor_names:
+        from universal_worker.workflow_config import WorkflowConfig
+
+        processor_names = list(WorkflowConfig().processor_specs)
+
+    eager = measure(processor_names[0], "eager", runs)
+    if "error" in eager:
+        print(f"all processors: {eager['error']}")
+    else:
+        print(
+            f"{'all processors':<16} {eager['seconds'] * 1000:7.0f} ms "
+            f"{eager['rss_mb']:7.1f} MB {eager['modules']:6} modules"
+        )
+    for name in processor_names:
+        lazy = measure(name, "lazy", runs)
+        if "error" in lazy:
+            print(f"{name:<16} {lazy['error']}")
+            continue
+        line = (
+            f"{name:<16} {lazy['seconds'] * 1000:7.0f} ms {lazy['rss_mb']:7.1f} MB "
+            f"{lazy['modules']:6} modules"
+        )
+        if "error" not in eager:
+            line += (
+                f"   -{(1 - lazy['seconds'] / eager['seconds']):.0%} time, "
+                f"-{eager['rss_mb'] - lazy['rss_mb']:.1f} MB"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("processors", nargs="*", help="processor names (default: all)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    main(args.processors, args.runs)
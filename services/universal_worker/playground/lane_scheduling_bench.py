@@ -0,0 +1,75 @@
+"""
+Simulates one stage of the pipeline while a user bulk imports 2,000 bookmarks and other
+users keep submitting interactively, and compares the interactive wait time of a single
+FIFO queue with the weighted lanes of `LaneScheduler`.
+
+    python playground/lane_scheduling_bench.py
+"""
+
+import random
+from collections import deque
+
+from universal_worker.lanes import BULK_LANE, INTERACTIVE_LANE, LaneScheduler
+
+SERVICE_TIME = 2.0  # seconds per item in the stage
+BULK_ITEMS = 2000
+INTERACTIVE_EVERY = 30.0  # seconds between interactive submissions
+DURATION = 3600.0
+
+
+def arrivals():
+    random.seed(42)
+    items = [(0.0, BULK_LANE, "importer") for _ in range(BULK_ITEMS)]
+    t = 0.0
+    while t < DURATION:
+        t += random.expovariate(1 / INTERACTIVE_EVERY)
+        items.append((t, INTERACTIVE_LANE, f"chat-{random.randint(1, 5)}"))
+    return sorted(items, key=lambda item: item[0])
+
+
+def simulate(put, get):
+    pending = deque(arrivals())
+    waits = {INTERACTIVE_LANE: [], BULK_LANE: []}
+    now = 0.0
+    while True:
+        while pending and pending[0][0] <= now:
+            arrived_at, lane, source = pending.popleft()
+            put(lane, source, arrived_at)
+        item = get()
+        if item is None:
+            if not pending:
+                return waits
+            now = pending[0][0]
+            continue
+        lane, arrived_at = item
+        waits[lane].append(now - arrived_at)
+        now += SERVICE_TIME
+
+
+def p95(values):
+    values = sorted(values)
+    return values[int(0.95 * (len(values) - 1))] if values else float("nan")
+
+
+def main():
+    fifo = deque()
+    fifo_waits = simulate(
+        lambda lane, source, at: fifo.append((lane, at)),
+        lambda: fifo.popleft() if fifo else None,
+    )
+
+    scheduler = LaneScheduler({INTERACTIVE_LANE: 8, BULK_LANE: 1})
+    lane_waits = simulate(
+        lambda lane, source, at: scheduler.put(lane, source, at),
+        scheduler.get,
+    )
+
+    for name, waits in (("fifo", fifo_waits), ("lanes 8:1", lane_waits)):
+        print(
+            f"{name:>10}: interactive p95 wait {p95(waits[INTERACTIVE_LANE]):8.1f}s, "
+            f"bulk p95 wait {p95(waits[BULK_LANE]):8.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
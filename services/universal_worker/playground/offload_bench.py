@@ -0,0 +1,105 @@
+"""
+Measures the event loop lag while messages with multi-MB content are processed
+concurrently, with the CPU-bound steps (unwrapping the code block of the cleaned
+markdown, chunking it for the embedding stage) run inline on the loop versus
+offloaded to the process pool of utils/offload.py. Decoding the message is left out, it
+stays on the loop either way (pickling a parsed message for another process costs as
+much as parsing it).
+
+The lag is how late a 5 ms ticker wakes up; that is the delay every other coroutine
+(heartbeats, acks, streamed summaries) sees.
+
+    python playground/offload_bench.py
+    python playground/offload_bench.py --size-mb 8 --messages 40 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from universal_worker.config import settings
+from universal_worker.models import ContentType
+from universal_worker.processors.embedding_processor.chunker import chunk_content
+from universal_worker.utils.offload import get_process_pool, run_cpu, shutdown
+from universal_worker.utils.text import first_codeblock_span, remove_span
+
+TICK = 0.005  # seconds
+
+
+def make_markdown(size: int) -> str:
+    random.seed(1)
+    words = ["pipeline", "worker", "summary", "é", "queue", "markdown", "vector", "\"quoted\""]
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = " ".join(random.choices(words, k=120))
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    # an LLM answer wrapping the cleaned markdown in a code block, followed by a note
+    return "```markdown\n" + "\n\n".join(paragraphs) + "\n```\n\n" + paragraphs[0]
+
+
+async def process(markdown: str) -> None:
+    markdown = remove_span(markdown, await run_cpu(first_codeblock_span, markdown))
+    await run_cpu(chunk_content, markdown, ContentType.WEB_ARTICLE, size=len(markdown))
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started_at - TICK)
+
+
+async def run(markdown: str, messages: int, concurrency: int) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with slots:
+            await process(markdown)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(messages)))
+    elapsed = time.perf_counter() - started_at
+    stop.set()
+    await tick_task
+    lags.sort()
+    return {
+        "throughput": messages / elapsed,
+        "p50": statistics.median(lags) * 1000,
+        "p99": lags[int(0.99 * (len(lags) - 1))] * 1000,
+        "max": lags[-1] * 1000,
+    }
+
+
+async def main(size_mb: float, messages: int, concurrency: int) -> None:
+    markdown = make_markdown(int(size_mb * 1024 * 1024))
+    print(f"{messages} messages of {len(markdown) / 1e6:.1f} MB, concurrency {concurrency}")
+
+    workers = settings.OFFLOAD_WORKERS or 2
+    for label, pool_workers in (("inline", 0), (f"pool ({workers} workers)", workers)):
+        settings.OFFLOAD_WORKERS = pool_workers
+        if pool_workers:
+            get_process_pool()
+            await run(markdown, 2, concurrency)  # start and warm up the pool processes
+        result = await run(markdown, messages, concurrency)
+        print(
+            f"{label:<18} {result['throughput']:6.1f} msg/s   loop lag "
+            f"p50 {result['p50']:7.1f} ms  p99 {result['p99']:7.1f} ms  "
+            f"max {result['max']:7.1f} ms"
+        )
+    shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--messages", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.size_mb, args.messages, args.concurrency))
@@ -0,0 +1,72 @@
+"""
+Recall@k, MRR, build time, query latency and storage of embedding configurations, see
+embedding_processor/evaluation.py. Runs offline with the hashing backend by default:
+
+    python playground/retrieval_eval.py
+    python playground/retrieval_eval.py --source db --queries-per-document 3
+    python playground/retrieval_eval.py --backend openai --configs structure structure-512d
+
+The hashing backend only measures lexical overlap; compare configurations with it, not
+absolute recall with the OpenAI embeddings.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+
+from universal_worker.processors.embedding_processor.evaluation import (
+    EvalConfig,
+    evaluate,
+    load_documents,
+    make_queries,
+    synthetic_documents,
+)
+
+CONFIGS = {
+    config.name: config
+    for config in [
+        EvalConfig("chars-500", chunker="character"),
+        EvalConfig("structure"),
+        EvalConfig("structure-256", max_tokens=256, overlap=32),
+        EvalConfig("structure-800", max_tokens=800, overlap=80),
+        EvalConfig("structure-512d", dimensions=512),
+        EvalConfig("structure-256d", dimensions=256),
+    ]
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["synthetic", "db"], default="synthetic")
+    parser.add_argument("--documents", type=int, default=300, help="corpus size (limit for db)")
+    parser.add_argument("--queries-per-document", type=int, default=2)
+    parser.add_argument("--backend", default="hashing", choices=["hashing", "openai"])
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    args = parser.parse_args()
+
+    if args.source == "db":
+        documents = asyncio.run(load_documents(args.documents))
+    else:
+        documents = synthetic_documents(args.documents)
+    queries = make_queries(documents, args.queries_per_document)
+    print(f"{len(documents)} documents, {len(queries)} queries, {args.backend} embeddings\n")
+
+    recall_header = " ".join(f"{f'R@{k}':>6}" for k in args.k)
+    print(
+        f"{'config':<16} {'chunks':>7} {recall_header} {'MRR':>6} {'build s':>8} "
+        f"{'p50 ms':>7} {'p95 ms':>7} {'MB':>7}"
+    )
+    for name in args.configs:
+        config = dataclasses.replace(CONFIGS[name], backend=args.backend)
+        result = evaluate(config, documents, queries, args.k)
+        recall = " ".join(f"{result.recall[k]:6.3f}" for k in args.k)
+        print(
+            f"{name:<16} {result.chunks:7} {recall} {result.mrr:6.3f} "
+            f"{result.build_seconds:8.2f} {result.query_ms['p50']:7.2f} "
+            f"{result.query_ms['p95']:7.2f} {result.storage_bytes / 1e6:7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Time and peak memory of decoding and encoding the Content message of each stage, with
+the dict path the consumer used before (json.loads, model_validate, model_dump,
+json.dumps) against validating the body into the model and serializing the model
+straight to bytes (`consumer.decode_body` and `encode_body`).
+
+    python playground/serialization_bench.py
+    python playground/serialization_bench.py --sizes 1 5 20 --repeat 5
+
+Sizes are of the raw_content in MB, of ASCII text and of text with a few wider
+characters, which CPython stores at 2 bytes per character and pydantic-core converts to
+UTF-8 (json.dumps escapes them instead). The crawler and transcriber receive a message
+without it and send one with it, the summarizer and embedding stages receive it. Each
+path decodes a body as the previous stage encoded it on that path.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import statistics
+import string
+import time
+import tracemalloc
+from typing import Callable, Optional, Tuple
+
+from universal_worker.consumer import decode_body, encode_body
+from universal_worker.models import Content, ContentStatus, ContentType
+
+# stage, whether the input has the raw content, whether the stage sets it
+STAGES = [("crawler", False, True), ("summarizer", True, False), ("embedding", True, False)]
+
+
+def make_text(size: int, ascii: bool) -> str:
+    rng = random.Random(1)
+    letters = string.ascii_lowercase
+    words = ["".join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(5000)]
+    paragraph = " ".join(rng.choices(words, k=200)) + ("" if ascii else " — ünïcode") + "\n\n"
+    return (paragraph * (size // len(paragraph) + 1))[:size]
+
+
+def make_content(raw_content: Optional[str]) -> Content:
+    return Content(
+        content_id="0b7f4c0e-5d1a-4f7e-9a51-6d3c1f0e2a11",
+        url="https://example.com/a/long/article",
+        content_type=ContentType.WEB_ARTICLE,
+        status=ContentStatus.CRAWLED,
+        title="A long article",
+        raw_content=raw_content,
+        source={"telegram": {"chat_id": "42", "message_id": "7"}},
+    )
+
+
+def fresh_copy(text: Optional[str]) -> Optional[str]:
+    # str caches its UTF-8 once encoded, a crawled page is encoded for the first time
+    return text.encode().decode() if text is not None else None
+
+
+def dict_path(body: bytes, raw_content: Optional[str]) -> bytes:
+    content = Content.model_validate(json.loads(body))
+    if raw_content is not None:
+        content.raw_content = raw_content
+    content.summary = "summary"
+    return json.dumps(content.model_dump()).encode()
+
+
+def model_path(body: bytes, raw_content: Optional[str]) -> bytes:
+    content = Content.model_validate(decode_body(body, Content))
+    if raw_content is not None:
+        content.raw_content = raw_content
+    content.summary = "summary"
+    return encode_body(content)
+
+
+def measure(
+    path: Callable[[bytes, Optional[str]], bytes], body: bytes, raw: Optional[str], repeat: int
+) -> Tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        fresh = fresh_copy(raw)
+        started_at = time.perf_counter()
+        path(body, fresh)
+        timings.append(time.perf_counter() - started_at)
+    # the body and raw content already exist, only what the path allocates is counted
+    fresh = fresh_copy(raw)
+    tracemalloc.start()
+    path(body, fresh)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main(args: argparse.Namespace) -> None:
+    print(
+        f"{'text':<8} {'stage':<12} {'MB':>4} {'dict ms':>9} {'model ms':>9} "
+        f"{'dict MB':>9} {'model MB':>9}"
+    )
+    for ascii, size in itertools.product((True, False), args.sizes):
+        text = make_text(int(size * 1024 * 1024), ascii)
+        for stage, has_input, sets_output in STAGES:
+            content = make_content(text if has_input else None)
+            dict_body = json.dumps(content.model_dump()).encode()
+            model_body = encode_body(content)
+            raw = text if sets_output else None
+            old = measure(dict_path, dict_body, raw, args.repeat)
+            new = measure(model_path, model_body, raw, args.repeat)
+            assert json.loads(dict_path(dict_body, raw)) == json.loads(model_path(model_body, raw))
+            print(
+                f"{'ascii' if ascii else 'unicode':<8} {stage:<12} {size:>4g} "
+                f"{old[0] * 1000:9.1f} {new[0] * 1000:9.1f} "
+                f"{old[1] / 2**20:9.1f} {new[1] / 2**20:9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=float, nargs="+", default=[0.1, 1, 5])
+    parser.add_argument("--repeat", type=int, default=10)
+    main(parser.parse_args())
@@ -0,0 +1,107 @@
+"""
+Runs the crawler's static fast path over the fixture pages in fixtures/static_pages,
+served from a local HTTP server. It reports the time per page, which pages escalate to
+crawl4ai (the fallback rate), and a preview of the extracted markdown.
+
+With --crawl4ai the same pages are also rendered by a running crawl4ai service to get
+the speedup. That service must be able to reach this machine, see --host.
+
+    python playground/static_fetch_bench.py
+    python playground/static_fetch_bench.py --crawl4ai http://localhost:11235 --host 172.17.0.1
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+
+from universal_worker.processors.crawler_processor.static_fetch import fetch_static
+
+FIXTURES = Path(__file__).parent / "fixtures" / "static_pages"
+ROUNDS = 20
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(
+        ("0.0.0.0", 0), partial(QuietHandler, directory=str(FIXTURES))
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def bench_static(client: httpx.AsyncClient, url: str):
+    timings = []
+    for _ in range(ROUNDS):
+        started_at = time.perf_counter()
+        response, reason, _ = await fetch_static(client, url)
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings), response, reason
+
+
+async def bench_crawl4ai(client: httpx.AsyncClient, crawl4ai_url: str, url: str) -> float:
+    started_at = time.perf_counter()
+    response = await client.post(f"{crawl4ai_url}/crawl", json={"url": url}, timeout=120)
+    response.raise_for_status()
+    return time.perf_counter() - started_at
+
+
+async def main(crawl4ai_url: str | None, host: str) -> None:
+    server = serve_fixtures()
+    port = server.server_address[1]
+    pages = sorted(path.name for path in FIXTURES.glob("*.html"))
+
+    static_times, render_times, escalated = [], [], []
+    async with httpx.AsyncClient() as client:
+        for page in pages:
+            url = f"http://{host}:{port}/{page}"
+            median, response, reason = await bench_static(client, url)
+            static_times.append(median)
+            line = f"{page:<18} static {median * 1000:7.1f} ms"
+            if crawl4ai_url:
+                render = await bench_crawl4ai(client, crawl4ai_url, url)
+                render_times.append(render)
+                line += f"  crawl4ai {render * 1000:7.1f} ms"
+            if response is None:
+                escalated.append(page)
+                line += f"  -> crawl4ai ({reason})"
+            else:
+                title = response.metadata.title
+                line += f"  {len(response.content)} chars, title {title!r}"
+            print(line)
+    server.shutdown()
+
+    print()
+    print(f"pages: {len(pages)}, escalated to crawl4ai: {len(escalated)}")
+    print(f"fallback rate: {len(escalated) / len(pages):.0%}")
+    print(f"static median: {statistics.median(static_times) * 1000:.1f} ms per page")
+    if render_times:
+        used = [i for i, page in enumerate(pages) if page not in escalated]
+        # escalated pages pay the static attempt and the render
+        total_static = sum(static_times) + sum(
+            t for page, t in zip(pages, render_times) if page in escalated
+        )
+        print(f"crawl4ai median: {statistics.median(render_times) * 1000:.1f} ms per page")
+        speedup = sum(render_times[i] for i in used) / max(sum(static_times[i] for i in used), 1e-9)
+        print(f"speedup on pages served statically: {speedup:.1f}x")
+        print(f"speedup over the corpus: {sum(render_times) / total_static:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--crawl4ai", help="crawl4ai service URL to compare with")
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="address crawl4ai reaches this machine on"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.crawl4ai, args.host))
@@ -0,0 +1,151 @@
+"""
+Latency and recall@k of two-stage retrieval (embedding_processor/retrieval.py) against
+searching all chunks, on synthetic vectors: each document has a topic, its chunks and its
+summary vector lie around it, and every query near one of its chunks.
+
+    python playground/two_stage_bench.py --chunks 1000000 --dimensions 256  # needs VECTOR_DB_*
+    python playground/two_stage_bench.py --reuse --documents-per-query 10 50 --ef-search 100
+
+The bench_two_stage tables are kept for --reuse, loading a million chunks takes a while.
+Recall is against exact search in NumPy over all chunks. The flat ANN search only runs
+with --chunk-index hnsw or ivfflat, an index over a million chunks takes long to build.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Callable, Dict, List, Set
+
+import numpy as np
+from langchain_core.documents import Document
+
+from universal_worker.config import settings
+from universal_worker.processors.embedding_processor import retrieval
+from universal_worker.processors.embedding_processor.vector_store import get_vector_store
+
+COLLECTION = "bench_two_stage"
+BATCH = 10000  # chunks per COPY
+
+
+def make_vectors(args: argparse.Namespace) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(1)
+    documents = args.chunks // args.chunks_per_document
+    scale = 1 / np.sqrt(args.dimensions)  # noise of norm ~1 around a unit topic
+    # documents on related subjects are near each other, random topics would all be apart
+    subjects = rng.standard_normal((max(documents // 100, 1), args.dimensions), dtype=np.float32)
+    topics = subjects[rng.integers(len(subjects), size=documents)] * scale
+    topics += rng.standard_normal(topics.shape, dtype=np.float32) * scale
+    chunks = np.repeat(topics, args.chunks_per_document, axis=0)
+    chunks += rng.standard_normal(chunks.shape, dtype=np.float32) * scale
+    summaries = topics + rng.standard_normal(topics.shape, dtype=np.float32) * scale * 0.5
+    picked = rng.integers(len(chunks), size=args.queries)
+    queries = chunks[picked] + rng.standard_normal(
+        (args.queries, args.dimensions), dtype=np.float32
+    ) * (scale * 0.5)
+    norms = np.linalg.norm(chunks, axis=1)
+    return {"chunks": chunks, "norms": norms, "summaries": summaries, "queries": queries}
+
+
+async def load(args: argparse.Namespace, vectors: Dict[str, np.ndarray]) -> None:
+    chunks = get_vector_store(COLLECTION)
+    documents = retrieval.get_document_index(COLLECTION)
+    for store in (chunks, documents):
+        await store.ensure_schema()
+        stats = await store.stats()
+        if args.reuse and stats["rows"]:
+            continue
+        # loaded without the index, then built once
+        connection = await store.connect()
+        await connection.execute(f'TRUNCATE "{store.table}"')
+        await connection.execute(f'DROP INDEX IF EXISTS "{store.index_name}"')
+        rows = vectors["chunks"] if store is chunks else vectors["summaries"]
+        per_document = args.chunks_per_document if store is chunks else 1
+        started_at = time.perf_counter()
+        for start in range(0, len(rows), BATCH):
+            batch = range(start, min(start + BATCH, len(rows)))
+            await store.add(
+                [
+                    Document(
+                        page_content=f"chunk {i}",
+                        metadata={"content_id": str(i // per_document), "chunk": i},
+                    )
+                    for i in batch
+                ],
+                rows[batch.start : batch.stop].tolist(),
+            )
+        loaded_at = time.perf_counter()
+        await store.reindex(force=True)
+        print(
+            f"{store.table}: {len(rows)} rows loaded in {loaded_at - started_at:.0f} s, "
+            f"{store.config.kind} index built in {time.perf_counter() - loaded_at:.0f} s"
+        )
+
+
+def exact_top(vectors: Dict[str, np.ndarray], query: np.ndarray, k: int) -> Set[int]:
+    scores = (vectors["chunks"] @ query) / vectors["norms"]
+    return set(np.argpartition(-scores, k - 1)[:k].tolist())
+
+
+async def measure(name: str, search: Callable, vectors: Dict[str, np.ndarray], k: int) -> None:
+    latencies: List[float] = []
+    hits = 0
+    for query in vectors["queries"]:
+        started_at = time.perf_counter()
+        found = await search(query.tolist())
+        latencies.append(time.perf_counter() - started_at)
+        hits += len(exact_top(vectors, query, k) & {d.metadata["chunk"] for d, _ in found})
+    latencies.sort()
+    print(
+        f"{name:<24} {statistics.median(latencies) * 1000:8.1f} "
+        f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:8.1f} "
+        f"{hits / (len(latencies) * k):7.3f}"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    settings.VECTOR_STORAGE = args.storage
+    settings.EMBEDDING_DIMENSIONS = args.dimensions
+    settings.VECTOR_INDEX = args.chunk_index
+    get_vector_store(COLLECTION)
+    settings.VECTOR_INDEX = "hnsw"  # the document index
+    settings.VECTOR_HNSW_EF_SEARCH = args.ef_search
+    retrieval.get_document_index(COLLECTION)
+
+    vectors = make_vectors(args)
+    await load(args, vectors)
+    print(
+        f"\n{args.chunks} chunks of {args.dimensions} dimensions, "
+        f"{len(vectors['summaries'])} documents, {args.queries} queries, k={args.k}\n"
+    )
+    print(f"{'search':<24} {'p50 ms':>8} {'p95 ms':>8} {f'R@{args.k}':>7}")
+
+    async def flat(vector: List[float]) -> list:
+        return await retrieval.search_chunks(vector, args.k, collection=COLLECTION)
+
+    await measure(f"flat ({args.chunk_index})", flat, vectors, args.k)
+    for n in args.documents_per_query:
+
+        async def two_stage(vector: List[float], n: int = n) -> list:
+            found = await retrieval.retrieve(vector, args.k, n, collection=COLLECTION)
+            return found.chunks
+
+        await measure(f"two-stage, {n} documents", two_stage, vectors, args.k)
+
+    for store in (retrieval.get_document_index(COLLECTION), get_vector_store(COLLECTION)):
+        await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--chunks-per-document", type=int, default=20)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--storage", default="vector", choices=["vector", "halfvec"])
+    parser.add_argument("--chunk-index", default="none", choices=["none", "hnsw", "ivfflat"])
+    parser.add_argument("--ef-search", type=int, default=settings.VECTOR_HNSW_EF_SEARCH)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--documents-per-query", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--reuse", action="store_true", help="keep the loaded tables")
+    asyncio.run(main(parser.parse_args()))
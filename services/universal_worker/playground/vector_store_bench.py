@@ -0,0 +1,134 @@
+"""
+Size, index build time, query latency and recall@k of vector store configurations (see
+embedding_processor/vector_store.py), on random unit vectors clustered like embeddings.
+Every configuration is loaded into its own bench_* collection table, which is dropped
+afterwards unless --keep:
+
+    python playground/vector_store_bench.py --rows 100000  # needs VECTOR_DB_*
+    python playground/vector_store_bench.py --configs vector-exact halfvec-hnsw --ef-search 100
+
+Recall is against exact search in NumPy over the same vectors, shortened and renormalized
+for the reduced dimension configurations. halfvec needs pgvector 0.7 or later.
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import statistics
+import time
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+from psycopg import sql
+
+from universal_worker.processors.embedding_processor.vector_store import IndexConfig, VectorStore
+
+CONFIGS = {
+    "vector-exact": IndexConfig(kind="none", storage="vector"),
+    "vector-hnsw": IndexConfig(kind="hnsw", storage="vector"),
+    "vector-ivfflat": IndexConfig(kind="ivfflat", storage="vector"),
+    "halfvec-hnsw": IndexConfig(kind="hnsw", storage="halfvec"),
+    "halfvec-ivfflat": IndexConfig(kind="ivfflat", storage="halfvec"),
+    "halfvec-hnsw-512d": IndexConfig(kind="hnsw", storage="halfvec", dimensions=512),
+    "vector-hnsw-512d": IndexConfig(kind="hnsw", storage="vector", dimensions=512),
+}
+
+
+def make_vectors(rows: int, dimensions: int, seed: int = 1) -> np.ndarray:
+    # points around a few thousand centers, uniform random vectors are all equally far apart
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(rows // 50, 1), dimensions), dtype=np.float32)
+    vectors = centers[rng.integers(len(centers), size=rows)]
+    vectors += 0.5 * rng.standard_normal((rows, dimensions), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def shorten(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    vectors = vectors[:, :dimensions]
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def bench(name: str, config: IndexConfig, args: argparse.Namespace) -> None:
+    full = make_vectors(args.rows, args.dimensions)
+    vectors = shorten(full, config.dimensions)
+    # queries near stored vectors, like a question near the chunk that answers it
+    rng = np.random.default_rng(2)
+    queries = full[rng.integers(args.rows, size=args.queries)]
+    noise = rng.standard_normal(queries.shape, dtype=np.float32)
+    queries += noise * (0.5 / np.sqrt(args.dimensions))
+    queries = shorten(queries, config.dimensions)
+    documents = [
+        Document(page_content=f"chunk {i}", metadata={"content_id": str(i // 10), "chunk": i})
+        for i in range(args.rows)
+    ]
+    store = VectorStore(f"bench_{name}", config)
+    connection = await store.connect()
+    drop = sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(store.table))
+    await connection.execute(drop)
+    try:
+        started_at = time.perf_counter()
+        # loaded without the index, then built once, the way a rebuild does
+        await store.ensure_schema()
+        await connection.execute(
+            sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(store.index_name))
+        )
+        for start in range(0, args.rows, 10000):
+            end = start + 10000
+            await store.add(documents[start:end], vectors[start:end].tolist())
+        load_seconds = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        await store.reindex(force=True)
+        build_seconds = time.perf_counter() - started_at
+
+        exact = vectors @ queries.T
+        hits = 0
+        latencies: List[float] = []
+        for i, query in enumerate(queries):
+            started_at = time.perf_counter()
+            results = await store.search(query.tolist(), args.k)
+            latencies.append(time.perf_counter() - started_at)
+            expected = set(np.argpartition(-exact[:, i], args.k - 1)[: args.k].tolist())
+            hits += len(expected & {doc.metadata["chunk"] for doc, _ in results})
+        latencies.sort()
+        stats = await store.stats()
+        print(
+            f"{name:<18} {config.dimensions:5} {load_seconds:7.1f} {build_seconds:8.1f} "
+            f"{stats['table_bytes'] / 1e6:9.1f} {stats['ann_index_bytes'] / 1e6:9.1f} "
+            f"{statistics.median(latencies) * 1000:7.2f} "
+            f"{latencies[int(0.95 * (len(latencies) - 1))] * 1000:7.2f} "
+            f"{hits / (len(queries) * args.k):7.3f}"
+        )
+    finally:
+        if not args.keep:
+            await connection.execute(drop)
+        await store.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    print(f"{args.rows} rows of {args.dimensions} dimensions, {args.queries} queries, k={args.k}\n")
+    print(
+        f"{'config':<18} {'dims':>5} {'load s':>7} {'build s':>8} {'table MB':>9} "
+        f"{'index MB':>9} {'p50 ms':>7} {'p95 ms':>7} {f'R@{args.k}':>7}"
+    )
+    for name in args.configs:
+        config = dataclasses.replace(
+            CONFIGS[name],
+            dimensions=min(CONFIGS[name].dimensions, args.dimensions),
+            ef_search=args.ef_search,
+            probes=args.probes,
+        )
+        await bench(name, config, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=40)
+    parser.add_argument("--probes", type=int, default=0)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), choices=list(CONFIGS))
+    parser.add_argument("--keep", action="store_true", help="keep the bench_* tables")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,29 @@
+from universal_worker.models import ContentType
+from universal_worker.processors.embedding_processor.chunker import (
+    chunk_content,
+    chunk_markdown,
+    chunk_sizes,
+)
+
+
+def test_word_longer_than_a_chunk_is_split():
+    max_tokens, _ = chunk_sizes(ContentType.WEB_ARTICLE)
+    chunks = chunk_content("x" * 100000, ContentType.WEB_ARTICLE)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= max_tokens for chunk in chunks)
+    assert "".join(chunk.text for chunk in chunks).count("x") >= 100000
+
+
+def test_code_line_longer_than_a_chunk_is_split():
+    markdown = "# Setup\n\n```\n" + "a" * 20000 + "\nshort line\n```\n"
+    chunks = chunk_markdown(markdown, max_tokens=200, overlap=0)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 200 for chunk in chunks)
+    assert chunks[-1].headings == ["Setup"]
+
+
+def test_sentences_stay_whole():
+    text = "First sentence here. Second one follows. " * 3
+    chunks = chunk_markdown(text, max_tokens=500, overlap=0)
+    assert len(chunks) == 1
+    assert chunks[0].text == text.strip()
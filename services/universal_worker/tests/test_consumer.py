@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+from universal_worker.consumer import (
+    ENQUEUED_AT_HEADER,
+    LANE_HEADER,
+    SOURCE_HEADER,
+    LaneConsumer,
+)
+from universal_worker.lanes import BULK_LANE, INTERACTIVE_LANE
+from universal_worker.models import FailedMessage
+from universal_worker.retry import RETRY_COUNT_HEADER
+
+
+class FakeMessage:
+    """The parts of an aio_pika incoming message the consumer uses."""
+
+    def __init__(self, body, headers=None):
+        self.body = json.dumps(body).encode()
+        self.headers = headers or {}
+        self.timestamp = None
+        self.processed = False
+
+    async def ack(self):
+        self.processed = True
+
+
+def telegram_body(chat_id, url="https://example.com"):
+    return {"url": url, "source": {"telegram": {"chat_id": chat_id, "message_id": "1"}}}
+
+
+def make_consumer(process_func, **kwargs):
+    consumer = LaneConsumer(
+        rabbitmq_url="amqp://localhost",
+        input_queue="crawl_queue",
+        error_queue="crawl_error_queue",
+        output_queues=["summary_queue"],
+        process_func=process_func,
+        lane_weights={INTERACTIVE_LANE: 3, BULK_LANE: 1},
+        **kwargs,
+    )
+    consumer.published = []
+
+    async def publish(queue_name, body, headers):
+        consumer.published.append((queue_name, body, headers))
+
+    consumer.publish = publish
+    return consumer
+
+
+async def passthrough(content):
+    return "summary_queue", content
+
+
+def test_receiver_reads_the_source_from_the_header_or_the_body():
+    async def main():
+        consumer = make_consumer(passthrough)
+        receive = consumer._receiver(BULK_LANE)
+        await receive(FakeMessage(telegram_body("chat-a")))
+        await receive(FakeMessage(telegram_body("chat-b"), {SOURCE_HEADER: "chat-c"}))
+        await receive(FakeMessage({"url": "https://example.com"}))
+        return consumer
+
+    consumer = asyncio.run(main())
+    assert list(consumer.scheduler.buffers[BULK_LANE]) == ["chat-a", "chat-c", "default"]
+    assert consumer.ready.is_set()
+
+
+def test_output_stays_in_the_lane_without_error_headers():
+    message = FakeMessage(
+        telegram_body("chat-a"),
+        {RETRY_COUNT_HEADER: 2, "x-error": "boom", "x-trace": "abc"},
+    )
+
+    async def main():
+        consumer = make_consumer(passthrough)
+        await consumer._handle(BULK_LANE, message)
+        return consumer
+
+    consumer = asyncio.run(main())
+    [(queue_name, body, headers)] = consumer.published
+    assert queue_name == "summary_queue.bulk"
+    assert json.loads(body) == telegram_body("chat-a")
+    assert headers[LANE_HEADER] == BULK_LANE
+    assert headers[SOURCE_HEADER] == "chat-a"
+    assert headers["x-trace"] == "abc"
+    assert ENQUEUED_AT_HEADER in headers
+    assert RETRY_COUNT_HEADER not in headers and "x-error" not in headers
+    assert message.processed
+
+
+def test_failure_goes_to_the_lane_error_queue():
+    message = FakeMessage(telegram_body("chat-a"), {RETRY_COUNT_HEADER: 1})
+
+    async def fail(content):
+        raise ValueError("boom")
+
+    async def main():
+        consumer = make_consumer(fail)
+        await consumer._handle(BULK_LANE, message)
+        return consumer
+
+    consumer = asyncio.run(main())
+    [(queue_name, body, headers)] = consumer.published
+    assert queue_name == "crawl_error_queue.bulk"
+    failed = FailedMessage.model_validate_json(body)
+    assert failed.original_queue == "crawl_queue"
+    assert failed.lane == BULK_LANE
+    assert failed.error_type == "ValueError"
+    assert failed.retry_count == 1
+    assert headers[LANE_HEADER] == BULK_LANE
+    assert message.processed
+
+
+def test_end_of_pipeline_releases_the_in_flight_key():
+    async def finish(content):
+        return "", content
+
+    async def main():
+        consumer = make_consumer(finish, release_queue="release_queue")
+        await consumer._handle(INTERACTIVE_LANE, FakeMessage({"idempotency_key": "key-1"}))
+        return consumer
+
+    consumer = asyncio.run(main())
+    assert consumer.published == [("release_queue", b"key-1", {})]
+
+
+def test_stop_waits_for_running_tasks_and_starts_no_new_ones():
+    processed = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow(content):
+            await release.wait()
+            processed.append(content["url"])
+            return "summary_queue", content
+
+        consumer = make_consumer(slow, concurrency=1)
+
+        async def connect():
+            pass
+
+        consumer.connect = connect
+        receive = consumer._receiver(INTERACTIVE_LANE)
+        await receive(FakeMessage(telegram_body("chat-a", "https://example.com/1")))
+        await receive(FakeMessage(telegram_body("chat-a", "https://example.com/2")))
+
+        runner = asyncio.create_task(consumer.run())
+        while not consumer.tasks:
+            await asyncio.sleep(0)
+        stopping = asyncio.create_task(consumer.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+        release.set()
+        await asyncio.wait_for(stopping, 1)
+        await asyncio.wait_for(runner, 1)
+        return consumer
+
+    consumer = asyncio.run(main())
+    # the slot freed by the first message must not start the second after stop()
+    assert processed == ["https://example.com/1"]
+    assert len(consumer.scheduler) == 1
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from universal_worker.config import settings
+from universal_worker.exceptions import DeliveryError
+from universal_worker.processors.notifier_processor.dispatcher import (
+    TelegramDispatcher,
+    TelegramMessage,
+)
+
+
+class FakeTelegram:
+    """Records the Bot API calls and answers them from a list of canned responses."""
+
+    def __init__(self, *responses: httpx.Response):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        self.calls.append((method, json.loads(request.content), time.monotonic()))
+        if self.responses:
+            return self.responses.pop(0)
+        return httpx.Response(200, json={"ok": True, "result": {"message_id": 42}})
+
+    @property
+    def methods(self):
+        return [method for method, _, _ in self.calls]
+
+
+@pytest.fixture(autouse=True)
+def fast_telegram(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_COALESCE_WINDOW", 0.01)
+    monkeypatch.setattr(settings, "TELEGRAM_EDIT_INTERVAL", 0.0)
+    monkeypatch.setattr(settings, "TELEGRAM_GLOBAL_RATE", 1000.0)
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_RATE", 1000.0)
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_BURST", 1000)
+
+
+def run(telegram: FakeTelegram, scenario):
+    async def main():
+        dispatcher = TelegramDispatcher()
+        dispatcher._client = httpx.AsyncClient(transport=httpx.MockTransport(telegram))
+        try:
+            return await scenario(dispatcher)
+        finally:
+            await dispatcher.close()
+
+    return asyncio.run(main())
+
+
+def message(text, chat_id="1", **kwargs):
+    return TelegramMessage(chat_id=chat_id, text=text, url=f"https://example.com/{text}", **kwargs)
+
+
+def test_burst_for_one_chat_is_sent_as_one_digest():
+    telegram = FakeTelegram()
+
+    async def scenario(dispatcher):
+        messages = [message(text, reply_to_message_id="7") for text in ("a", "b", "c")]
+        futures = [await dispatcher.submit(m) for m in messages]
+        await asyncio.gather(*futures)
+
+    run(telegram, scenario)
+    assert telegram.methods == ["sendMessage"]
+    payload = telegram.calls[0][1]
+    assert payload["text"].startswith("3 updates:")
+    assert payload["reply_to_message_id"] == "7"
+
+
+def test_chats_are_not_coalesced_together():
+    telegram = FakeTelegram()
+
+    async def scenario(dispatcher):
+        futures = [await dispatcher.submit(message("a", chat_id=c)) for c in ("1", "2")]
+        await asyncio.gather(*futures)
+
+    run(telegram, scenario)
+    assert sorted(payload["chat_id"] for _, payload, _ in telegram.calls) == ["1", "2"]
+    assert all(payload["text"] == "a" for _, payload, _ in telegram.calls)
+
+
+def test_stream_posts_once_then_edits():
+    telegram = FakeTelegram()
+
+    async def scenario(dispatcher):
+        await dispatcher.send(message("first", stream_id="s", partial=True))
+        assert dispatcher.streams["s"][0] == 42
+        await dispatcher.send(message("second", stream_id="s", partial=True))
+        await dispatcher.send(message("done", stream_id="s"))
+        return dict(dispatcher.streams)
+
+    streams = run(telegram, scenario)
+    assert telegram.methods == ["sendMessage", "editMessageText", "editMessageText"]
+    assert [payload.get("message_id") for _, payload, _ in telegram.calls] == [None, 42, 42]
+    assert streams == {}
+
+
+def test_superseded_partial_updates_are_skipped():
+    telegram = FakeTelegram()
+
+    async def scenario(dispatcher):
+        futures = [
+            await dispatcher.submit(message(text, stream_id="s", partial=partial))
+            for text, partial in (("one", True), ("two", True), ("done", False))
+        ]
+        await asyncio.gather(*futures)
+
+    run(telegram, scenario)
+    assert telegram.methods == ["sendMessage"]
+    assert telegram.calls[0][1]["text"] == "done"
+
+
+def test_chat_bucket_spaces_out_messages(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_RATE", 20.0)
+    monkeypatch.setattr(settings, "TELEGRAM_CHAT_BURST", 1)
+    telegram = FakeTelegram()
+
+    async def scenario(dispatcher):
+        for stream_id in ("a", "b", "c"):
+            await dispatcher.send(message(stream_id, stream_id=stream_id))
+        await dispatcher.send(message("other chat", chat_id="2", stream_id="d"))
+
+    run(telegram, scenario)
+    times = [at for _, _, at in telegram.calls]
+    # one token every 50ms for chat 1, chat 2 has its own bucket
+    assert times[2] - times[0] >= 0.09
+    assert times[3] - times[2] < 0.04
+
+
+def test_rate_limit_drains_the_chat_bucket_and_retries():
+    telegram = FakeTelegram(
+        httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.1}})
+    )
+
+    async def scenario(dispatcher):
+        await dispatcher.send(message("a"))
+
+    run(telegram, scenario)
+    assert telegram.methods == ["sendMessage", "sendMessage"]
+    assert telegram.calls[1][2] - telegram.calls[0][2] >= 0.09
+
+
+def test_rejected_message_raises_delivery_error():
+    telegram = FakeTelegram(httpx.Response(400, text="Bad Request: chat not found"))
+
+    async def scenario(dispatcher):
+        await dispatcher.send(message("a"))
+
+    with pytest.raises(DeliveryError) as error:
+        run(telegram, scenario)
+    assert error.value.status_code == 400
+    assert telegram.methods == ["sendMessage"]
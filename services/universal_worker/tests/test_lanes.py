@@ -0,0 +1,72 @@
+import pytest
+
+from universal_worker.lanes import BULK_LANE, INTERACTIVE_LANE, LaneScheduler, lane_queue
+
+
+@pytest.mark.parametrize(
+    "queue, lane, expected",
+    [
+        ("crawl_queue", INTERACTIVE_LANE, "crawl_queue"),
+        ("crawl_queue", BULK_LANE, "crawl_queue.bulk"),
+        ("", BULK_LANE, ""),
+    ],
+)
+def test_lane_queue(queue, lane, expected):
+    assert lane_queue(queue, lane) == expected
+
+
+def drain(scheduler):
+    items = []
+    while (next_item := scheduler.get()) is not None:
+        items.append(next_item)
+    return items
+
+
+def test_empty_scheduler_returns_none():
+    scheduler = LaneScheduler({INTERACTIVE_LANE: 3, BULK_LANE: 1})
+    assert scheduler.get() is None
+    assert len(scheduler) == 0
+
+
+def test_lanes_are_drained_by_weight():
+    scheduler = LaneScheduler({INTERACTIVE_LANE: 3, BULK_LANE: 1})
+    for i in range(6):
+        scheduler.put(INTERACTIVE_LANE, "chat", f"i{i}")
+    for i in range(6):
+        scheduler.put(BULK_LANE, "chat", f"b{i}")
+    assert len(scheduler) == 12
+
+    lanes = [lane for lane, _ in drain(scheduler)]
+    # smooth weighted round robin interleaves the bulk lane instead of starving it
+    assert lanes[:8] == [INTERACTIVE_LANE, INTERACTIVE_LANE, BULK_LANE, INTERACTIVE_LANE] * 2
+    # a lane left on its own gets everything
+    assert lanes[8:] == [BULK_LANE] * 4
+    assert len(scheduler) == 0
+
+
+def test_idle_lane_does_not_bank_its_share():
+    scheduler = LaneScheduler({INTERACTIVE_LANE: 3, BULK_LANE: 1})
+    for i in range(4):
+        scheduler.put(BULK_LANE, "chat", f"b{i}")
+    drain(scheduler)
+    scheduler.put(INTERACTIVE_LANE, "chat", "i0")
+    scheduler.put(BULK_LANE, "chat", "b4")
+    assert scheduler.get() == (INTERACTIVE_LANE, "i0")
+
+
+def test_sources_of_a_lane_take_turns():
+    scheduler = LaneScheduler({BULK_LANE: 1})
+    for i in range(3):
+        scheduler.put(BULK_LANE, "importer", f"big{i}")
+    scheduler.put(BULK_LANE, "other", "small0")
+    scheduler.put(BULK_LANE, "third", "tiny0")
+
+    items = [item for _, item in drain(scheduler)]
+    assert items == ["big0", "small0", "tiny0", "big1", "big2"]
+
+
+def test_items_of_a_source_keep_their_order():
+    scheduler = LaneScheduler({INTERACTIVE_LANE: 1})
+    for i in range(5):
+        scheduler.put(INTERACTIVE_LANE, "chat", i)
+    assert [item for _, item in drain(scheduler)] == list(range(5))
@@ -0,0 +1,70 @@
+import pytest
+
+from universal_worker.config import settings
+from universal_worker.retry import RETRY_QUEUE_PATTERN, retry_queue_arguments, retry_tier
+
+
+@pytest.fixture(autouse=True)
+def delays(monkeypatch):
+    monkeypatch.setattr(settings, "ERROR_RETRY_DELAYS", [30, 120, 480, 1920])
+
+
+@pytest.mark.parametrize(
+    "retry_count, retry_after, expected",
+    [
+        (0, None, 0),
+        (1, None, 1),
+        (3, None, 3),
+        # the last tier repeats
+        (10, None, 3),
+        # a Retry-After moves the message up to a tier waiting at least that long
+        (0, 30, 0),
+        (0, 31, 1),
+        (0, 300, 2),
+        (2, 60, 2),
+        # capped at the last tier
+        (0, 10000, 3),
+    ],
+)
+def test_retry_tier(retry_count, retry_after, expected):
+    assert retry_tier(retry_count, retry_after) == expected
+
+
+@pytest.mark.parametrize(
+    "queue_name, stage, tier, lane",
+    [
+        ("crawl_queue.retry.0", "crawl_queue", "0", None),
+        ("crawl_queue.retry.0.bulk", "crawl_queue", "0", "bulk"),
+        ("summary_queue.retry.12", "summary_queue", "12", None),
+    ],
+)
+def test_retry_queue_pattern(queue_name, stage, tier, lane):
+    match = RETRY_QUEUE_PATTERN.match(queue_name)
+    assert match is not None
+    assert (match["stage"], match["tier"], match["lane"]) == (stage, tier, lane)
+
+
+@pytest.mark.parametrize(
+    "queue_name", ["crawl_queue", "crawl_queue.bulk", "crawl_queue.retry", "crawl_queue.retry.x"]
+)
+def test_retry_queue_pattern_skips_other_queues(queue_name):
+    assert RETRY_QUEUE_PATTERN.match(queue_name) is None
+    assert retry_queue_arguments(queue_name) is None
+
+
+@pytest.mark.parametrize(
+    "queue_name, ttl, routing_key",
+    [
+        ("crawl_queue.retry.0", 30000, "crawl_queue"),
+        ("crawl_queue.retry.0.bulk", 30000, "crawl_queue.bulk"),
+        ("summary_queue.retry.2.bulk", 480000, "summary_queue.bulk"),
+        # tiers past the configured delays use the last one
+        ("summary_queue.retry.9", 1920000, "summary_queue"),
+    ],
+)
+def test_retry_queue_arguments(queue_name, ttl, routing_key):
+    assert retry_queue_arguments(queue_name) == {
+        "x-message-ttl": ttl,
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": routing_key,
+    }
@@ -0,0 +1,51 @@
+import pytest
+
+from universal_worker.models import FailedMessage
+from universal_worker.processors.error_handler_processor.triage import Verdict, classify
+
+
+def failed(error="boom", error_type="ContentProcessingError", **kwargs):
+    return FailedMessage(
+        original_queue="crawl_queue",
+        lane="interactive",
+        error=error,
+        error_type=error_type,
+        failed_at=0.0,
+        body={},
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        # the status code decides first
+        (failed(status_code=429), (Verdict.TRANSIENT, "status_429")),
+        (failed(status_code=503, error="validation failed"), (Verdict.TRANSIENT, "status_503")),
+        (failed(status_code=404), (Verdict.PERMANENT, "status_404")),
+        (failed(status_code=400, error_type="TimeoutError"), (Verdict.PERMANENT, "status_400")),
+        # a 5xx outside the transient set falls through to the error types
+        (failed(status_code=501, error_type="ReadTimeout"), (Verdict.TRANSIENT, "ReadTimeout")),
+        # then the error types, outermost first
+        (failed(error_type="ValidationError"), (Verdict.PERMANENT, "ValidationError")),
+        (failed(error_type="ReadTimeout"), (Verdict.TRANSIENT, "ReadTimeout")),
+        (
+            failed(error_chain=["ContentProcessingError", "RateLimitError"]),
+            (Verdict.TRANSIENT, "RateLimitError"),
+        ),
+        (
+            failed(error_chain=["JSONDecodeError", "ConnectError"]),
+            (Verdict.PERMANENT, "JSONDecodeError"),
+        ),
+        # then the wrapped error's message
+        (failed(error="Status: 403, Forbidden"), (Verdict.PERMANENT, "message")),
+        (failed(error="Content already exists"), (Verdict.PERMANENT, "message")),
+        (failed(error="Gemini quota exceeded"), (Verdict.TRANSIENT, "message")),
+        (failed(error="Request timed out"), (Verdict.TRANSIENT, "message")),
+        (failed(error="upstream answered 502"), (Verdict.TRANSIENT, "message")),
+        # anything else is parked
+        (failed(error="something odd"), (Verdict.PERMANENT, "unknown")),
+    ],
+)
+def test_classify(message, expected):
+    assert classify(message) == expected
@@ -0,0 +1,338 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Tuple, Type
+
+import aio_pika
+import pydantic_core
+from aio_pika.abc import (
+    AbstractChannel,
+    AbstractIncomingMessage,
+    AbstractQueue,
+    AbstractRobustConnection,
+)
+from pydantic import BaseModel, ValidationError
+
+from .lanes import INTERACTIVE_LANE, LaneScheduler, lane_queue
+from .models import ContentSource, FailedMessage
+from .retry import (
+    ERROR_HEADERS,
+    RETRY_COUNT_HEADER,
+    error_chain,
+    error_retry_after,
+    error_status_code,
+    retry_queue_arguments,
+)
+from .utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# a message body, decoded into the processor's input model if it declares one
+Message = Dict[str, Any] | BaseModel
+# a processor returns the output queue and message, optionally with headers to set on it
+ProcessResult = Tuple[str, Message] | Tuple[str, Message, Dict[str, Any]]
+ProcessFunc = Callable[[Message], Coroutine[Any, Any, ProcessResult]]
+ErrorHandler = Callable[
+    [Exception, Optional[Message], AbstractIncomingMessage],
+    Coroutine[Any, Any, None],
+]
+
+LANE_HEADER = "x-lane"
+SOURCE_HEADER = "x-source-key"
+ENQUEUED_AT_HEADER = "x-enqueued-at"
+
+
+def in_flight_key(content: Optional[Message]) -> Optional[str]:
+    """Idempotency key the submission service holds for the message's URL, if any."""
+    if isinstance(content, BaseModel):
+        return getattr(content, "idempotency_key", None)
+    if isinstance(content, dict):
+        return content.get("idempotency_key")
+    return None
+
+
+def source_key(content: Optional[Message]) -> str:
+    """Fairness key of a message, the telegram chat it came from if any."""
+    if isinstance(content, BaseModel):
+        content = content.model_dump(include={"source"})
+    try:
+        return str(content["source"]["telegram"]["chat_id"])  # type: ignore[index]
+    except (KeyError, TypeError):
+        return "default"
+
+
+class Sourced(BaseModel):
+    # the source of a message body alone, the other fields are skipped, not decoded
+    source: Optional[ContentSource] = None
+
+
+def decode_body(body: bytes, model: Optional[Type[BaseModel]] = None) -> Message:
+    """
+    A message body as the model, validated straight from the JSON bytes without building
+    a dict first, or as a dict without a model. A body the model rejects is decoded as a
+    dict, for the processor to report like any invalid message.
+    """
+    if model is not None:
+        try:
+            return model.model_validate_json(body)
+        except ValidationError:
+            pass
+    return json.loads(body)
+
+
+def encode_body(message: Message) -> bytes:
+    """JSON bytes of a message, models are serialized straight to bytes by pydantic-core."""
+    if isinstance(message, BaseModel):
+        return pydantic_core.to_json(message)
+    return json.dumps(message).encode()
+
+
+class LaneConsumer:
+    """
+    Drop-in replacement for workflow_base's RabbitMQConsumer that consumes every lane of
+    the input queue (see `lanes.lane_queue`) and drains them by the configured weights.
+
+    Outputs are published to the same lane of the output queue, so a bulk item stays in
+    the bulk lane through the whole pipeline. Per-lane queueing and processing latency is
+    recorded in `utils.metrics`. Failures are published to the lane's error queue as a
+    `FailedMessage` for the error_handler processor.
+
+    A message a stage ends the pipeline with (no output queue) has its idempotency key
+    published to `release_queue`, so the submission service accepts the URL again.
+
+    Processors with an `input_model` get the message body validated into it directly and
+    may return models, which are serialized to the output body without a dict in between.
+    """
+
+    def __init__(
+        self,
+        rabbitmq_url: str,
+        input_queue: str,
+        error_queue: str,
+        output_queues: List[str],
+        process_func: ProcessFunc,
+        process_error_handler: Optional[ErrorHandler] = None,
+        lane_weights: Optional[Dict[str, int]] = None,
+        concurrency: int = 1,
+        prefetch_count: int = 10,
+        input_model: Optional[Type[BaseModel]] = None,
+        release_queue: Optional[str] = None,
+    ):
+        self.rabbitmq_url = rabbitmq_url
+        self.input_queue = input_queue
+        self.error_queue = error_queue
+        self.output_queues = output_queues
+        self.process_func = process_func
+        self.process_error_handler = process_error_handler
+        self.lane_weights = lane_weights or {INTERACTIVE_LANE: 1}
+        self.concurrency = concurrency
+        self.prefetch_count = prefetch_count
+        self.input_model = input_model
+        self.release_queue = release_queue
+
+        self.scheduler: LaneScheduler[AbstractIncomingMessage] = LaneScheduler(
+            self.lane_weights
+        )
+        self.ready = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.tasks: Set[asyncio.Task] = set()
+        self.declared: Set[str] = set()
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channel: Optional[AbstractChannel] = None
+        self.queues: List[Tuple[AbstractQueue, str]] = []
+
+    @property
+    def stage(self) -> str:
+        return self.input_queue
+
+    async def _declare(self, queue_name: str) -> AbstractQueue:
+        assert self.channel is not None
+        queue = await self.channel.declare_queue(
+            queue_name, durable=True, arguments=retry_queue_arguments(queue_name)
+        )
+        self.declared.add(queue_name)
+        return queue
+
+    async def connect(self) -> None:
+        self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        self.channel = await self.connection.channel()
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+        for lane in self.lane_weights:
+            queue = await self._declare(lane_queue(self.input_queue, lane))
+            tag = await queue.consume(self._receiver(lane))
+            self.queues.append((queue, tag))
+        for lane in self.lane_weights:
+            await self._declare(lane_queue(self.error_queue, lane))
+        for output_queue in self.output_queues:
+            for lane in self.lane_weights:
+                await self._declare(lane_queue(output_queue, lane))
+
+    def _receiver(self, lane: str):
+        async def on_message(message: AbstractIncomingMessage) -> None:
+            source = (message.headers or {}).get(SOURCE_HEADER)
+            if source is None:
+                try:
+                    source = source_key(Sourced.model_validate_json(message.body))
+                except ValueError:
+                    source = "default"
+            self.scheduler.put(lane, str(source), message)
+            self.ready.set()
+
+        return on_message
+
+    async def run(self) -> None:
+        await self.connect()
+        logger.info(
+            f"Consuming {self.input_queue} with lanes {self.lane_weights}, "
+            f"concurrency {self.concurrency}"
+        )
+        slots = asyncio.Semaphore(self.concurrency)
+        while not self.stopped.is_set():
+            await slots.acquire()
+            if self.stopped.is_set():
+                slots.release()
+                return
+            next_item = self.scheduler.get()
+            while next_item is None:
+                self.ready.clear()
+                await self.ready.wait()
+                if self.stopped.is_set():
+                    slots.release()
+                    return
+                next_item = self.scheduler.get()
+
+            lane, message = next_item
+            task = asyncio.create_task(self._handle(lane, message))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def stop(self) -> None:
+        self.stopped.set()
+        self.ready.set()
+        for queue, tag in self.queues:
+            await queue.cancel(tag)
+        # a task can still start while we wait, gather until none is left
+        while self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.connection is not None:
+            await self.connection.close()
+
+    async def publish(
+        self, queue_name: str, body: bytes, headers: Dict[str, Any]
+    ) -> None:
+        assert self.channel is not None
+        if queue_name not in self.declared:
+            await self._declare(queue_name)
+        await self.channel.default_exchange.publish(
+            aio_pika.Message(
+                body=body,
+                headers=headers,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=queue_name,
+        )
+
+    def _enqueued_at(self, message: AbstractIncomingMessage) -> Optional[float]:
+        enqueued_at = (message.headers or {}).get(ENQUEUED_AT_HEADER)
+        if enqueued_at is not None:
+            return float(enqueued_at)  # type: ignore[arg-type]
+        if message.timestamp is not None:
+            return message.timestamp.timestamp()
+        return None
+
+    async def _handle(self, lane: str, message: AbstractIncomingMessage) -> None:
+        started_at = time.time()
+        enqueued_at = self._enqueued_at(message)
+        if enqueued_at is not None:
+            metrics.observe(
+                "lane_wait_seconds", started_at - enqueued_at, stage=self.stage, lane=lane
+            )
+
+        headers = dict(message.headers or {})
+        content: Optional[Message] = None
+        try:
+            content = decode_body(message.body, self.input_model)
+            result = await self.process_func(content)
+            queue_name, output = result[0], result[1]
+            if queue_name:
+                await self.publish(
+                    lane_queue(queue_name, lane),
+                    encode_body(output),
+                    {
+                        **{k: v for k, v in headers.items() if k not in ERROR_HEADERS},
+                        **(result[2] if len(result) > 2 else {}),
+                        LANE_HEADER: lane,
+                        SOURCE_HEADER: headers.get(SOURCE_HEADER) or source_key(output),
+                        ENQUEUED_AT_HEADER: time.time(),
+                    },
+                )
+            elif self.release_queue and (key := in_flight_key(content)):
+                await self.publish(self.release_queue, key.encode(), {})
+            await message.ack()
+            metrics.increment("messages_processed", stage=self.stage, lane=lane)
+        except Exception as e:
+            await self._handle_error(e, content, message, lane)
+        finally:
+            metrics.observe(
+                "lane_processing_seconds",
+                time.time() - started_at,
+                stage=self.stage,
+                lane=lane,
+            )
+            if enqueued_at is not None:
+                metrics.observe(
+                    "lane_latency_seconds",
+                    time.time() - enqueued_at,
+                    stage=self.stage,
+                    lane=lane,
+                )
+
+    async def _handle_error(
+        self,
+        error: Exception,
+        content: Optional[Message],
+        message: AbstractIncomingMessage,
+        lane: str,
+    ) -> None:
+        if self.process_error_handler is not None:
+            try:
+                await self.process_error_handler(error, content, message)
+            except Exception as e:
+                error = e
+        if message.processed:
+            return
+
+        logger.error(f"Error processing message from {self.input_queue}: {error}")
+        metrics.increment("messages_failed", stage=self.stage, lane=lane)
+        headers = dict(message.headers or {})
+        try:
+            body = json.loads(message.body)
+        except ValueError:
+            body = message.body.decode(errors="replace")
+        failed = FailedMessage(
+            original_queue=self.input_queue,
+            lane=lane,
+            error=str(error)[:1000],
+            error_type=type(error).__name__,
+            error_chain=error_chain(error),
+            status_code=error_status_code(error),
+            retry_after=error_retry_after(error),
+            retry_count=int(headers.get(RETRY_COUNT_HEADER) or 0),  # type: ignore[arg-type]
+            failed_at=time.time(),
+            body=body,
+        )
+        await self.publish(
+            lane_queue(self.error_queue, lane),
+            failed.model_dump_json().encode(),
+            {
+                **headers,
+                LANE_HEADER: lane,
+                "x-original-queue": self.input_queue,
+                "x-error": failed.error,
+                "x-error-type": failed.error_type,
+            },
+        )
+        await message.ack()
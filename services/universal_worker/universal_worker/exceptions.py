@@ -6,3 +6,43 @@ class ContentAlreadyExistsError(Exception):
     """Custom exception for content that already exists in the database."""
 
     pass
+
+
+class DeliveryError(ContentProcessingError):
+    """A notification could not be delivered, with the status of the last attempt if any."""
+
+    def __init__(
+        self, message: str, status_code: int | None = None, retry_after: float | None = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CrawlError(ContentProcessingError):
+    """Crawling failed with an HTTP status of the site, e.g. it throttled us (429/503)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CrawlServiceError(ContentProcessingError):
+    """The crawl4ai service failed with an HTTP status, e.g. it is overloaded (429/503)."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class SummarizationError(ContentProcessingError):
+    """No LLM produced a summary, with the status of the failure (429 when rate limited)."""
+
+    def __init__(
+        self, message: str, status_code: int | None = None, retry_after: float | None = None
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
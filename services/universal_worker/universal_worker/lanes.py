@@ -0,0 +1,62 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+INTERACTIVE_LANE = "interactive"
+BULK_LANE = "bulk"
+
+
+def lane_queue(queue: str, lane: str) -> str:
+    """Name of the lane's copy of a stage queue; the interactive lane keeps the plain name."""
+    if not queue or lane == INTERACTIVE_LANE:
+        return queue
+    return f"{queue}.{lane}"
+
+
+class LaneScheduler(Generic[T]):
+    """
+    Buffers work items per lane and per source (e.g. telegram chat_id) and hands them out
+    by smooth weighted round robin across lanes and plain round robin across the sources
+    of a lane. One source bulk importing thousands of items then only delays the others by
+    its share instead of a whole FIFO backlog.
+    """
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = weights
+        self.current = {lane: 0 for lane in weights}
+        self.buffers: Dict[str, "OrderedDict[str, Deque[T]]"] = {
+            lane: OrderedDict() for lane in weights
+        }
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def put(self, lane: str, source: str, item: T) -> None:
+        self.buffers[lane].setdefault(source, deque()).append(item)
+        self.size += 1
+
+    def get(self) -> Optional[Tuple[str, T]]:
+        """Return the next (lane, item), or None if nothing is buffered."""
+        ready = [lane for lane, sources in self.buffers.items() if sources]
+        if not ready:
+            return None
+
+        # smooth weighted round robin (as in nginx) over the lanes that have work
+        total = sum(self.weights[lane] for lane in ready)
+        for lane in ready:
+            self.current[lane] += self.weights[lane]
+        lane = max(ready, key=lambda name: self.current[name])
+        self.current[lane] -= total
+
+        # round robin over the sources of the lane
+        sources = self.buffers[lane]
+        source, items = next(iter(sources.items()))
+        item = items.popleft()
+        if items:
+            sources.move_to_end(source)
+        else:
+            del sources[source]
+        self.size -= 1
+        return lane, item
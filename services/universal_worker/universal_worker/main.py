@@ -2,8 +2,10 @@ import asyncio
 import logging
 import signal
 
-from workflow_base import RabbitMQConsumer, WorkflowManager
+from workflow_base import WorkflowManager
 from .config import settings
+from .consumer import LaneConsumer
+from .utils import metrics, offload
 from .workflow_config import WorkflowConfig
 
 
@@ -11,6 +13,12 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+async def log_metrics_periodically():
+    while True:
+        await asyncio.sleep(settings.METRICS_LOG_INTERVAL)
+        metrics.log_snapshot()
+
+
 async def start():
     try:
         # Get the processor type from the configuration or environment variable
@@ -18,28 +26,49 @@ async def start():
         workflow_config = WorkflowConfig()
         workflow_manager = WorkflowManager(workflow_config)
         processor = workflow_manager.create_processor(processor_name)
-        # # Initialize RabbitMQ consumer
-        consumer = RabbitMQConsumer(
+        # # Initialize RabbitMQ consumer, draining the priority lanes of the input queue
+        consumer = LaneConsumer(
             rabbitmq_url=settings.RABBITMQ_URL,
             input_queue=processor.input_queue,
             error_queue=processor.error_queue,
             output_queues=processor.output_queues,
             process_func=processor.process_content,
             process_error_handler=processor.handle_error,
+            lane_weights=workflow_config.LANE_WEIGHTS,
+            concurrency=settings.WORKER_CONCURRENCY,
+            prefetch_count=settings.WORKER_PREFETCH,
+            input_model=getattr(processor, "input_model", None),
+            release_queue=settings.DEDUPE_RELEASE_QUEUE,
         )
 
+        async def shutdown():
+            logger.info("Shutting down consumer...")
+            # waits for the messages in progress, then lets the processor flush its own work
+            await consumer.stop()
+            close = getattr(processor, "close", None)
+            if close is not None:
+                await close()
+            # joins the worker processes of CPU bound steps, blocking until they exit
+            await asyncio.to_thread(offload.shutdown)
+
         # Signal handling for graceful shutdown
+        stopping: list[asyncio.Task] = []
+
         def stop():
-            logger.info("Shutting down consumer...")
-            asyncio.create_task(consumer.stop())
-            loop.call_soon(loop.stop)  # Schedule loop.stop() after stop completes
+            if not stopping:
+                stopping.append(asyncio.create_task(shutdown()))
 
         loop = asyncio.get_event_loop()
         loop.add_signal_handler(signal.SIGTERM, stop)
         loop.add_signal_handler(signal.SIGINT, stop)
 
-        # Start the consumer
+        if settings.METRICS_LOG_INTERVAL > 0:
+            asyncio.create_task(log_metrics_periodically())
+
+        # Start the consumer, it returns once stopped
         await consumer.run()
+        if stopping:
+            await stopping[0]
     except Exception as e:
         logger.error(f"Failed to start consumer: {e}")
         raise
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -29,6 +29,8 @@ class SubmittedContent(BaseModel):
         json_schema_extra={"example": "https://example.com"},
     )
     source: Optional[ContentSource] = None
+    # in-flight key of the submission service, released when the content leaves the pipeline
+    idempotency_key: Optional[str] = None
 
 
 # this class will be used by OpenAI to extract structure content
@@ -58,6 +60,8 @@ class Metadata(BaseModel):
 class CrawlResponse(BaseModel):
     content: str
     metadata: Metadata
+    # "pdf" when extracted from a PDF, that markdown needs no further cleaning
+    format: str = "html"
 
 
 class ContentStatus(str, Enum):
@@ -83,6 +87,11 @@ class Content(BaseModel):
     raw_content: Optional[str] = None
     summary: Optional[str] = None
     source: Optional[ContentSource] = None
+    # content_id of the already ingested content this is a near duplicate of
+    duplicate_of: Optional[str] = None
+    # tokens spent on the content per stage, {"summarize": {"prompt": 1200, ...}}
+    token_usage: Dict[str, Dict[str, int]] = {}
+    idempotency_key: Optional[str] = None  # see SubmittedContent
 
 
 class NotificationType(str, Enum):
@@ -97,3 +106,24 @@ class NotificationMessage(BaseModel):
     notification_type: Optional[NotificationType] = NotificationType.INFO
     source: Optional[ContentSource] = None
     message: Optional[str] = None
+    # notifications sharing a stream_id update the same chat message instead of posting
+    # new ones, partial ones may be dropped by the notifier to respect rate limits
+    stream_id: Optional[str] = None
+    partial: bool = False
+
+
+class FailedMessage(BaseModel):
+    """Body of the error queue messages, a failed message with what went wrong."""
+
+    original_queue: str
+    lane: str
+    error: str
+    error_type: str
+    # class names of the error and the errors it was raised from, outermost first
+    error_chain: List[str] = []
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+    retry_count: int = 0
+    failed_at: float
+    # the original message, decoded if it was JSON
+    body: Any
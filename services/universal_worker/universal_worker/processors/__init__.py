@@ -1,10 +1,26 @@
 # __init__.py in processors module
-from .classifier_processor import ClassifierProcessor
-from .crawler_processor import CrawlerProcessor
-from .embedding_processor import EmbeddingProcessor
-from .notifier_processor import NotifierProcessor
-from .summarizer_processor import SummarizerProcessor
-from .transcriber_processor import TranscriberProcessor
+# processors are imported on first access (PEP 562), each pulls in its own SDKs
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .classifier_processor import ClassifierProcessor
+    from .crawler_processor import CrawlerProcessor
+    from .embedding_processor import EmbeddingProcessor
+    from .error_handler_processor import ErrorHandlerProcessor
+    from .notifier_processor import NotifierProcessor
+    from .summarizer_processor import SummarizerProcessor
+    from .transcriber_processor import TranscriberProcessor
+
+_modules = {
+    "ClassifierProcessor": ".classifier_processor",
+    "CrawlerProcessor": ".crawler_processor",
+    "EmbeddingProcessor": ".embedding_processor",
+    "ErrorHandlerProcessor": ".error_handler_processor",
+    "NotifierProcessor": ".notifier_processor",
+    "SummarizerProcessor": ".summarizer_processor",
+    "TranscriberProcessor": ".transcriber_processor",
+}
 
 __all__ = [
     "ClassifierProcessor",
@@ -13,4 +29,11 @@ __all__ = [
     "SummarizerProcessor",
     "TranscriberProcessor",
     "NotifierProcessor",
+    "ErrorHandlerProcessor",
 ]
+
+
+def __getattr__(name: str):
+    if name not in _modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_modules[name], __name__), name)
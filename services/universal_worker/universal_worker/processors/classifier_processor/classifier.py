@@ -1,16 +1,20 @@
 import uuid
 
-from openai import OpenAI
+import google.generativeai as genai
+from openai import AsyncOpenAI
 
 from universal_worker.config import settings
 from universal_worker.models import Content, ClassifiedContent, ContentStatus
 from universal_worker.exceptions import ContentProcessingError
+from universal_worker.utils.provider_scheduler import estimate_tokens, llm_scheduler
+from universal_worker.utils.tokens import (
+    fit_to_budget,
+    record_gemini_usage,
+    record_openai_usage,
+    track_tokens,
+)
 
-
-def classify_content(input_text: str) -> Content:
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-    prompt = """
+prompt = """
     Classify the given content as WEB_ARTICLE, PUBLICATION, YOUTUBE_VIDEO, BOOKMARK, UNKNOWN based on its type.
 
 - Determine whether the content is text or a URL.
@@ -19,17 +23,54 @@ def classify_content(input_text: str) -> Content:
 - If the content is text which doesn't contain a URL, classify it as UNKNOWN.
 """
 
-    try:
-        completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": input_text},
-            ],
-            response_format=ClassifiedContent,
-        )
+json_prompt = (
+    prompt
+    + """
+Respond with a JSON object with the keys "content_type" (one of "web_article", "publication", "youtube_video", "bookmark", "unknown") and "url".
+"""
+)
+
 
-        classified_content = completion.choices[0].message.parsed
+async def classify_content_openai(input_text: str) -> ClassifiedContent | None:
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    completion = await client.beta.chat.completions.parse(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": input_text},
+        ],
+        response_format=ClassifiedContent,
+    )
+    record_openai_usage("classify", completion.usage)
+    return completion.choices[0].message.parsed
+
+
+async def classify_content_gemini(input_text: str) -> ClassifiedContent | None:
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    model = genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        generation_config={"response_mime_type": "application/json"},  # pyright: ignore
+        system_instruction=json_prompt,
+    )
+    response = await model.generate_content_async(input_text)
+    record_gemini_usage("classify", response.usage_metadata)
+    return ClassifiedContent.model_validate_json(response.text)
+
+
+async def classify_content(input_text: str) -> Content:
+    try:
+        input_text = fit_to_budget(input_text, "classify")
+        # the content type is not known yet, the usage is attached to the content below
+        with track_tokens() as usage:
+            # OpenAI stays the primary classifier, gemini is only used as fallback or hedge
+            classified_content = await llm_scheduler.call(
+                "classify",
+                {
+                    "openai": lambda: classify_content_openai(input_text),
+                    "gemini": lambda: classify_content_gemini(input_text),
+                },
+                estimated_tokens=estimate_tokens(prompt + input_text),
+            )
 
         if (
             classified_content is None
@@ -37,14 +78,15 @@ def classify_content(input_text: str) -> Content:
             or classified_content.content_type is None
             or classified_content.url == ""
         ):
-            raise ContentProcessingError("Failed to classify content with openai")
+            raise ContentProcessingError("Failed to classify content")
 
         content = Content(
             content_id=str(uuid.uuid4()),
             content_type=classified_content.content_type,
             url=classified_content.url,
             status=ContentStatus.CLASSIFIED,
+            token_usage=usage.totals,
         )
         return content
     except Exception as e:
-        raise ContentProcessingError(f"Error classifying content with openai: {str(e)}")
+        raise ContentProcessingError(f"Error classifying content: {str(e)}")
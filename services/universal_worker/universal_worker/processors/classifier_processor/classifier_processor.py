@@ -20,7 +20,7 @@ from universal_worker.models import (
     SubmittedContent,
 )
 from universal_worker.utils.db import check_url_exists
-from universal_worker.utils.notifier import notify
+from universal_worker.utils.notifier import notify, release_in_flight
 
 from .classifier import classify_content
 
@@ -62,12 +62,13 @@ class ClassifierProcessor(BaseProcessor):
         logger.info(f"Starting content processing: {content}")
         try:
             submission_content = SubmittedContent.model_validate(content)
-            classified_content = classify_content(submission_content.content)
+            classified_content = await classify_content(submission_content.content)
             classified_content.source = submission_content.source
+            classified_content.idempotency_key = submission_content.idempotency_key
 
             logger.info(f"Got contennt from: {classified_content.source}")
 
-            logger.info(f"Classified content from openai: {classified_content}")
+            logger.info(f"Classified content: {classified_content}")
 
             # Check if the URL already exists in the database
             if await check_url_exists(classified_content.url):
@@ -123,6 +124,7 @@ class ClassifierProcessor(BaseProcessor):
         ) -> None:
             if isinstance(error, ContentAlreadyExistsError):
                 logger.info(f"Content already exists: {str(error)}")
+                await release_in_flight((content or {}).get("idempotency_key"))
                 await message.ack()
             else:
                 # Re-raise the exception to let the default handler manage it
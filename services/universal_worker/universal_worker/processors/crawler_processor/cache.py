@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Type
+
+from pydantic import BaseModel
+
+from universal_worker.config import settings
+from universal_worker.models import CrawlResponse
+
+logger = logging.getLogger(__name__)
+
+
+class CachedCrawl(BaseModel):
+    url: str
+    response: CrawlResponse
+    # HTTP validators of the page, used to revalidate without rendering it again
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float  # when crawl4ai rendered the page
+    validated_at: float  # when the page was last known to be unchanged
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def is_fresh(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.validated_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+class CrawlCache(ABC):
+    """URL keyed store of crawl results, bounded to `max_entries` least recently used."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+
+    @abstractmethod
+    def get(self, url: str) -> Optional[CachedCrawl]:
+        pass
+
+    @abstractmethod
+    def put(self, entry: CachedCrawl) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, url: str) -> None:
+        pass
+
+
+class NullCrawlCache(CrawlCache):
+    def get(self, url: str) -> Optional[CachedCrawl]:
+        return None
+
+    def put(self, entry: CachedCrawl) -> None:
+        pass
+
+    def delete(self, url: str) -> None:
+        pass
+
+
+class MemoryCrawlCache(CrawlCache):
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self.entries: "OrderedDict[str, CachedCrawl]" = OrderedDict()
+        self.lock = threading.Lock()  # used from the crawler's threads, like the others
+
+    def get(self, url: str) -> Optional[CachedCrawl]:
+        with self.lock:
+            entry = self.entries.get(cache_key(url))
+            if entry is not None:
+                self.entries.move_to_end(cache_key(url))
+            return entry
+
+    def put(self, entry: CachedCrawl) -> None:
+        with self.lock:
+            self.entries[cache_key(entry.url)] = entry
+            self.entries.move_to_end(cache_key(entry.url))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, url: str) -> None:
+        with self.lock:
+            self.entries.pop(cache_key(url), None)
+
+
+class SQLiteCrawlCache(CrawlCache):
+    """Local disk cache shared by the crawler workers of a host."""
+
+    def __init__(self, max_entries: int, path: str):
+        super().__init__(max_entries)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_cache ("
+            "key TEXT PRIMARY KEY, entry TEXT NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS crawl_cache_accessed_at ON crawl_cache (accessed_at)"
+        )
+
+    def get(self, url: str) -> Optional[CachedCrawl]:
+        key = cache_key(url)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT entry FROM crawl_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE crawl_cache SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+        try:
+            return CachedCrawl.model_validate_json(row[0])
+        except ValueError as e:
+            logger.warning(f"Dropping unreadable crawl cache entry for {url}: {e}")
+            self.delete(url)
+            return None
+
+    def put(self, entry: CachedCrawl) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crawl_cache (key, entry, accessed_at) VALUES (?, ?, ?)",
+                (cache_key(entry.url), entry.model_dump_json(), time.time()),
+            )
+            # evict the least recently used entries beyond max_entries
+            self.conn.execute(
+                "DELETE FROM crawl_cache WHERE key IN ("
+                "SELECT key FROM crawl_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, url: str) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM crawl_cache WHERE key = ?", (cache_key(url),))
+
+
+cache_backends: Dict[str, Type[CrawlCache]] = {
+    "none": NullCrawlCache,
+    "memory": MemoryCrawlCache,
+    "sqlite": SQLiteCrawlCache,
+}
+
+_cache: Optional[CrawlCache] = None
+
+
+def get_crawl_cache() -> CrawlCache:
+    global _cache
+    if _cache is None:
+        backend = cache_backends[settings.CRAWL_CACHE_BACKEND]
+        if backend is SQLiteCrawlCache:
+            _cache = SQLiteCrawlCache(settings.CRAWL_CACHE_MAX_ENTRIES, settings.CRAWL_CACHE_PATH)
+        else:
+            _cache = backend(settings.CRAWL_CACHE_MAX_ENTRIES)
+    return _cache
@@ -1,36 +1,26 @@
+import asyncio
 import logging
-import re
 
 import google.generativeai as genai
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from universal_worker.config import settings
+from universal_worker.utils.offload import run_cpu
+from universal_worker.utils.provider_scheduler import estimate_tokens, llm_scheduler
+from universal_worker.utils.text import first_codeblock_span, remove_span
+from universal_worker.utils.tokens import (
+    fit_to_budget,
+    record_gemini_usage,
+    record_openai_usage,
+    split_to_budget,
+)
 
 logger = logging.getLogger(__name__)
 
 system_prompt = "You are a professional in web scraping and cleaning markdown. You excel at identifying irrelevant elements and extracting the core content cleanly.\n\nClean the provided markdown content from a website by removing irrelevant elements such as navigation and headers while maintaining the main content, language, images, and links. Ensure that the output is in markdown format only.\n\n# Steps\n\n1. **Identify Main Content**: Locate the sections of the markdown that correspond to the primary content based on context and relevance.\n2. **Remove Irrelevant Sections**: Identify and eliminate any markdown portions related to navigation, headers, footers, or any non-essential sections that do not contribute to the main content.\n3. **Preserve Language and Images**: Ensure that the main textual content remains intact, preserving the original language and all image references.\n4. **Perform Quality Check**: Review the cleaned markdown to ensure that only relevant content is maintained, and the markdown format is correctly preserved.\n\n# Output Format\n\n- The output should be pure markdown format.\n- Only relevant main content, language, and images should be included.\n- Ensure there is no extraneous or irrelevant information in the output.\n\n# Notes\n\n- Pay careful attention to sections of the markdown that are structured as navigation, headers, or footers to ensure they are removed.\n- Maintain any links or references integral to the main content.\n- Images should remain in their original markdown format with accurate alt text.\n"
 
 
-def unwrap_first_codeblock(response_text: str) -> str:
-    """
-    Cleans and unwraps the first code block by removing the first occurrence of code block delimiters.
-    """
-    # Replace the first code block using `re.subn` which allows limiting replacements
-    cleaned_text, num_subs = re.subn(
-        r"```.*?```", "", response_text, count=1, flags=re.DOTALL
-    )
-
-    if num_subs == 0:
-        # If no code block found, return the original text
-        return response_text
-
-    # Strip extra whitespace or newlines
-    cleaned_text = cleaned_text.strip()
-
-    return cleaned_text
-
-
-def clean_markdown_gemini(markdown) -> str:
+async def clean_markdown_gemini(markdown) -> str:
     logger.info("Cleaning markdown content using Gemini.")
     genai.configure(api_key=settings.GEMINI_API_KEY)
 
@@ -51,15 +41,16 @@ def clean_markdown_gemini(markdown) -> str:
 
     chat_session = model.start_chat(history=[])
 
-    response = chat_session.send_message(markdown)
+    response = await chat_session.send_message_async(markdown)
+    record_gemini_usage("clean", response.usage_metadata)
 
     return response.text
 
 
-def clean_markdown_openai(markdown) -> str:
+async def clean_markdown_openai(markdown) -> str:
     logger.info("Cleaning markdown content using OpenAI.")
-    client = OpenAI()
-    response = client.chat.completions.create(
+    client = AsyncOpenAI()
+    response = await client.chat.completions.create(
         model="gpt-4o-mini",  # Use your desired OpenAI model
         messages=[
             {"role": "system", "content": system_prompt},
@@ -72,26 +63,40 @@ def clean_markdown_openai(markdown) -> str:
         presence_penalty=0,
         response_format={"type": "text"},
     )
+    record_openai_usage("clean", response.usage)
 
     return response.choices[0].message.content or ""
 
 
-async def clean_markdown(markdown: str) -> str:
-    logger.info("Cleaning markdown content.")
-    cleaned_markdown = ""
+async def clean_chunk(markdown: str) -> str:
     try:
-        # Try using Gemini first
-        cleaned_markdown = clean_markdown_gemini(markdown)
+        # The scheduler prefers Gemini, but routes straight to OpenAI while Gemini is
+        # rate limited or failing
+        cleaned_markdown = await llm_scheduler.call(
+            "clean",
+            {
+                "gemini": lambda: clean_markdown_gemini(markdown),
+                "openai": lambda: clean_markdown_openai(markdown),
+            },
+            estimated_tokens=estimate_tokens(markdown),
+        )
     except Exception as e:
-        # Handle rate limit or other exceptions by falling back to OpenAI
-        logger.info(f"Gemini failed with error: {e}. Falling back to OpenAI.")
-        try:  # Try using OpenAI
-            cleaned_markdown = clean_markdown_openai(markdown)
-        except Exception as e:
-            logger.info(f"OpenAI failed with error: {e}.")
-            logger.info("Both models failed. Returning the original markdown.")
-            return markdown
+        logger.info(f"All models failed with error: {e}.")
+        logger.info("Returning the original markdown.")
+        return markdown
     # Clean and unwrap only the first code block
-    cleaned_markdown = unwrap_first_codeblock(cleaned_markdown)
+    span = await run_cpu(first_codeblock_span, cleaned_markdown)
+    return remove_span(cleaned_markdown, span)
+
+
+async def clean_markdown(markdown: str) -> str:
+    logger.info("Cleaning markdown content.")
+    # the output of a call is capped, long pages are cleaned in chunks
+    markdown = fit_to_budget(markdown, "clean")
+    chunks = split_to_budget(markdown, settings.CLEAN_CHUNK_TOKENS)
+    if len(chunks) > 1:
+        logger.info(f"Cleaning markdown in {len(chunks)} chunks.")
+    cleaned_chunks = await asyncio.gather(*(clean_chunk(chunk) for chunk in chunks))
+    cleaned_markdown = "\n\n".join(cleaned_chunks)
     logger.info("Markdown cleaning complete.")
     return cleaned_markdown
@@ -1,17 +1,91 @@
+import asyncio
 import logging
-from typing import Tuple
+import time
+from typing import Optional, Tuple
 
 import httpx
 
 from universal_worker.config import settings
-from universal_worker.exceptions import ContentProcessingError
-from universal_worker.models import CrawlResponse, Metadata
+from universal_worker.exceptions import ContentProcessingError, CrawlError, CrawlServiceError
+from universal_worker.models import CrawlResponse
+from universal_worker.utils import metrics
+
+from .cache import CachedCrawl, get_crawl_cache
+from .pdf import PDF_FORMAT, fetch_pdf, pdf_url_of
+from .politeness import THROTTLE_STATUS_CODES, host_scheduler, retry_after
+from .static_fetch import fetch_static
 
 logger = logging.getLogger(__name__)
 
+Validators = Tuple[Optional[str], Optional[str]]
+
+
+def validators_of(headers: httpx.Headers) -> Validators:
+    return headers.get("etag"), headers.get("last-modified")
+
+
+async def revalidate(client: httpx.AsyncClient, entry: CachedCrawl) -> Optional[Validators]:
+    """
+    Ask the origin whether the page changed since it was cached, with a conditional GET
+    whose body is never read. Returns the current validators if it did not change.
+    """
+    try:
+        async with client.stream(
+            "GET",
+            entry.url,
+            headers=entry.conditional_headers(),
+            follow_redirects=True,
+            timeout=settings.CRAWL_REVALIDATE_TIMEOUT,
+        ) as response:
+            if response.status_code in THROTTLE_STATUS_CODES:
+                raise CrawlError(
+                    f"{entry.url} answered {response.status_code}",
+                    response.status_code,
+                    retry_after(response),
+                )
+            if response.status_code == 304:
+                return entry.etag, entry.last_modified
+            etag, last_modified = validators_of(response.headers)
+            # some servers ignore conditional headers but still send the same validator
+            if response.status_code == 200 and entry.etag and etag == entry.etag:
+                return etag, last_modified
+    except httpx.HTTPError as e:
+        logger.info(f"Could not revalidate {entry.url}, crawling it again: {e}")
+    return None
+
 
-async def crawl_content(url: str) -> Tuple[str, Metadata]:
+async def fetch_validators(client: httpx.AsyncClient, url: str) -> Validators:
+    try:
+        response = await client.head(
+            url, follow_redirects=True, timeout=settings.CRAWL_REVALIDATE_TIMEOUT
+        )
+        if response.status_code < 400:
+            return validators_of(response.headers)
+    except httpx.HTTPError as e:
+        logger.info(f"Could not fetch validators of {url}: {e}")
+    return None, None
+
+
+async def crawl_content(url: str) -> CrawlResponse:
+    """
+    Crawl the page, answering from the crawl cache when possible: a fresh entry is used
+    as is, a stale one is used if a conditional request shows the page is unchanged.
+    Otherwise PDFs (arXiv, *.pdf or a PDF content type) are extracted locally, pages are
+    fetched and extracted without a browser, and only rendered by crawl4ai if they look
+    JavaScript dependent. Requests that reach the site are spaced per host by the
+    politeness scheduler; a render is started after the host's slot is released, only
+    statuses of the site itself make the scheduler back off.
+    """
     logger.info(f"Starting content crawling: {url}")
+    cache = get_crawl_cache()
+    entry = await asyncio.to_thread(cache.get, url)
+    if entry is not None and time.time() - entry.fetched_at >= settings.CRAWL_CACHE_MAX_AGE:
+        entry = None
+
+    if entry is not None and entry.is_fresh(settings.CRAWL_CACHE_TTL):
+        logger.info(f"Crawl cache hit: {url}")
+        metrics.increment("crawl_cache", result="hit")
+        return entry.response
 
     timeout = httpx.Timeout(
         connect=10.0,  # Time to establish a connection
@@ -21,41 +95,112 @@ async def crawl_content(url: str) -> Tuple[str, Metadata]:
     )
 
     async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            response = await client.post(
-                f"{settings.CRAWL4AI_URL}/crawl", json={"url": url}
-            )
-
-            # Handle error responses with more detail
-            if response.status_code >= 400:
-                error_detail = "Unknown error"
+        async with host_scheduler.slot(url) as host:
+            now = time.time()
+            if entry is not None and entry.has_validators:
                 try:
-                    error_body = response.json()
-                    error_detail = error_body.get("detail", str(error_body))
-                except Exception:
-                    error_detail = response.text or str(response.status_code)
+                    validators = await revalidate(client, entry)
+                except CrawlError as e:
+                    # the site is throttling us, the stale copy beats rendering it now
+                    host_scheduler.throttled(host, e.retry_after)
+                    metrics.increment("crawl_cache", result="stale_served")
+                    return entry.response
+                if validators is not None:
+                    logger.info(f"Crawl cache revalidated: {url}")
+                    metrics.increment("crawl_cache", result="revalidated")
+                    entry.etag, entry.last_modified = validators
+                    entry.validated_at = now
+                    await asyncio.to_thread(cache.put, entry)
+                    return entry.response
+            metrics.increment("crawl_cache", result="miss" if entry is None else "stale")
 
-                logger.error(
-                    f"Crawl service error: {error_detail} (Status: {response.status_code})"
-                )
-                raise ContentProcessingError(
-                    f"Crawl service failed: {error_detail} (Status: {response.status_code})"
-                )
+            crawl_response: Optional[CrawlResponse] = None
+            etag, last_modified = None, None
+            pdf_url = pdf_url_of(url)
+            if pdf_url is not None:
+                crawl_response, headers = await fetch_pdf(client, pdf_url, url)
+                if crawl_response is not None:
+                    etag, last_modified = validators_of(headers)
+                else:
+                    logger.info(f"{pdf_url} is not a PDF, crawling {url} as a page")
 
-            crawl_response = CrawlResponse.model_validate(response.json())
+            if crawl_response is None and settings.CRAWL_STATIC_ENABLED:
+                # a PDF served without a .pdf URL is extracted from the same response
+                crawl_response, reason, headers = await fetch_static(client, url)
+                etag, last_modified = validators_of(headers)
+                if crawl_response is None:
+                    logger.info(f"Escalating {url} to crawl4ai: {reason}")
+                    metrics.increment("crawl_static", result="escalated", reason=reason)
+                elif crawl_response.format != PDF_FORMAT:
+                    metrics.increment("crawl_static", result="used")
+
+            if crawl_response is not None and crawl_response.format == PDF_FORMAT:
+                metrics.increment("crawl_pdf")
+
+            if crawl_response is None and not (etag or last_modified):
+                # taken before rendering: if the page changes meanwhile, the next
+                # revalidation sees a newer version and renders it again
+                etag, last_modified = await fetch_validators(client, url)
+
+        if crawl_response is None:
+            # crawl4ai's own load must not hold the host's slot or count against the host
+            crawl_response = await render_content(client, url)
+
+        await asyncio.to_thread(
+            cache.put,
+            CachedCrawl(
+                url=url,
+                response=crawl_response,
+                etag=etag,
+                last_modified=last_modified,
+                fetched_at=now,
+                validated_at=now,
+            ),
+        )
+        return crawl_response
 
-        except httpx.RequestError as e:
-            # Handle network/connection errors
-            logger.error(f"Network error while crawling content: {str(e)}")
-            raise ContentProcessingError(
-                f"Network error while crawling content: {str(e)}"
-            )
 
-        except ValueError as e:
-            # Handle JSON parsing or validation errors
-            logger.error(f"Invalid response format: {str(e)}")
-            raise ContentProcessingError(
-                f"Invalid response format from crawl service: {str(e)}"
+async def render_content(client: httpx.AsyncClient, url: str) -> CrawlResponse:
+    """Render the page in crawl4ai's headless browser."""
+    started_at = time.monotonic()
+    try:
+        response = await client.post(
+            f"{settings.CRAWL4AI_URL}/crawl", json={"url": url}
+        )
+
+        # Handle error responses with more detail
+        if response.status_code >= 400:
+            error_detail = "Unknown error"
+            try:
+                error_body = response.json()
+                error_detail = error_body.get("detail", str(error_body))
+            except Exception:
+                error_detail = response.text or str(response.status_code)
+
+            logger.error(
+                f"Crawl service error: {error_detail} (Status: {response.status_code})"
+            )
+            raise CrawlServiceError(
+                f"Crawl service failed: {error_detail} (Status: {response.status_code})",
+                response.status_code,
+                retry_after(response),
             )
 
-        return crawl_response.content, crawl_response.metadata
+        crawl_response = CrawlResponse.model_validate(response.json())
+
+    except httpx.RequestError as e:
+        # Handle network/connection errors
+        logger.error(f"Network error while crawling content: {str(e)}")
+        raise ContentProcessingError(
+            f"Network error while crawling content: {str(e)}"
+        )
+
+    except ValueError as e:
+        # Handle JSON parsing or validation errors
+        logger.error(f"Invalid response format: {str(e)}")
+        raise ContentProcessingError(
+            f"Invalid response format from crawl service: {str(e)}"
+        )
+
+    metrics.observe("crawl_render_seconds", time.monotonic() - started_at)
+    return crawl_response
@@ -8,13 +8,16 @@ from pydantic import ValidationError
 
 from universal_worker.config import settings
 from universal_worker.exceptions import ContentProcessingError
-from universal_worker.models import Content, ContentStatus
+from universal_worker.models import Content, ContentStatus, CrawlResponse
+from universal_worker.utils.checkpoint import get_checkpoint_store
+from universal_worker.utils.tokens import track_tokens
 from workflow_base import BaseProcessor
 
 from .cleaner import clean_markdown
 
 # from .cleaner import clean_markdown
 from .crawler import crawl_content
+from .pdf import PDF_FORMAT
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +25,25 @@ logger = logging.getLogger(__name__)
 class CrawlerProcessor(BaseProcessor):
     """Processor class for handling crawling content."""
 
-    async def process_content(
-        self, content: Dict[str, Any]
-    ) -> Tuple[str, Dict[str, str | list[str]]]:
-        logger.info(f"Starting content processing: {content}")
+    input_model = Content
+
+    async def process_content(self, content: Dict[str, Any] | Content) -> Tuple[str, Content]:
         try:
             input_content = Content.model_validate(content)
-            markdown, metadata = await crawl_content(input_content.url)
-            cleaned_markdown = await clean_markdown(markdown)
+            logger.info(f"Starting content processing: {input_content.url}")
+            checkpoints = get_checkpoint_store().of(input_content.content_id, "crawler")
+            crawl_response = await checkpoints.run(
+                "crawl", lambda: crawl_content(input_content.url), CrawlResponse
+            )
+            metadata = crawl_response.metadata
+            if crawl_response.format == PDF_FORMAT:
+                # extracted locally from the PDF, nothing for the LLM to clean up
+                cleaned_markdown = crawl_response.content
+            else:
+                with track_tokens(input_content):
+                    cleaned_markdown = await checkpoints.run(
+                        "clean", lambda: clean_markdown(crawl_response.content)
+                    )
 
             input_content.raw_content = cleaned_markdown
             input_content.title = metadata.title
@@ -39,12 +53,16 @@ class CrawlerProcessor(BaseProcessor):
             input_content.status = ContentStatus.CRAWLED
 
             logger.info("Content processed successfully.")
-            return settings.SUMMARY_QUEUE, input_content.model_dump()
+            return settings.SUMMARY_QUEUE, input_content
 
         except ValidationError as e:
             logger.error(f"Content validation failed: {e}")
             raise ContentProcessingError(f"Content validation failed: {str(e)}")
 
+        except ContentProcessingError:
+            # keep CrawlError's status code for the error handling downstream
+            raise
+
         except Exception as e:
             logger.exception(f"Error processing content: {e}")
             raise ContentProcessingError(f"Error processing content: {str(e)}")
@@ -54,16 +72,16 @@ class CrawlerProcessor(BaseProcessor):
         self,
     ) -> Optional[
         Callable[
-            [Exception, Optional[Dict[str, Any]], AbstractIncomingMessage],
+            [Exception, Optional[Dict[str, Any] | Content], AbstractIncomingMessage],
             Coroutine[Any, Any, None],
         ]
     ]:
         async def error_handler(
             error: Exception,
-            content: Optional[Dict[str, Any]],
+            content: Optional[Dict[str, Any] | Content],
             message: AbstractIncomingMessage,
         ) -> None:
-            logger.error(f"Error in CrawlerProcessor: {error}")
-            logger.error(f"Content: {content}")
+            url = content.url if isinstance(content, Content) else (content or {}).get("url")
+            logger.error(f"Error in CrawlerProcessor for {url}: {error}")
 
         return error_handler
@@ -0,0 +1,262 @@
+"""
+PDF path of the crawler for publications: the PDF is downloaded to a temporary file and
+its text is extracted locally with pypdf, page by page, into markdown with the section
+structure recovered from font sizes and numbered headings. The result is clean enough
+for the summarizer as is, so the LLM markdown cleaning is skipped.
+"""
+
+import asyncio
+import logging
+import re
+import tempfile
+from collections import Counter
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from universal_worker.config import settings
+from universal_worker.exceptions import ContentProcessingError, CrawlError
+from universal_worker.models import CrawlResponse, Metadata
+
+from .politeness import THROTTLE_STATUS_CODES, retry_after
+
+logger = logging.getLogger(__name__)
+
+PDF_FORMAT = "pdf"
+ARXIV_PATTERN = re.compile(
+    r"^https?://(?:www\.|export\.)?arxiv\.org/(?:abs|pdf)/([^?#]+?)(?:\.pdf)?/?$",
+    re.IGNORECASE,
+)
+NUMBERED_HEADING_PATTERN = re.compile(r"^((?:\d+\.)*\d+|[IVX]+|[A-Z])\.?\s+[A-Z][^.!?]{1,80}$")
+NAMED_HEADINGS = {
+    "abstract", "introduction", "related work", "background", "method", "methods",
+    "results", "discussion", "conclusion", "conclusions", "acknowledgments",
+    "acknowledgements", "references", "appendix",
+}  # fmt: skip
+PAGE_NUMBER_PATTERN = re.compile(r"^(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?$", re.IGNORECASE)
+HEADING_SIZE_RATIO = 1.15
+
+
+def arxiv_pdf_url(url: str) -> Optional[str]:
+    match = ARXIV_PATTERN.match(url)
+    if match is None:
+        return None
+    return f"https://arxiv.org/pdf/{match.group(1)}"
+
+
+def pdf_url_of(url: str) -> Optional[str]:
+    """The PDF to fetch for the URL, if it is known to be a PDF without fetching it."""
+    if arxiv_url := arxiv_pdf_url(url):
+        return arxiv_url
+    if urlsplit(url).path.lower().endswith(".pdf"):
+        return url
+    return None
+
+
+def is_pdf_response(headers: httpx.Headers) -> bool:
+    return "application/pdf" in headers.get("content-type", "")
+
+
+class PageText:
+    """Lines of one page with the font size they are set in, from pypdf's visitor."""
+
+    def __init__(self):
+        self.lines: List[Tuple[str, float]] = []
+        self.current = ""
+        self.current_size = 0.0
+
+    def visit(self, text, cm, tm, font_dict, font_size) -> None:
+        # the effective size is the font size scaled by the text matrix
+        size = abs(font_size * (tm[3] or 1) * (cm[3] or 1))
+        parts = text.split("\n")
+        for index, part in enumerate(parts):
+            if index > 0:
+                self.flush()
+            if part.strip():
+                self.current += part
+                self.current_size = max(self.current_size, size)
+
+    def flush(self) -> None:
+        if self.current.strip():
+            self.lines.append((" ".join(self.current.split()), self.current_size))
+        self.current = ""
+        self.current_size = 0.0
+
+
+def _edge_key(text: str) -> str:
+    return re.sub(r"\d+", "#", text)
+
+
+class PdfMarkdownWriter:
+    """Turns the pages of a PDF into markdown, one page at a time."""
+
+    def __init__(self):
+        self.sizes: Counter = Counter()  # characters per font size, body text dominates
+        self.seen_edges: Counter = Counter()  # running headers / footers
+        self.title: Optional[str] = None
+        self.abstract: Optional[str] = None
+        self.paragraph: List[str] = []
+        self.last_heading: Optional[str] = None
+
+    @property
+    def body_size(self) -> float:
+        return self.sizes.most_common(1)[0][0] if self.sizes else 0.0
+
+    def heading_level(self, line: str, size: float) -> Optional[int]:
+        if len(line) > 100 or line.endswith((".", ",", ";", ":")):
+            return None
+        numbered = NUMBERED_HEADING_PATTERN.match(line)
+        if numbered and re.fullmatch(r"(?:\d+\.)*\d+", numbered.group(1)):
+            return 2 + numbered.group(1).count(".")
+        stripped = re.sub(r"^(?:\d+\.?|[IVX]+\.)\s*", "", line).strip().lower()
+        if stripped in NAMED_HEADINGS:
+            return 2
+        if self.body_size and size >= self.body_size * HEADING_SIZE_RATIO and len(line) < 80:
+            return 2 if numbered is None else 3
+        return None
+
+    def _end_paragraph(self) -> Iterator[str]:
+        if not self.paragraph:
+            return
+        text = " ".join(self.paragraph)
+        # join words hyphenated across line breaks
+        text = re.sub(r"(\w)- (\w)", r"\1\2", text)
+        self.paragraph = []
+        if self.last_heading == "abstract" and self.abstract is None:
+            self.abstract = text
+        yield text + "\n\n"
+
+    def page(self, page: PageText, number: int) -> Iterator[str]:
+        lines = page.lines
+        for text, size in lines:
+            self.sizes[round(size, 1)] += len(text)
+
+        # first and last line of the page (besides page numbers), digits masked so
+        # "Smith et al. 3" repeats as well
+        content_lines = [text for text, _ in lines if not PAGE_NUMBER_PATTERN.match(text)]
+        edges = {
+            _edge_key(text)
+            for text in content_lines[:1] + content_lines[-1:]
+            if len(text.split()) > 1
+        }
+        for index, (text, size) in enumerate(lines):
+            if PAGE_NUMBER_PATTERN.match(text):
+                continue
+            if _edge_key(text) in edges and self.seen_edges[_edge_key(text)] >= 1:
+                continue  # repeated on earlier pages, a running header or footer
+
+            if number == 0 and self.title is None and index < 5 and size > self.body_size * 1.3:
+                self.title = text
+                yield f"# {text}\n\n"
+                continue
+
+            level = self.heading_level(text, size)
+            if level is not None:
+                yield from self._end_paragraph()
+                self.last_heading = re.sub(r"^[\dIVX.]+\s*", "", text).strip().lower()
+                yield f"{'#' * level} {text}\n\n"
+                continue
+
+            self.paragraph.append(text)
+            # a short line ending a sentence ends its paragraph
+            if text.endswith((".", "!", "?", ":")) and len(text) < 60:
+                yield from self._end_paragraph()
+        yield from self._end_paragraph()
+        for text in edges:
+            self.seen_edges[text] += 1
+
+
+def _extract(path: str, url: str) -> CrawlResponse:
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+    except ImportError as e:
+        raise ContentProcessingError(f"pypdf is required to extract PDFs: {e}")
+
+    try:
+        reader = PdfReader(path)
+        info = reader.metadata
+        writer = PdfMarkdownWriter()
+        parts: List[str] = []
+        for number, pdf_page in enumerate(reader.pages):
+            if number >= settings.CRAWL_PDF_MAX_PAGES:
+                parts.append(f"*Truncated after {number} pages.*\n")
+                break
+            page = PageText()
+            pdf_page.extract_text(visitor_text=page.visit)
+            page.flush()
+            parts.extend(writer.page(page, number))
+    except PdfReadError as e:
+        raise ContentProcessingError(f"Could not read PDF {url}: {e}")
+
+    markdown = "".join(parts).strip()
+    # the title in the document info is often a file name or "untitled"
+    title = writer.title or (info.title if info else None)
+    return CrawlResponse(
+        content=markdown,
+        metadata=Metadata(
+            title=title.strip() if title else None,
+            description=writer.abstract[:1000] if writer.abstract else None,
+            canonical_url=url,
+            keywords=(info.get("/Keywords") if info else None) or None,
+        ),
+        format=PDF_FORMAT,
+    )
+
+
+async def read_pdf(
+    response: httpx.Response, pdf_url: str, url: str
+) -> Optional[CrawlResponse]:
+    """
+    Download the body of a streamed response to a temporary file and extract it off the
+    event loop. None if the body is not a PDF after all (an HTML page behind a .pdf URL).
+    """
+    if "html" in response.headers.get("content-type", ""):
+        return None
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as file:
+        size = 0
+        try:
+            async for chunk in response.aiter_bytes():
+                if size == 0 and not chunk.lstrip().startswith(b"%PDF"):
+                    return None
+                size += len(chunk)
+                if size > settings.CRAWL_PDF_MAX_BYTES:
+                    raise ContentProcessingError(
+                        f"PDF {pdf_url} is larger than {settings.CRAWL_PDF_MAX_BYTES} bytes"
+                    )
+                file.write(chunk)
+        except httpx.HTTPError as e:
+            raise ContentProcessingError(f"Network error while fetching PDF {pdf_url}: {e}")
+        file.flush()
+
+        logger.info(f"Extracting PDF {pdf_url} ({size} bytes)")
+        return await asyncio.to_thread(_extract, file.name, url)
+
+
+async def fetch_pdf(
+    client: httpx.AsyncClient, pdf_url: str, url: str
+) -> Tuple[Optional[CrawlResponse], httpx.Headers]:
+    """Fetch and extract the PDF, None if the URL does not serve one."""
+    try:
+        async with client.stream(
+            "GET",
+            pdf_url,
+            headers={"User-Agent": settings.CRAWL_STATIC_USER_AGENT},
+            follow_redirects=True,
+            timeout=settings.CRAWL_PDF_TIMEOUT,
+        ) as response:
+            if response.status_code in THROTTLE_STATUS_CODES:
+                raise CrawlError(
+                    f"{pdf_url} answered {response.status_code}",
+                    response.status_code,
+                    retry_after(response),
+                )
+            if response.status_code != 200:
+                raise CrawlError(
+                    f"Fetching PDF {pdf_url} failed (Status: {response.status_code})",
+                    response.status_code,
+                )
+            return await read_pdf(response, pdf_url, url), response.headers
+    except httpx.HTTPError as e:
+        raise ContentProcessingError(f"Network error while fetching PDF {pdf_url}: {e}")
@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from universal_worker.config import settings
+from universal_worker.exceptions import CrawlError
+from universal_worker.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds asked for by a Retry-After header, given as seconds or an HTTP date."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class HostState:
+    host: str
+    delay: float  # current gap between two requests, grows while the host throttles us
+    base_delay: float  # CRAWL_HOST_DELAY or the robots.txt crawl-delay if larger
+    next_at: float = 0.0  # monotonic time the next request may start
+    active: int = 0
+    throttles: int = 0  # times the host throttled us, see HostScheduler.slot
+    waiters: Deque[asyncio.Future] = field(default_factory=deque)
+    scheduled: bool = False  # has an entry in the ready queue
+    robots_checked_at: Optional[float] = None
+    robots_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class HostScheduler:
+    """
+    Grants crawl slots per host so the crawler is polite to every site while still
+    crawling many sites at once:
+
+    - at most CRAWL_HOST_CONCURRENCY requests run against a host at the same time, and
+      consecutive requests are spaced by the host's delay
+    - the delay starts at CRAWL_HOST_DELAY or the robots.txt Crawl-delay / Request-rate,
+      doubles (or follows Retry-After) on 429/503 and decays back after successes
+    - waiting requests sit in a ready queue ordered by the time their host may be hit
+      again, so requests to other hosts go first instead of queueing behind a slow one
+    """
+
+    def __init__(self):
+        self.hosts: Dict[str, HostState] = {}
+        self.ready: List[Tuple[float, int, str]] = []
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.pump: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.CRAWL_REVALIDATE_TIMEOUT), follow_redirects=True
+            )
+        return self._client
+
+    def _state(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            state = HostState(
+                host=host, delay=settings.CRAWL_HOST_DELAY, base_delay=settings.CRAWL_HOST_DELAY
+            )
+            self.hosts[host] = state
+        return state
+
+    async def _check_robots(self, state: HostState, url: str) -> None:
+        async with state.robots_lock:
+            now = time.monotonic()
+            if (
+                state.robots_checked_at is not None
+                and now - state.robots_checked_at < settings.CRAWL_ROBOTS_TTL
+            ):
+                return
+            state.robots_checked_at = now
+
+            crawl_delay = None
+            scheme = urlsplit(url).scheme or "https"
+            try:
+                response = await self.client.get(f"{scheme}://{state.host}/robots.txt")
+                if response.status_code == 200:
+                    parser = RobotFileParser()
+                    parser.parse(response.text.splitlines())
+                    parser.modified()  # crawl_delay() ignores rules it thinks are unread
+                    crawl_delay = parser.crawl_delay(settings.CRAWL_USER_AGENT)
+                    rate = parser.request_rate(settings.CRAWL_USER_AGENT)
+                    if rate is not None and rate.requests:
+                        crawl_delay = max(float(crawl_delay or 0), rate.seconds / rate.requests)
+            except httpx.HTTPError as e:
+                logger.info(f"Could not fetch robots.txt of {state.host}: {e}")
+
+            base_delay = settings.CRAWL_HOST_DELAY
+            if crawl_delay:
+                base_delay = max(
+                    base_delay, min(float(crawl_delay), settings.CRAWL_HOST_MAX_DELAY)
+                )
+                logger.info(f"robots.txt of {state.host} asks for a {base_delay}s crawl delay")
+            state.base_delay = base_delay
+            state.delay = max(state.delay, base_delay)
+
+    def _schedule(self, state: HostState) -> None:
+        if state.scheduled or not state.waiters:
+            return
+        if state.active >= settings.CRAWL_HOST_CONCURRENCY:
+            return
+        state.scheduled = True
+        heapq.heappush(self.ready, (state.next_at, next(self.counter), state.host))
+        self.wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            if not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            ready_at, _, host = self.ready[0]
+            state = self.hosts[host]
+            if state.next_at > ready_at:
+                # the host was throttled after it was queued, move it back
+                heapq.heapreplace(self.ready, (state.next_at, next(self.counter), host))
+                continue
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.ready)
+            state.scheduled = False
+            while state.waiters:
+                waiter = state.waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    state.active += 1
+                    state.next_at = time.monotonic() + state.delay
+                    break
+            self._schedule(state)
+
+    async def acquire(self, url: str) -> HostState:
+        state = self._state(host_of(url))
+        await self._check_robots(state, url)
+
+        if self.pump is None or self.pump.done():
+            self.pump = asyncio.create_task(self._run())
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        self._schedule(state)
+        queued_at = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(state)
+            raise
+        metrics.observe("crawl_host_wait_seconds", time.monotonic() - queued_at)
+        return state
+
+    def release(self, state: HostState) -> None:
+        state.active -= 1
+        self._schedule(state)
+
+    def throttled(self, state: HostState, retry_after: Optional[float] = None) -> None:
+        """The host answered 429/503, back off before the next request to it."""
+        delay = max(state.delay * 2, retry_after or 0, 1.0)
+        state.delay = min(delay, settings.CRAWL_HOST_MAX_DELAY)
+        state.throttles += 1
+        state.next_at = max(state.next_at, time.monotonic() + max(state.delay, retry_after or 0))
+        metrics.increment("crawl_host_throttled")
+        logger.warning(f"{state.host} is throttling us, next request in {state.delay:.1f}s")
+
+    def succeeded(self, state: HostState) -> None:
+        state.delay = max(state.base_delay, state.delay * 0.75)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[HostState]:
+        """
+        Hold one of the host's crawl slots for the requests made in the block. A block
+        that returns after reporting a throttle itself (see `throttled`) does not count as
+        a success, its backoff is kept.
+        """
+        state = await self.acquire(url)
+        throttles = state.throttles
+        try:
+            yield state
+        except CrawlError as e:
+            if e.status_code in THROTTLE_STATUS_CODES:
+                self.throttled(state, e.retry_after)
+            raise
+        else:
+            if state.throttles == throttles:
+                self.succeeded(state)
+        finally:
+            self.release(state)
+
+
+host_scheduler = HostScheduler()
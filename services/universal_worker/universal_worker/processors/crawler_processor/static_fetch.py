@@ -0,0 +1,402 @@
+"""
+Fast path of the crawler for server rendered pages: a plain HTTP fetch, readability-style
+main content extraction and HTML to markdown conversion, all in process. Pages that look
+like they need JavaScript to render (or yield too little text) are left to crawl4ai.
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+import httpx
+
+from universal_worker.config import settings
+from universal_worker.exceptions import CrawlError
+from universal_worker.models import CrawlResponse, Metadata
+
+from .pdf import is_pdf_response, read_pdf
+from .politeness import THROTTLE_STATUS_CODES, retry_after
+
+logger = logging.getLogger(__name__)
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source",
+    "track", "wbr",
+}  # fmt: skip
+# never part of the main content
+DROP_TAGS = {
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe", "form", "button",
+    "select", "nav", "footer", "aside", "head",
+}  # fmt: skip
+BLOCK_TAGS = {"div", "section", "article", "main", "td", "body"}
+# start tags that close an open <p> (HTML's implied end tags)
+CLOSES_P = {
+    "address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hgroup", "hr", "main", "menu", "nav", "ol", "p", "pre", "section", "table", "ul",
+}  # fmt: skip
+# start tag -> (open tags it closes, tags the search for them stops at)
+IMPLIED_END_TAGS = {
+    "li": ({"li"}, {"ul", "ol", "menu"}),
+    "dt": ({"dt", "dd"}, {"dl"}),
+    "dd": ({"dt", "dd"}, {"dl"}),
+    "tr": ({"tr"}, {"table", "thead", "tbody", "tfoot"}),
+    "td": ({"td", "th"}, {"tr", "table"}),
+    "th": ({"td", "th"}, {"tr", "table"}),
+    "thead": ({"thead", "tbody", "tfoot"}, {"table"}),
+    "tbody": ({"thead", "tbody", "tfoot"}, {"table"}),
+    "tfoot": ({"thead", "tbody", "tfoot"}, {"table"}),
+    "option": ({"option"}, {"select", "datalist", "optgroup"}),
+    "optgroup": ({"optgroup", "option"}, {"select"}),
+}
+# an open <p> is not closed from inside these
+P_SCOPE = {"table", "td", "th", "caption", "button", "object", "template", "html"}
+# elements nested deeper are flattened into their ancestor, the tree is walked recursively
+MAX_DEPTH = 200
+UNLIKELY_PATTERN = re.compile(
+    r"comment|sidebar|footer|nav|menu|share|social|related|advert|promo|cookie|banner|"
+    r"subscribe|newsletter|breadcrumb|popup|modal",
+    re.IGNORECASE,
+)
+LIKELY_PATTERN = re.compile(r"article|content|post|entry|main|body|story|text", re.IGNORECASE)
+JS_REQUIRED_PATTERN = re.compile(
+    r"enable javascript|javascript is (?:disabled|required)|requires javascript|"
+    r"turn on javascript",
+    re.IGNORECASE,
+)
+SPA_ROOT_PATTERN = re.compile(
+    r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt)[\"'][^>]*>\s*</div>|ng-app|data-reactroot",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Node:
+    tag: str
+    attrs: Dict[str, str] = field(default_factory=dict)
+    children: List["Node | str"] = field(default_factory=list)
+    parent: Optional["Node"] = None
+    depth: int = 0
+
+    def text(self) -> str:
+        parts: List[str] = []
+        stack: List["Node | str"] = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+            else:
+                stack.extend(reversed(item.children))
+        return "".join(parts)
+
+    def iter(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(child for child in reversed(node.children) if isinstance(child, Node))
+
+    @property
+    def class_and_id(self) -> str:
+        return f"{self.attrs.get('class', '')} {self.attrs.get('id', '')}"
+
+
+class TreeBuilder(HTMLParser):
+    """
+    Lenient HTML to Node tree parser, collecting <head> metadata on the way. Applies the
+    implied end tags of HTML (an unclosed <p> or <li> ends where the next one starts).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("document")
+        self.current = self.root
+        self.meta: Dict[str, str] = {}
+        self.links: Dict[str, str] = {}
+        self.title = ""
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        attributes = {name: value or "" for name, value in attrs}
+        if tag == "meta":
+            key = attributes.get("property") or attributes.get("name")
+            if key and "content" in attributes:
+                self.meta.setdefault(key.lower(), attributes["content"].strip())
+        elif tag == "link" and "href" in attributes:
+            for rel in attributes.get("rel", "").lower().split():
+                self.links.setdefault(rel, attributes["href"])
+        elif tag == "title":
+            self.in_title = True
+
+        if tag in CLOSES_P:
+            self._close({"p"}, P_SCOPE)
+        if tag in IMPLIED_END_TAGS:
+            self._close(*IMPLIED_END_TAGS[tag])
+
+        node = Node(tag, attributes, parent=self.current, depth=self.current.depth + 1)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS and node.depth < MAX_DEPTH:
+            self.current = node
+
+    def _close(self, tags: Set[str], boundary: Set[str]) -> None:
+        """Close the innermost open element in `tags`, unless a `boundary` comes first."""
+        node: Optional[Node] = self.current
+        while node is not None and node.tag not in boundary:
+            if node.tag in tags:
+                if node.parent is not None:
+                    self.current = node.parent
+                return
+            node = node.parent
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self.in_title = False
+        # close up to the matching open tag, ignoring stray end tags
+        node: Optional[Node] = self.current
+        while node is not None and node.tag != tag:
+            node = node.parent
+        if node is not None and node.parent is not None:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title += data
+        self.current.children.append(data)
+
+
+def parse_metadata(builder: TreeBuilder, url: str) -> Metadata:
+    meta = builder.meta
+
+    def first(*keys: str) -> Optional[str]:
+        return next((meta[key] for key in keys if meta.get(key)), None)
+
+    image_url = first("og:image", "og:image:url", "twitter:image")
+    canonical_url = builder.links.get("canonical") or first("og:url")
+    return Metadata(
+        title=first("og:title", "twitter:title") or builder.title.strip() or None,
+        description=first("og:description", "description", "twitter:description"),
+        image_url=urljoin(url, image_url) if image_url else None,
+        canonical_url=urljoin(url, canonical_url) if canonical_url else None,
+        keywords=first("keywords", "news_keywords"),
+    )
+
+
+def _prune(root: Node) -> None:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        kept: List["Node | str"] = []
+        for child in node.children:
+            if isinstance(child, Node):
+                if child.tag in DROP_TAGS:
+                    continue
+                if (
+                    child.tag not in ("html", "body", "article", "main")
+                    and UNLIKELY_PATTERN.search(child.class_and_id)
+                    and not LIKELY_PATTERN.search(child.class_and_id)
+                ):
+                    continue
+                stack.append(child)
+            kept.append(child)
+        node.children = kept
+
+
+def _link_density(node: Node, text_length: int) -> float:
+    link_length = sum(len(link.text()) for link in node.iter() if link.tag == "a")
+    return link_length / max(text_length, 1)
+
+
+def find_main_content(root: Node) -> Node:
+    """Pick the node holding the article, readability style."""
+    _prune(root)
+    for node in root.iter():
+        if node.tag in ("article", "main") or node.attrs.get("role") == "main":
+            if len(node.text().strip()) > settings.CRAWL_STATIC_MIN_CHARS:
+                return node
+
+    # score paragraphs into their parent (full) and grandparent (half)
+    scores: Dict[int, Tuple[Node, float]] = {}
+    for paragraph in root.iter():
+        if paragraph.tag not in ("p", "pre", "td", "blockquote"):
+            continue
+        text = paragraph.text().strip()
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        grandparent = paragraph.parent.parent if paragraph.parent else None
+        for ancestor, share in ((paragraph.parent, 1.0), (grandparent, 0.5)):
+            if ancestor is None or ancestor.tag not in BLOCK_TAGS:
+                continue
+            base = scores.get(id(ancestor), (ancestor, 0.0))[1]
+            if base == 0.0 and LIKELY_PATTERN.search(ancestor.class_and_id):
+                base = 25.0
+            scores[id(ancestor)] = (ancestor, base + score * share)
+
+    best, best_score = root, 0.0
+    for node, score in scores.values():
+        score *= 1 - _link_density(node, len(node.text()))
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+class MarkdownWriter:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def convert(self, node: Node) -> str:
+        markdown = self._children(node)
+        markdown = re.sub(r"[ \t]+\n", "\n", markdown)
+        return re.sub(r"\n{3,}", "\n\n", markdown).strip()
+
+    def _children(self, node: Node, list_depth: int = 0) -> str:
+        parts = []
+        for child in node.children:
+            if isinstance(child, str):
+                parts.append(re.sub(r"\s+", " ", child))
+            else:
+                parts.append(self._node(child, list_depth))
+        return "".join(parts)
+
+    def _node(self, node: Node, list_depth: int) -> str:
+        tag = node.tag
+        if re.fullmatch(r"h[1-6]", tag):
+            return f"\n\n{'#' * int(tag[1])} {self._children(node).strip()}\n\n"
+        if tag == "table":
+            rows = self._children(node).strip().splitlines()
+            if rows:
+                columns = rows[0].count(" | ") + 1
+                rows.insert(1, "|" + " --- |" * columns)
+            return "\n\n" + "\n".join(rows) + "\n\n"
+        if tag in ("p", "div", "section", "article", "main", "header", "figure"):
+            return f"\n\n{self._children(node, list_depth).strip()}\n\n"
+        if tag == "br":
+            return "\n"
+        if tag == "hr":
+            return "\n\n---\n\n"
+        if tag in ("strong", "b"):
+            text = self._children(node).strip()
+            return f"**{text}**" if text else ""
+        if tag in ("em", "i"):
+            text = self._children(node).strip()
+            return f"*{text}*" if text else ""
+        if tag == "code":
+            return f"`{node.text()}`"
+        if tag == "pre":
+            return f"\n\n```\n{node.text().strip(chr(10))}\n```\n\n"
+        if tag == "blockquote":
+            text = self._children(node).strip()
+            return "\n\n" + "\n".join(f"> {line}" for line in text.splitlines()) + "\n\n"
+        if tag == "a":
+            text = self._children(node).strip()
+            href = node.attrs.get("href", "")
+            if not text or not href or href.startswith(("#", "javascript:")):
+                return text
+            return f"[{text}]({urljoin(self.base_url, href)})"
+        if tag == "img":
+            src = node.attrs.get("src") or node.attrs.get("data-src")
+            if not src:
+                return ""
+            return f"![{node.attrs.get('alt', '')}]({urljoin(self.base_url, src)})"
+        if tag in ("ul", "ol"):
+            items = []
+            list_items = [
+                child for child in node.children if isinstance(child, Node) and child.tag == "li"
+            ]
+            for index, item in enumerate(list_items, start=1):
+                marker = f"{index}." if tag == "ol" else "-"
+                text = self._children(item, list_depth + 1).strip()
+                items.append(f"{'  ' * list_depth}{marker} {text}")
+            return "\n\n" + "\n".join(items) + "\n\n"
+        if tag == "tr":
+            cells = [
+                self._children(cell).strip()
+                for cell in node.children
+                if isinstance(cell, Node) and cell.tag in ("td", "th")
+            ]
+            return "\n| " + " | ".join(cells) + " |"
+        return self._children(node, list_depth)
+
+
+def js_dependency(html: str, markdown: str) -> Optional[str]:
+    """Why the page probably needs a browser to render, or None if it does not."""
+    text_length = len(re.sub(r"[#*`>\[\]()!-]", "", markdown).strip())
+    if text_length < settings.CRAWL_STATIC_MIN_CHARS:
+        if SPA_ROOT_PATTERN.search(html):
+            return "spa_shell"
+        if JS_REQUIRED_PATTERN.search(html):
+            return "javascript_required"
+        return "too_little_text"
+    return None
+
+
+def extract(html: str, url: str) -> Tuple[CrawlResponse, Optional[str]]:
+    """Extract the main content as markdown, with the reason to escalate if any."""
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    metadata = parse_metadata(builder, url)
+    markdown = MarkdownWriter(url).convert(find_main_content(builder.root))
+    if metadata.title and not markdown.lstrip().startswith("# "):
+        markdown = f"# {metadata.title}\n\n{markdown}"
+    return CrawlResponse(content=markdown, metadata=metadata), js_dependency(html, markdown)
+
+
+async def fetch_static(
+    client: httpx.AsyncClient, url: str
+) -> Tuple[Optional[CrawlResponse], Optional[str], httpx.Headers]:
+    """
+    Fetch and extract the page without a browser. Returns the crawl response, or None
+    and the reason when crawl4ai should render the page instead, plus the response
+    headers (for the cache validators). A PDF is extracted from the same response.
+    """
+    try:
+        async with client.stream(
+            "GET",
+            url,
+            headers={"User-Agent": settings.CRAWL_STATIC_USER_AGENT, "Accept": "text/html"},
+            follow_redirects=True,
+            timeout=settings.CRAWL_STATIC_TIMEOUT,
+        ) as response:
+            if response.status_code in THROTTLE_STATUS_CODES:
+                raise CrawlError(
+                    f"{url} answered {response.status_code}",
+                    response.status_code,
+                    retry_after(response),
+                )
+            if response.status_code != 200:
+                return None, f"status_{response.status_code}", response.headers
+            if is_pdf_response(response.headers):
+                pdf_response = await read_pdf(response, url, url)
+                if pdf_response is None:
+                    return None, "not_pdf", response.headers
+                return pdf_response, None, response.headers
+            if "html" not in response.headers.get("content-type", "text/html"):
+                return None, "not_html", response.headers
+
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > settings.CRAWL_STATIC_MAX_BYTES:
+                    return None, "too_large", response.headers
+            html = b"".join(chunks).decode(response.encoding or "utf-8", errors="replace")
+    except httpx.HTTPError as e:
+        logger.info(f"Static fetch of {url} failed: {e}")
+        return None, "fetch_error", httpx.Headers()
+
+    try:
+        # pure Python parsing of up to CRAWL_STATIC_MAX_BYTES, kept off the event loop
+        crawl_response, reason = await asyncio.to_thread(extract, html, str(response.url))
+    except Exception as e:
+        # whatever the page does to the extractor, crawl4ai can still render it
+        logger.warning(f"Static extraction of {url} failed: {e!r}")
+        return None, "extract_error", response.headers
+    if reason is not None:
+        return None, reason, response.headers
+    return crawl_response, None, response.headers
@@ -0,0 +1,137 @@
+"""
+Embedding backends, selected with EMBEDDING_BACKEND. Both are langchain `Embeddings`, so
+they plug into langchain vector stores, and embed in batches of EMBEDDING_BATCH_SIZE texts.
+
+The hashing backend needs no network or API key: texts are embedded by feature hashing
+their character n-grams (Weinberger et al., 2009), vectorized with NumPy over a whole
+batch. It is deterministic and only captures lexical overlap, meant for tests, offline
+runs and load tests of the embedding and pgvector path. Its vectors are not comparable
+with OpenAI's, store them in another COLLECTION_NAME.
+"""
+
+import logging
+from abc import abstractmethod
+from typing import Dict, List, Optional, Sequence, Type
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from universal_worker.config import settings
+from universal_worker.utils.tokens import record_usage
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend(Embeddings):
+    name: str
+
+    def __init__(self, dimensions: int, batch_size: int):
+        self.dimensions = dimensions
+        self.batch_size = batch_size
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed at most batch_size texts."""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.embed_batch(texts[start : start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+
+class OpenAIBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, dimensions: int, batch_size: int, model: str):
+        super().__init__(dimensions, batch_size)
+        from openai import OpenAI
+
+        self.model = model
+        self.client = OpenAI()
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=self.model, input=texts, dimensions=self.dimensions
+        )
+        record_usage("embed", self.name, embedding=response.usage.prompt_tokens)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+# murmur3's 64 bit finalizer, spreads the polynomial hashes over all bits
+_MIX_1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX_2 = np.uint64(0xC4CEB9FE1A85EC53)
+_BASE = np.uint64(0x100000001B3)
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    hashes = hashes ^ (hashes >> np.uint64(33))
+    hashes = hashes * _MIX_1
+    hashes = hashes ^ (hashes >> np.uint64(33))
+    hashes = hashes * _MIX_2
+    return hashes ^ (hashes >> np.uint64(33))
+
+
+class HashingBackend(EmbeddingBackend):
+    name = "hashing"
+
+    def __init__(self, dimensions: int, batch_size: int, ngrams: Sequence[int] = (3, 5)):
+        super().__init__(dimensions, batch_size)
+        self.ngrams = tuple(ngrams)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        # the batch as one byte array, texts separated by a NUL so no n-gram spans two
+        encoded = [(" ".join(text.lower().split()) + "\0").encode() for text in texts]
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        lengths = np.fromiter((len(chunk) for chunk in encoded), dtype=np.int64, count=len(texts))
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+
+        vectors = np.zeros(len(texts) * self.dimensions, dtype=np.float64)
+        for n in self.ngrams:
+            count = len(data) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, n, dtype=np.uint64)
+            separators = np.zeros(count, dtype=bool)
+            for offset in range(n):
+                window = data[offset : offset + count]
+                hashes = hashes * _BASE + window.astype(np.uint64)
+                separators |= window == 0
+            hashes = _mix(hashes[~separators])
+            buckets = (hashes % np.uint64(self.dimensions)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            # the n-grams of all texts in one bincount, each text has its own range
+            buckets += rows[:count][~separators] * self.dimensions
+            vectors += np.bincount(buckets, weights=signs, minlength=len(vectors))
+
+        vectors = vectors.reshape(len(texts), self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors.tolist()
+
+
+embedding_backends: Dict[str, Type[EmbeddingBackend]] = {
+    "openai": OpenAIBackend,
+    "hashing": HashingBackend,
+}
+
+_backend: Optional[EmbeddingBackend] = None
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    global _backend
+    if _backend is None:
+        backend = embedding_backends[settings.EMBEDDING_BACKEND]
+        if backend is OpenAIBackend:
+            _backend = OpenAIBackend(
+                settings.EMBEDDING_DIMENSIONS,
+                settings.EMBEDDING_BATCH_SIZE,
+                settings.EMBEDDING_MODEL,
+            )
+        else:
+            _backend = backend(settings.EMBEDDING_DIMENSIONS, settings.EMBEDDING_BATCH_SIZE)
+        logger.info(f"Embedding with the {backend.name} backend")
+    return _backend
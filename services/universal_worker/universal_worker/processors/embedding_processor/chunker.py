@@ -0,0 +1,232 @@
+"""
+Structure-aware chunking for the embedding stage. Markdown is cut into blocks (headings,
+paragraphs, fenced code blocks, which are never split unless they exceed a chunk on
+their own), and the blocks of a section are packed into windows of up to `max_tokens`
+tokens. A heading closes the window, unless it is still smaller than a quarter of a
+chunk; the heading path ("Install > Linux") is kept as metadata and prefixed to the text
+that is embedded. Transcripts have no structure to follow and are packed by sentence,
+or by word when they come without punctuation.
+
+Window sizes and overlaps are per content type, see EMBEDDING_CHUNK_TOKENS.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from universal_worker.config import settings
+from universal_worker.models import ContentType
+from universal_worker.utils.tokens import EMBEDDING_ENCODING, count_tokens, split_tokens
+
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+SENTENCE_END = re.compile(r"(?<=[.!?。])\s+")
+
+
+@dataclass
+class Block:
+    text: str
+    headings: Tuple[str, ...]
+    tokens: int
+
+
+@dataclass
+class Chunk:
+    text: str
+    headings: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def embedded_text(self) -> str:
+        """The text with its heading path, what is embedded and stored."""
+        if not self.headings:
+            return self.text
+        return " > ".join(self.headings) + "\n\n" + self.text
+
+
+def chunk_sizes(content_type: Optional[ContentType]) -> Tuple[int, int]:
+    """Maximum tokens per chunk and tokens of overlap for the content type."""
+    sizes = settings.EMBEDDING_CHUNK_TOKENS
+    key = content_type.value if content_type else "default"
+    max_tokens, overlap = sizes.get(key, sizes["default"])
+    return max_tokens, overlap
+
+
+def _count(text: str) -> int:
+    return count_tokens(text, EMBEDDING_ENCODING)
+
+
+def _markdown_blocks(markdown: str) -> Iterator[Block]:
+    headings: Tuple[str, ...] = ()
+    lines: List[str] = []
+    fence: Optional[str] = None
+
+    def flush() -> Iterator[Block]:
+        text = "\n".join(lines).strip()
+        lines.clear()
+        if text:
+            yield Block(text, headings, _count(text))
+
+    for line in markdown.splitlines():
+        if fence is not None:
+            lines.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+                yield from flush()
+            continue
+        fence_match = FENCE.match(line)
+        if fence_match:
+            yield from flush()
+            fence = fence_match.group(1)
+            lines.append(line)
+            continue
+        heading = HEADING.match(line)
+        if heading:
+            yield from flush()
+            level = len(heading.group(1))
+            headings = headings[: level - 1] + (heading.group(2),)
+            continue
+        if not line.strip():
+            yield from flush()
+            continue
+        lines.append(line)
+    yield from flush()
+
+
+def _fitting(text: str, max_tokens: int) -> Iterator[str]:
+    """The text, cut by tokens if it is longer than a chunk (a URL, base64, a minified line)."""
+    if _count(text) <= max_tokens:
+        yield text
+    else:
+        yield from _split_tokens(text, max_tokens)
+
+
+def _split_tokens(text: str, max_tokens: int) -> List[str]:
+    # one token of the chunk is left for the separator it is joined with
+    return split_tokens(text, max(max_tokens - 1, 1), EMBEDDING_ENCODING)
+
+
+def _pieces(text: str, max_tokens: int) -> Iterator[str]:
+    """Sentences of the text, runs of words for sentences longer than a chunk."""
+    for sentence in SENTENCE_END.split(text):
+        if _count(sentence) <= max_tokens:
+            yield sentence
+            continue
+        words = sentence.split()
+        start = 0
+        while start < len(words):
+            # ~0.75 words per token to start with, shrunk until the run fits
+            run = words[start : start + max(1, int(max_tokens * 0.75))]
+            tokens = _count(" ".join(run))
+            while tokens > max_tokens and len(run) > 1:
+                run = run[: max(1, int(len(run) * max_tokens / tokens))]
+                tokens = _count(" ".join(run))
+            if tokens > max_tokens:
+                # a single word longer than a chunk
+                yield from _split_tokens(run[0], max_tokens)
+            else:
+                yield " ".join(run)
+            start += len(run)
+
+
+def _split_block(block: Block, max_tokens: int) -> Iterator[Block]:
+    if block.tokens <= max_tokens:
+        yield block
+        return
+    joiner = "\n" if FENCE.match(block.text) else " "
+    if joiner == "\n":
+        # a code block is split at lines, fenced again would mislead more than help
+        pieces = (part for line in block.text.splitlines() for part in _fitting(line, max_tokens))
+    else:
+        pieces = _pieces(block.text, max_tokens)
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = _count(piece) + 1
+        if current and current_tokens + tokens > max_tokens:
+            text = joiner.join(current)
+            yield Block(text, block.headings, current_tokens)
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        yield Block(joiner.join(current), block.headings, current_tokens)
+
+
+def _common_prefix(paths: List[Tuple[str, ...]]) -> List[str]:
+    prefix: List[str] = []
+    for level in zip(*paths):
+        if any(heading != level[0] for heading in level):
+            break
+        prefix.append(level[0])
+    return prefix
+
+
+def _pack(blocks: Iterator[Block], max_tokens: int, overlap: int) -> List[Chunk]:
+    chunks: List[Chunk] = []
+    window: List[Block] = []
+    window_tokens = 0
+    carried_count = 0
+
+    def close() -> None:
+        nonlocal window, window_tokens, carried_count
+        headings = _common_prefix([block.headings for block in window])
+        parts: List[str] = []
+        previous: Tuple[str, ...] = tuple(headings)
+        for block in window:
+            # the headings of merged sections below the chunk's heading path stay in the text
+            start = len(_common_prefix([previous, block.headings]))
+            for level in range(start, len(block.headings)):
+                parts.append("#" * (level + 1) + " " + block.headings[level])
+            parts.append(block.text)
+            previous = block.headings
+        chunks.append(Chunk("\n\n".join(parts), headings, window_tokens))
+        # the trailing blocks within the overlap are repeated at the start of the next
+        carried: List[Block] = []
+        carried_tokens = 0
+        for block in reversed(window[1:]):
+            if carried_tokens + block.tokens > overlap:
+                break
+            carried.insert(0, block)
+            carried_tokens += block.tokens
+        window, window_tokens, carried_count = carried, carried_tokens, len(carried)
+
+    for block in blocks:
+        for piece in _split_block(block, max_tokens):
+            new_section = bool(window) and piece.headings != window[-1].headings
+            if new_section and (len(window) == carried_count or window_tokens >= max_tokens // 4):
+                if len(window) > carried_count:
+                    close()
+                # no overlap over a section boundary
+                window, window_tokens, carried_count = [], 0, 0
+            elif window and window_tokens + piece.tokens > max_tokens:
+                if len(window) > carried_count:
+                    close()
+                if window_tokens + piece.tokens > max_tokens:
+                    # the overlap does not fit next to this piece
+                    window, window_tokens, carried_count = [], 0, 0
+            window.append(piece)
+            window_tokens += piece.tokens
+    if len(window) > carried_count:
+        close()
+    return chunks
+
+
+def chunk_markdown(markdown: str, max_tokens: int, overlap: int) -> List[Chunk]:
+    return _pack(_markdown_blocks(markdown), max_tokens, overlap)
+
+
+def chunk_transcript(transcript: str, max_tokens: int, overlap: int) -> List[Chunk]:
+    text = " ".join(transcript.split())
+    if not text:
+        return []
+    pieces = _pieces(text, max_tokens)
+    blocks = (Block(piece, (), _count(piece)) for piece in pieces)
+    return _pack(blocks, max_tokens, overlap)
+
+
+def chunk_content(text: str, content_type: Optional[ContentType]) -> List[Chunk]:
+    max_tokens, overlap = chunk_sizes(content_type)
+    if content_type == ContentType.YOUTUBE_VIDEO:
+        return chunk_transcript(text, max_tokens, overlap)
+    return chunk_markdown(text, max_tokens, overlap)
@@ -1,14 +1,20 @@
+import asyncio
 import logging
 
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_postgres import PGVector
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
 
 from universal_worker.config import settings
 from universal_worker.exceptions import ContentProcessingError
 from universal_worker.models import Content
+from universal_worker.utils import metrics
+from universal_worker.utils.offload import run_cpu
+from universal_worker.utils.tokens import EMBEDDING_ENCODING, fit_to_budget
+
+from .backends import get_embedding_backend
+from .chunker import Chunk, chunk_content
+from .related import add_content
+from .retrieval import document_vector, get_document_index
+from .vector_store import get_vector_store
 
 
 logger = logging.getLogger(__name__)
@@ -17,46 +23,53 @@ logger = logging.getLogger(__name__)
 async def embedding_content(content: Content) -> None:
     logger.info(f"Summarizing content: {content.url}")
     try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        embeddings = get_embedding_backend()
         raw_content = content.raw_content
         summary = content.summary
 
         if not raw_content:
             logger.error("Content is empty, skipping embedding")
             raise ContentProcessingError("Content is empty, skipping embedding")
+        raw_content = fit_to_budget(raw_content, "embed", EMBEDDING_ENCODING)
 
-        content_document = Document(
-            page_content=raw_content,
-            metadata={"source": content.url, "content_id": content.content_id},
+        content_chunks = await run_cpu(
+            chunk_content, raw_content, content.content_type, size=len(raw_content)
         )
-
-        summary_document = (
-            Document(
-                page_content=summary,
-                metadata={"source": content.url, "content_id": content.content_id},
+        summary_chunks = chunk_content(summary, None) if summary else []
+
+        def document(chunk: Chunk, index: int) -> Document:
+            return Document(
+                page_content=chunk.embedded_text,
+                metadata={
+                    "source": content.url,
+                    "content_id": content.content_id,
+                    "kind": "content",
+                    "chunk": index,
+                    "headings": chunk.headings,
+                },
             )
-            if summary
-            else None
-        )
 
-        docs = [content_document, summary_document] if summary else [content_document]
+        splits = [document(chunk, i) for i, chunk in enumerate(content_chunks)]
+        metrics.increment("embedding_chunks", len(splits), content_type=content.content_type.value)
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        splits = text_splitter.split_documents(docs)
+        texts = [split.page_content for split in splits]
+        texts += [chunk.embedded_text for chunk in summary_chunks]
+        vectors = await asyncio.to_thread(embeddings.embed_documents, texts)
+        content_vectors, summary_vectors = vectors[: len(splits)], vectors[len(splits) :]
+        # replaces the chunks of an earlier attempt, a redelivered message does not duplicate
+        await get_vector_store().replace_content(content.content_id, splits, content_vectors)
 
-        # See docker command above to launch a postgres instance with pgvector enabled.
-        connection = settings.VECTOR_DB_URL
-        logger.info(f"Connecting to postgres: {connection}")
-        collection_name = settings.COLLECTION_NAME
-
-        vector_store = PGVector(
-            embeddings=embeddings,
-            collection_name=collection_name,
-            connection=connection,
-            use_jsonb=True,
+        # the summary is only stored as the content's vector in the document index
+        summary_document = Document(
+            page_content=summary or "",
+            metadata={"source": content.url, "content_id": content.content_id, "kind": "document"},
         )
-
-        vector_store.add_documents(documents=splits)
+        vector = document_vector(summary_vectors or content_vectors)
+        await get_document_index().replace_content(
+            content.content_id, [summary_document], [vector]
+        )
+        if settings.RELATED_ENABLED:
+            await add_content(content.content_id, content.url, vector)
 
     except Exception as e:
         logger.exception(f"Error embedding_content: {e}")
@@ -6,6 +6,7 @@ from aio_pika.abc import AbstractIncomingMessage
 # from .models import Content
 from pydantic import ValidationError
 
+from universal_worker.config import settings
 from universal_worker.exceptions import ContentProcessingError
 from universal_worker.models import (
     Content,
@@ -14,9 +15,12 @@ from universal_worker.models import (
     NotificationType,
 )
 from workflow_base import BaseProcessor
+from universal_worker.utils.checkpoint import get_checkpoint_store
 from universal_worker.utils.notifier import notify
+from universal_worker.utils.tokens import track_tokens
 
 from .embedder import embedding_content
+from .related import get_related_graph
 
 logger = logging.getLogger(__name__)
 
@@ -24,29 +28,40 @@ logger = logging.getLogger(__name__)
 class EmbeddingProcessor(BaseProcessor):
     """Processor class for handling crawling content."""
 
-    async def process_content(
-        self, content: Dict[str, Any]
-    ) -> Tuple[str, Dict[str, str | list[str]]]:
-        url = content.get("url")
-        logger.info(f"Starting content processing: {url}")
+    input_model = Content
+
+    async def process_content(self, content: Dict[str, Any] | Content) -> Tuple[str, Content]:
         try:
             input_content = Content.model_validate(content)
-            await embedding_content(input_content)
+            logger.info(f"Starting content processing: {input_content.url}")
+            # the chunks are replaced on a second run, but embedding them again costs tokens
+            checkpoints = get_checkpoint_store().of(input_content.content_id, "embedding")
+            if not checkpoints.done("embed"):
+                with track_tokens(input_content):
+                    await embedding_content(input_content)
+                checkpoints.mark("embed")
             input_content.status = ContentStatus.EMBEDDED
 
             logger.info("Content embeddings completely.")
 
+            message = "Content has been processed successfully."
+            if settings.RELATED_ENABLED:
+                related = await get_related_graph().get(input_content.content_id)
+                related = related[: settings.RELATED_NOTIFY]
+                if related:
+                    message += "\nRelated:\n" + "\n".join(f"- {item.url}" for item in related)
+
             await notify(
                 NotificationMessage(
                     url=input_content.url,
                     status=input_content.status,
                     notification_type=NotificationType.INFO,
                     source=input_content.source,
-                    message="Content has been processed successfully.",
+                    message=message,
                 )
             )
 
-            return "", input_content.model_dump()
+            return "", input_content
 
         except ValidationError as e:
             logger.error(f"Content validation failed: {e}")
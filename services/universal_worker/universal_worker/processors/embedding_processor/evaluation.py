@@ -0,0 +1,255 @@
+"""
+Offline retrieval evaluation of embedding configurations (chunking, backend, dimensions).
+
+The corpus is the stored contents (db-manager API) or a synthetic one, and the queries are
+sentences of each content's summary, whose answer is the content they summarize. Every
+configuration chunks and embeds the corpus the way the embedding stage does, into an exact
+in-memory index, and is scored by document: recall@k is the share of queries with their
+content among the first k distinct contents retrieved, MRR the mean reciprocal rank of it.
+Summary chunks are left out of the index, they would answer their own sentences.
+
+    python playground/retrieval_eval.py --source synthetic --documents 500
+"""
+
+import random
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from universal_worker.config import settings
+from universal_worker.models import ContentType
+from universal_worker.utils.db import list_contents
+
+from .backends import EmbeddingBackend, HashingBackend, embedding_backends
+from .chunker import chunk_content, chunk_markdown, chunk_transcript
+
+ROW_OVERHEAD = 60  # bytes per langchain_pg_embedding row: tuple header, ids, metadata
+
+LIST_MARKER = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class EvalDocument:
+    content_id: str
+    content_type: ContentType
+    text: str
+    summary: str
+
+
+@dataclass
+class EvalQuery:
+    text: str
+    content_id: str
+
+
+@dataclass(frozen=True)
+class EvalConfig:
+    name: str
+    chunker: str = "structure"  # structure | character (the 500 / 50 character splitter)
+    backend: str = "hashing"
+    dimensions: int = 1536
+    # override EMBEDDING_CHUNK_TOKENS for the structure chunker
+    max_tokens: Optional[int] = None
+    overlap: Optional[int] = None
+
+
+@dataclass
+class EvalResult:
+    config: EvalConfig
+    chunks: int
+    recall: Dict[int, float]
+    mrr: float
+    build_seconds: float
+    query_ms: Dict[str, float] = field(default_factory=dict)  # p50 / p95
+    storage_bytes: int = 0
+
+
+def _content_type(value: str) -> ContentType:
+    # the db-manager serializes the enum by variant name, "WebArticle"
+    snake = re.sub(r"(?<=[a-z])(?=[A-Z])", "_", value).lower()
+    try:
+        return ContentType(snake)
+    except ValueError:
+        return ContentType.UNKNOWN
+
+
+async def load_documents(limit: Optional[int] = None) -> List[EvalDocument]:
+    """Stored contents with both raw content and a summary."""
+    documents = [
+        EvalDocument(
+            content_id=str(row.get("pid") or row["id"]),
+            content_type=_content_type(row["content_type"]),
+            text=row["raw_content"],
+            summary=row["summary"],
+        )
+        for row in await list_contents()
+        if row.get("raw_content") and row.get("summary")
+    ]
+    return documents[:limit] if limit else documents
+
+
+def synthetic_documents(count: int, seed: int = 1) -> List[EvalDocument]:
+    """
+    Markdown documents on overlapping topics, each with a summary that rephrases some of
+    its sentences, so the queries are answerable by lexical overlap alone.
+    """
+    rng = random.Random(seed)
+    common = "the a of to and in is for on with that this by from as are be it".split()
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    topics = ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(count * 4)]
+    documents = []
+    for i in range(count):
+        vocabulary = rng.sample(topics, 12) + common * 3
+
+        def sentence() -> str:
+            return " ".join(rng.choices(vocabulary, k=rng.randint(8, 20))).capitalize() + "."
+
+        sections = []
+        for section in range(rng.randint(2, 6)):
+            paragraphs = [
+                " ".join(sentence() for _ in range(rng.randint(2, 6)))
+                for _ in range(rng.randint(1, 4))
+            ]
+            sections.append(f"## Section {section}\n\n" + "\n\n".join(paragraphs))
+        text = f"# Document {i}\n\n" + "\n\n".join(sections)
+        sentences = SENTENCE_END.split(text.replace("\n", " "))
+        picked = rng.sample([s for s in sentences if len(s.split()) > 8], 3)
+        # a summary drops and reorders words of what it summarizes
+        rephrased = [
+            " ".join(rng.sample(s.split(), k=max(6, len(s.split()) * 2 // 3))) + "."
+            for s in picked
+        ]
+        summary = "\n".join(f"{n}. {s}" for n, s in enumerate(rephrased, 1))
+        documents.append(
+            EvalDocument(f"synthetic-{i}", ContentType.WEB_ARTICLE, text, summary)
+        )
+    return documents
+
+
+def summary_sentences(summary: str) -> List[str]:
+    """The sentences of a summary, without headings, section titles and list markers."""
+    sentences = []
+    for line in summary.splitlines():
+        line = LIST_MARKER.sub("", line.strip().lstrip("#")).replace("*", "").strip()
+        if not line or line.endswith(":"):
+            continue
+        sentences += [s for s in SENTENCE_END.split(line) if len(s.split()) >= 6]
+    return sentences
+
+
+def make_queries(
+    documents: Sequence[EvalDocument], per_document: int = 2, seed: int = 1
+) -> List[EvalQuery]:
+    rng = random.Random(seed)
+    queries = []
+    for document in documents:
+        sentences = summary_sentences(document.summary)
+        for sentence in rng.sample(sentences, min(per_document, len(sentences))):
+            queries.append(EvalQuery(sentence, document.content_id))
+    return queries
+
+
+def character_splits(text: str) -> List[str]:
+    """The 500 / 50 character splits the embedding stage used before chunker.py."""
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        return RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50).split_text(text)
+    except ImportError:
+        # approximated by fixed windows without langchain
+        return [text[start : start + 500] for start in range(0, max(len(text) - 50, 1), 450)]
+
+
+def chunk_document(document: EvalDocument, config: EvalConfig) -> List[str]:
+    """The texts embedded for the document's content under the configuration."""
+    if config.chunker == "character":
+        return character_splits(document.text)
+    if config.max_tokens is None:
+        chunks = chunk_content(document.text, document.content_type)
+    elif document.content_type == ContentType.YOUTUBE_VIDEO:
+        chunks = chunk_transcript(document.text, config.max_tokens, config.overlap or 0)
+    else:
+        chunks = chunk_markdown(document.text, config.max_tokens, config.overlap or 0)
+    return [chunk.embedded_text for chunk in chunks]
+
+
+def make_backend(config: EvalConfig) -> EmbeddingBackend:
+    if config.backend == "hashing":
+        return HashingBackend(config.dimensions, settings.EMBEDDING_BATCH_SIZE)
+    return embedding_backends[config.backend](
+        config.dimensions, settings.EMBEDDING_BATCH_SIZE, settings.EMBEDDING_MODEL
+    )
+
+
+def storage_bytes(texts: Sequence[str], dimensions: int) -> int:
+    """Estimated size of the chunks as langchain_pg_embedding rows: float32 vector and text."""
+    vector = 4 * dimensions + 8
+    return sum(vector + len(text.encode()) + ROW_OVERHEAD for text in texts)
+
+
+class ExactIndex:
+    """Brute force inner product search over normalized float32 vectors."""
+
+    def __init__(self, vectors: np.ndarray):
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = (vectors / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+    def search(self, query: np.ndarray, k: int) -> np.ndarray:
+        scores = self.vectors @ query.astype(np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+
+def evaluate(
+    config: EvalConfig,
+    documents: Sequence[EvalDocument],
+    queries: Sequence[EvalQuery],
+    ks: Sequence[int] = (1, 5, 10),
+) -> EvalResult:
+    backend = make_backend(config)
+
+    started_at = time.perf_counter()
+    texts: List[str] = []
+    owners: List[str] = []
+    for document in documents:
+        chunks = chunk_document(document, config)
+        texts += chunks
+        owners += [document.content_id] * len(chunks)
+    index = ExactIndex(np.array(backend.embed_documents(texts)))
+    build_seconds = time.perf_counter() - started_at
+
+    # enough chunks to find max(ks) distinct contents in all but degenerate cases
+    depth = max(ks) * 10
+    hits = {k: 0 for k in ks}
+    reciprocal_ranks = []
+    latencies = []
+    for query in queries:
+        started_at = time.perf_counter()
+        ranked = index.search(np.array(backend.embed_query(query.text)), depth)
+        latencies.append(time.perf_counter() - started_at)
+
+        contents = list(dict.fromkeys(owners[i] for i in ranked))
+        rank = contents.index(query.content_id) + 1 if query.content_id in contents else None
+        for k in ks:
+            hits[k] += rank is not None and rank <= k
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    latencies.sort()
+    return EvalResult(
+        config=config,
+        chunks=len(texts),
+        recall={k: hits[k] / max(len(queries), 1) for k in ks},
+        mrr=statistics.fmean(reciprocal_ranks) if reciprocal_ranks else 0.0,
+        build_seconds=build_seconds,
+        query_ms={
+            "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+            "p95": latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+        },
+        storage_bytes=storage_bytes(texts, config.dimensions),
+    )
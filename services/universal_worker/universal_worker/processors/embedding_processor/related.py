@@ -0,0 +1,289 @@
+"""
+Related contents: a k-nearest-neighbour graph between contents by their document vectors
+(see retrieval.py), kept in pgvector's Postgres next to the document index, with the
+neighbour list of a content in one row, so a lookup is a single primary key read.
+
+The embedding stage adds every content it embeds: its neighbours come from the document
+index, and it is inserted into the list of each nearby content it is nearer to than their
+farthest neighbour. Contents near many others may miss a few neighbours that way, and
+contents embedded again keep their old entries in other lists, until the graph is rebuilt
+exactly from the document index:
+
+    python -m universal_worker.processors.embedding_processor.related rebuild
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg
+from psycopg import sql
+
+from universal_worker.config import settings
+
+from .retrieval import get_document_index
+from .vector_store import connection_url, table_name
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BLOCK = 1024  # contents compared with all others at a time
+# the nearest k * REVERSE_CANDIDATES contents may get a new content as their neighbour
+REVERSE_CANDIDATES = 4
+RELATED_SUFFIX = "_related"
+
+
+@dataclass
+class Related:
+    content_id: str
+    url: str
+    similarity: float
+
+
+class RelatedGraph:
+    def __init__(self, collection: str, k: int, url: Optional[str] = None):
+        self.k = k
+        self.url = url or connection_url()
+        self.table = table_name(collection + RELATED_SUFFIX)
+        self.connection: Optional[psycopg.AsyncConnection] = None
+        self.lock = asyncio.Lock()
+        self.schema_ready = False
+
+    async def connect(self) -> psycopg.AsyncConnection:
+        if self.connection is None or self.connection.closed:
+            self.connection = await psycopg.AsyncConnection.connect(self.url, autocommit=True)
+            self.schema_ready = False
+        if not self.schema_ready:
+            await self.connection.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        content_id text PRIMARY KEY,
+                        url text NOT NULL,
+                        neighbours jsonb NOT NULL,
+                        updated_at timestamptz NOT NULL DEFAULT now()
+                    )
+                    """
+                ).format(table=sql.Identifier(self.table))
+            )
+            self.schema_ready = True
+        return self.connection
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+    def _entries(self, neighbours: List[Related]) -> str:
+        return json.dumps(
+            [
+                [n.content_id, n.url, round(n.similarity, 4)]
+                for n in sorted(neighbours, key=lambda n: -n.similarity)[: self.k]
+            ]
+        )
+
+    async def _write(
+        self, connection: psycopg.AsyncConnection, rows: List[Tuple[str, str, List[Related]]]
+    ) -> None:
+        async with connection.cursor() as cursor:
+            await cursor.executemany(
+                sql.SQL(
+                    """
+                    INSERT INTO {table} (content_id, url, neighbours) VALUES (%s, %s, %s)
+                    ON CONFLICT (content_id) DO UPDATE SET url = excluded.url,
+                        neighbours = excluded.neighbours, updated_at = now()
+                    """
+                ).format(table=sql.Identifier(self.table)),
+                [(content_id, url, self._entries(related)) for content_id, url, related in rows],
+            )
+
+    async def get(self, content_id: str) -> List[Related]:
+        """The neighbours of the content, most similar first."""
+        async with self.lock:
+            connection = await self.connect()
+            cursor = await connection.execute(
+                sql.SQL("SELECT neighbours FROM {table} WHERE content_id = %s").format(
+                    table=sql.Identifier(self.table)
+                ),
+                (content_id,),
+            )
+            row = await cursor.fetchone()
+        return [Related(*entry) for entry in row[0]] if row else []
+
+    async def update(
+        self,
+        content_id: str,
+        url: str,
+        neighbours: Sequence[Related],
+        candidates: Optional[Sequence[Related]] = None,
+    ) -> None:
+        """
+        Set the k nearest neighbours of a content and add it to the lists of the candidates
+        (its neighbours by default) it is among the k nearest of. Nearness is not symmetric,
+        a content can be near others without them being its nearest. The lists are locked
+        and rewritten in one transaction, rolled back if any write fails.
+        """
+        candidates = list(neighbours if candidates is None else candidates)
+        async with self.lock:
+            connection = await self.connect()
+            async with connection.transaction():
+                # locked in a fixed order, so concurrent updates cannot deadlock
+                cursor = await connection.execute(
+                    sql.SQL(
+                        "SELECT content_id, url, neighbours FROM {table} "
+                        "WHERE content_id = ANY(%s) ORDER BY content_id FOR UPDATE"
+                    ).format(table=sql.Identifier(self.table)),
+                    ([candidate.content_id for candidate in candidates],),
+                )
+                lists: Dict[str, Tuple[str, List[Related]]] = {
+                    row[0]: (row[1], [Related(*entry) for entry in row[2]])
+                    for row in await cursor.fetchall()
+                }
+                rows = [(content_id, url, list(neighbours))]
+                for candidate in candidates:
+                    their_url, theirs = lists.get(candidate.content_id, (candidate.url, []))
+                    theirs = [n for n in theirs if n.content_id != content_id]
+                    if len(theirs) >= self.k and candidate.similarity <= theirs[-1].similarity:
+                        continue
+                    theirs.append(Related(content_id, url, candidate.similarity))
+                    rows.append((candidate.content_id, their_url, theirs))
+                await self._write(connection, rows)
+
+    async def replace_all(self, rows: Iterable[Tuple[str, str, List[Related]]]) -> None:
+        async with self.lock:
+            connection = await self.connect()
+            async with connection.transaction():
+                await connection.execute(
+                    sql.SQL("DELETE FROM {table}").format(table=sql.Identifier(self.table))
+                )
+                statement = sql.SQL(
+                    "COPY {table} (content_id, url, neighbours) FROM STDIN"
+                ).format(table=sql.Identifier(self.table))
+                async with connection.cursor() as cursor:
+                    async with cursor.copy(statement) as copy:
+                        for content_id, url, neighbours in rows:
+                            await copy.write_row((content_id, url, self._entries(neighbours)))
+
+    async def size(self) -> int:
+        async with self.lock:
+            connection = await self.connect()
+            cursor = await connection.execute(
+                sql.SQL("SELECT count(*) FROM {table}").format(table=sql.Identifier(self.table))
+            )
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+_graph: Optional[RelatedGraph] = None
+
+
+def get_related_graph() -> RelatedGraph:
+    global _graph
+    if _graph is None:
+        _graph = RelatedGraph(settings.COLLECTION_NAME, settings.RELATED_K)
+    return _graph
+
+
+async def add_content(content_id: str, url: str, vector: Sequence[float]) -> List[Related]:
+    """Link a content embedded into the document index to its nearest contents."""
+    found = await get_document_index().search(
+        vector, settings.RELATED_K * REVERSE_CANDIDATES + 1
+    )
+    candidates = [
+        Related(document.metadata["content_id"], document.metadata.get("source", ""), 1 - distance)
+        for document, distance in found
+        if document.metadata["content_id"] != content_id
+        and 1 - distance >= settings.RELATED_MIN_SIMILARITY
+    ]
+    neighbours = candidates[: settings.RELATED_K]
+    await get_related_graph().update(content_id, url, neighbours, candidates)
+    return neighbours
+
+
+def nearest_neighbours(
+    vectors: np.ndarray, k: int, min_similarity: float
+) -> List[List[Tuple[int, float]]]:
+    """Exact k nearest rows of every row by cosine similarity, compared a block at a time."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    k = min(k, len(vectors) - 1)
+    neighbours: List[List[Tuple[int, float]]] = []
+    if k <= 0:
+        return [[] for _ in range(len(vectors))]
+    for start in range(0, len(vectors), REBUILD_BLOCK):
+        scores = vectors[start : start + REBUILD_BLOCK] @ vectors.T
+        rows = np.arange(len(scores))
+        scores[rows, rows + start] = -np.inf  # not a neighbour of itself
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row, candidates in enumerate(top):
+            candidates = candidates[np.argsort(-scores[row, candidates])]
+            neighbours.append(
+                [
+                    (int(i), float(scores[row, i]))
+                    for i in candidates
+                    if scores[row, i] >= min_similarity
+                ]
+            )
+    return neighbours
+
+
+async def rebuild(graph: RelatedGraph) -> int:
+    """Rebuild the graph from all document vectors in the document index."""
+    index = get_document_index()
+    connection = await index.ensure_schema()
+    cursor = await connection.execute(
+        sql.SQL(
+            "SELECT content_id, coalesce(metadata->>'source', ''), embedding::text FROM {}"
+        ).format(sql.Identifier(index.table))
+    )
+    rows = await cursor.fetchall()
+    if not rows:
+        await graph.replace_all([])
+        return 0
+    vectors = np.array(
+        [np.array(embedding[1:-1].split(","), dtype=np.float32) for _, _, embedding in rows]
+    )
+    neighbours = await asyncio.to_thread(
+        nearest_neighbours, vectors, graph.k, settings.RELATED_MIN_SIMILARITY
+    )
+    await graph.replace_all(
+        (
+            content_id,
+            url,
+            [Related(rows[i][0], rows[i][1], similarity) for i, similarity in found],
+        )
+        for (content_id, url, _), found in zip(rows, neighbours)
+    )
+    logger.info(f"Rebuilt the related contents graph of {len(rows)} contents")
+    return len(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the related contents graph")
+    parser.add_argument("command", choices=["rebuild", "stats", "show"])
+    parser.add_argument("content_id", nargs="?", help="the content to show the neighbours of")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    graph = get_related_graph()
+
+    async def run() -> None:
+        try:
+            if args.command == "rebuild":
+                await rebuild(graph)
+            elif args.command == "show":
+                for related in await graph.get(args.content_id):
+                    print(f"{related.similarity:.3f}  {related.content_id}  {related.url}")
+                return
+            print(f"{await graph.size()} contents in {graph.table}")
+        finally:
+            await graph.close()
+            await get_document_index().close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
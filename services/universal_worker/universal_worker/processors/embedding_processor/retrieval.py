@@ -0,0 +1,134 @@
+"""
+Two-stage retrieval over the vector store. Every content has one vector in a document
+index (the `<collection>_documents` collection, see vector_store.py), the mean of its
+summary chunk vectors, or of its content chunk vectors when it has no summary. A query
+first picks the nearest RETRIEVAL_DOCUMENTS contents from that index, a fraction of the
+size of the chunk table, then compares only the chunks of those contents, exactly.
+
+    retrieval = await retrieve("how do I rotate the api keys?")
+    for chunk, distance in retrieval.chunks:
+        print(chunk.metadata["source"], distance)
+
+The stages are usable on their own: `search_documents` to find contents and `search_chunks`
+for the passages of given contents (or of all, with the chunk table's ANN index).
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+from psycopg import sql
+
+from universal_worker.config import settings
+
+from .backends import get_embedding_backend
+from .vector_store import VectorStore, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_SUFFIX = "_documents"
+
+Query = Union[str, Sequence[float]]
+
+
+@dataclass
+class Retrieval:
+    documents: List[Tuple[Document, float]] = field(default_factory=list)
+    chunks: List[Tuple[Document, float]] = field(default_factory=list)
+
+
+def get_document_index(collection: Optional[str] = None) -> VectorStore:
+    return get_vector_store((collection or settings.COLLECTION_NAME) + DOCUMENTS_SUFFIX)
+
+
+def document_vector(vectors: Sequence[Sequence[float]]) -> List[float]:
+    # cosine distance ignores the length of the mean, it needs no normalizing
+    return np.mean(np.asarray(vectors, dtype=np.float32), axis=0).tolist()
+
+
+async def _vector(query: Query) -> Sequence[float]:
+    if isinstance(query, str):
+        return await asyncio.to_thread(get_embedding_backend().embed_query, query)
+    return query
+
+
+async def search_documents(
+    query: Query, n: Optional[int] = None, collection: Optional[str] = None
+) -> List[Tuple[Document, float]]:
+    """The n contents nearest to the query, by their document vector."""
+    vector = await _vector(query)
+    return await get_document_index(collection).search(vector, n or settings.RETRIEVAL_DOCUMENTS)
+
+
+async def search_chunks(
+    query: Query,
+    k: Optional[int] = None,
+    content_ids: Optional[Sequence[str]] = None,
+    collection: Optional[str] = None,
+) -> List[Tuple[Document, float]]:
+    """The k content chunks nearest to the query, of the given contents or of all."""
+    vector = await _vector(query)
+    return await get_vector_store(collection).search(
+        vector,
+        k or settings.RETRIEVAL_CHUNKS,
+        content_ids=content_ids,
+        kind="content",
+        exact=content_ids is not None,
+    )
+
+
+async def retrieve(
+    query: Query,
+    k: Optional[int] = None,
+    documents: Optional[int] = None,
+    collection: Optional[str] = None,
+) -> Retrieval:
+    """The k chunks nearest to the query within the contents nearest to it."""
+    vector = await _vector(query)
+    found = await search_documents(vector, documents, collection)
+    if not found:
+        return Retrieval()
+    content_ids = [document.metadata["content_id"] for document, _ in found]
+    chunks = await search_chunks(vector, k, content_ids, collection)
+    return Retrieval(documents=found, chunks=chunks)
+
+
+async def backfill_documents(collection: Optional[str] = None) -> int:
+    """
+    Document vectors for the contents embedded before the document index existed,
+    averaged from their summary (or content) chunks in the chunk table.
+    """
+    chunks = get_vector_store(collection)
+    index = get_document_index(collection)
+    await chunks.ensure_schema()
+    connection = await index.ensure_schema()
+    query = sql.SQL(
+        """
+        INSERT INTO {documents} (id, content_id, kind, chunk, document, metadata, embedding)
+        SELECT gen_random_uuid()::text, content_id, 'document', 0,
+            CASE WHEN has_summary THEN string_agg(document, E'\\n\\n' ORDER BY chunk) ELSE ''
+            END,
+            jsonb_build_object(
+                'source', min(metadata->>'source'), 'content_id', content_id, 'kind', 'document'
+            ),
+            avg(embedding)::{column_type}
+        FROM (
+            SELECT *, bool_or(kind = 'summary') OVER (PARTITION BY content_id) AS has_summary
+            FROM {chunks}
+            WHERE content_id NOT IN (SELECT content_id FROM {documents})
+        ) AS chunks
+        WHERE (kind = 'summary') = has_summary
+        GROUP BY content_id, has_summary
+        """
+    ).format(
+        documents=sql.Identifier(index.table),
+        chunks=sql.Identifier(chunks.table),
+        column_type=index.config.column_type,
+    )
+    async with index.lock:
+        cursor = await connection.execute(query)
+    logger.info(f"Added {cursor.rowcount} contents to {index.table}")
+    return cursor.rowcount
@@ -0,0 +1,562 @@
+"""
+Chunk vectors in pgvector, one table per collection (pkms_vectors_<collection>), so every
+collection has its own dimensions, storage type and ANN index, and a query of one never
+scans another's rows.
+
+- VECTOR_STORAGE: `halfvec` stores 2 bytes per dimension instead of `vector`'s 4, at a
+  negligible loss of recall for embeddings (pgvector >= 0.7).
+- EMBEDDING_DIMENSIONS: text-embedding-3 vectors can be shortened (e.g. to 512), and
+  existing rows can be truncated and renormalized instead of embedded again.
+- VECTOR_INDEX: `hnsw` (m, ef_construction; ef_search per query) or `ivfflat` (lists;
+  probes per query), built with cosine distance. IVFFlat learns its lists from the rows,
+  so it is not created on first use: build it with `reindex` once the table is loaded.
+
+Maintenance, with the settings of the environment (or `poetry run vectors <command>`):
+
+    python -m universal_worker.processors.embedding_processor.vector_store stats
+    ... vector_store reindex  # index kind or parameters changed, --force to rebuild anyway
+    ... vector_store rebuild  # storage or dimensions changed, rows are converted
+    ... vector_store migrate  # copy the langchain_postgres collection of the same name
+    ... vector_store documents  # document vectors of contents embedded without them
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import re
+import uuid
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg
+from langchain_core.documents import Document
+from psycopg import sql
+
+from universal_worker.config import settings
+from universal_worker.exceptions import ContentProcessingError
+
+logger = logging.getLogger(__name__)
+
+TABLE_PREFIX = "pkms_vectors_"
+
+
+@dataclass(frozen=True)
+class IndexConfig:
+    kind: str = "hnsw"  # hnsw | ivfflat | none
+    storage: str = "halfvec"  # halfvec | vector
+    dimensions: int = 1536
+    m: int = 16
+    ef_construction: int = 64
+    lists: int = 0  # 0 sizes them to the rows when the index is built
+    ef_search: int = 40
+    probes: int = 0  # 0 probes sqrt(lists)
+
+    @classmethod
+    def from_settings(cls) -> "IndexConfig":
+        return cls(
+            kind=settings.VECTOR_INDEX,
+            storage=settings.VECTOR_STORAGE,
+            dimensions=settings.EMBEDDING_DIMENSIONS,
+            m=settings.VECTOR_HNSW_M,
+            ef_construction=settings.VECTOR_HNSW_EF_CONSTRUCTION,
+            lists=settings.VECTOR_IVFFLAT_LISTS,
+            ef_search=settings.VECTOR_HNSW_EF_SEARCH,
+            probes=settings.VECTOR_IVFFLAT_PROBES,
+        )
+
+    @property
+    def column_type(self) -> sql.SQL:
+        return sql.SQL(f"{self.storage}({int(self.dimensions)})")
+
+    def build_parameters(self) -> Dict[str, Any]:
+        """What the index is built with, changes of the query time parameters need no rebuild."""
+        parameters: Dict[str, Any] = {"kind": self.kind, "storage": self.storage}
+        if self.kind == "hnsw":
+            parameters.update(m=self.m, ef_construction=self.ef_construction)
+        elif self.kind == "ivfflat":
+            parameters.update(lists=self.lists)
+        return parameters
+
+
+def ivfflat_lists(rows: int) -> int:
+    # pgvector's recommendation: rows / 1000 up to 1M rows, sqrt(rows) above
+    if rows > 1_000_000:
+        return int(math.sqrt(rows))
+    return max(10, rows // 1000)
+
+
+def table_name(collection: str) -> str:
+    return TABLE_PREFIX + re.sub(r"[^a-z0-9_]", "_", collection.lower())
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    # float32 precision, three times faster to format than repr's 17 digits
+    return "[" + ",".join([f"{value:.7g}" for value in vector]) + "]"
+
+
+def connection_url() -> str:
+    # the setting is an SQLAlchemy URL, postgresql+psycopg://
+    return settings.VECTOR_DB_URL.replace("+psycopg", "", 1)
+
+
+class VectorStore:
+    def __init__(self, collection: str, config: IndexConfig, url: Optional[str] = None):
+        self.collection = collection
+        self.config = config
+        self.url = url or connection_url()
+        self.table = table_name(collection)
+        self.connection: Optional[psycopg.AsyncConnection] = None
+        self.lock = asyncio.Lock()
+        self.schema_ready = False
+
+    @property
+    def index_name(self) -> str:
+        return f"{self.table}_embedding_idx"
+
+    async def connect(self) -> psycopg.AsyncConnection:
+        if self.connection is None or self.connection.closed:
+            self.connection = await psycopg.AsyncConnection.connect(self.url, autocommit=True)
+            self.schema_ready = False
+        return self.connection
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+    async def _create_table(self, connection: psycopg.AsyncConnection, table: str) -> None:
+        await connection.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        await connection.execute(
+            sql.SQL(
+                """
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id text PRIMARY KEY,
+                    content_id text NOT NULL,
+                    kind text NOT NULL DEFAULT 'content',
+                    chunk integer NOT NULL DEFAULT 0,
+                    document text NOT NULL,
+                    metadata jsonb NOT NULL DEFAULT '{{}}',
+                    embedding {column_type} NOT NULL
+                )
+                """
+            ).format(table=sql.Identifier(table), column_type=self.config.column_type)
+        )
+        await connection.execute(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} (content_id)").format(
+                index=sql.Identifier(f"{table}_content_id_idx"), table=sql.Identifier(table)
+            )
+        )
+
+    async def _column_type(self, connection: psycopg.AsyncConnection) -> Optional[str]:
+        cursor = await connection.execute(
+            """
+            SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = to_regclass(%s) AND attname = 'embedding'
+            """,
+            (self.table,),
+        )
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def ensure_schema(self) -> psycopg.AsyncConnection:
+        """
+        The table and an HNSW index, created on first use (IVFFlat is left to `reindex`).
+        Refuses a table of other dimensions.
+        """
+        connection = await self.connect()
+        if self.schema_ready:
+            return connection
+        await self._create_table(connection, self.table)
+        column_type = await self._column_type(connection)
+        expected = self.config.column_type.as_string(connection)
+        if column_type != expected:
+            raise ContentProcessingError(
+                f"{self.table} stores {column_type}, the settings ask for {expected}; "
+                "convert it with `vector_store rebuild`"
+            )
+        if await self._index_parameters(connection) is None:
+            if self.config.kind == "hnsw":
+                await self._create_index(connection, self.table, self.index_name)
+            elif self.config.kind == "ivfflat":
+                # its lists are learned from the rows, an index built on an empty or
+                # half loaded table recalls poorly
+                logger.warning(
+                    f"{self.table} has no ivfflat index yet, build it with "
+                    "`vector_store reindex` once the table is loaded"
+                )
+        self.schema_ready = True
+        return connection
+
+    async def _index_parameters(self, connection: psycopg.AsyncConnection) -> Optional[dict]:
+        cursor = await connection.execute(
+            "SELECT obj_description(to_regclass(%s), 'pg_class'), to_regclass(%s) IS NOT NULL",
+            (self.index_name, self.index_name),
+        )
+        description, exists = await cursor.fetchone()  # type: ignore[misc]
+        if not exists:
+            return None
+        return json.loads(description) if description else {}
+
+    async def _create_index(
+        self, connection: psycopg.AsyncConnection, table: str, index: str
+    ) -> Dict[str, Any]:
+        config = self.config
+        if config.kind == "hnsw":
+            options = sql.SQL("USING hnsw (embedding {ops}) WITH (m = {m}, ef_construction = {ef})")
+            options = options.format(
+                ops=sql.SQL(f"{config.storage}_cosine_ops"),
+                m=sql.Literal(config.m),
+                ef=sql.Literal(config.ef_construction),
+            )
+        elif config.kind == "ivfflat":
+            cursor = await connection.execute(
+                sql.SQL("SELECT count(*) FROM {table}").format(table=sql.Identifier(table))
+            )
+            rows = (await cursor.fetchone())[0]  # type: ignore[index]
+            config = replace(config, lists=config.lists or ivfflat_lists(rows))
+            options = sql.SQL("USING ivfflat (embedding {ops}) WITH (lists = {lists})").format(
+                ops=sql.SQL(f"{config.storage}_cosine_ops"), lists=sql.Literal(config.lists)
+            )
+        else:
+            raise ValueError(f"Unknown vector index {config.kind}")
+
+        parameters = config.build_parameters()
+        logger.info(f"Building the {config.kind} index of {table}: {parameters}")
+        await connection.execute(
+            sql.SQL("SET maintenance_work_mem = {}").format(
+                sql.Literal(settings.VECTOR_MAINTENANCE_WORK_MEM)
+            )
+        )
+        await connection.execute(
+            sql.SQL("CREATE INDEX {index} ON {table} ").format(
+                index=sql.Identifier(index), table=sql.Identifier(table)
+            )
+            + options
+        )
+        # the parameters it was built with, to tell whether a reindex is needed
+        await connection.execute(
+            sql.SQL("COMMENT ON INDEX {index} IS {parameters}").format(
+                index=sql.Identifier(index), parameters=sql.Literal(json.dumps(parameters))
+            )
+        )
+        return parameters
+
+    async def reindex(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """Rebuild the ANN index if its kind or build parameters changed."""
+        async with self.lock:
+            connection = await self.ensure_schema()
+            current = await self._index_parameters(connection)
+            wanted = self.config.build_parameters()
+            if wanted.get("lists") == 0 and current is not None:
+                # lists sized to the rows when built count as unchanged
+                current = {**current, "lists": 0} if "lists" in current else current
+            if current == wanted and not force:
+                logger.info(f"The index of {self.table} is up to date: {current}")
+                return current
+            await connection.execute(
+                sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(self.index_name))
+            )
+            if self.config.kind == "none":
+                return None
+            return await self._create_index(connection, self.table, self.index_name)
+
+    async def replace_content(
+        self, content_id: str, documents: Sequence[Document], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        """Store the chunks of a content, replacing any it had, in one transaction."""
+        async with self.lock:
+            connection = await self.ensure_schema()
+            async with connection.transaction():
+                await connection.execute(
+                    sql.SQL("DELETE FROM {table} WHERE content_id = %s").format(
+                        table=sql.Identifier(self.table)
+                    ),
+                    (content_id,),
+                )
+                await self._copy(connection, content_id, documents, vectors)
+
+    async def add(
+        self, documents: Sequence[Document], vectors: Sequence[Sequence[float]]
+    ) -> None:
+        async with self.lock:
+            connection = await self.ensure_schema()
+            async with connection.transaction():
+                await self._copy(connection, None, documents, vectors)
+
+    async def _copy(
+        self,
+        connection: psycopg.AsyncConnection,
+        content_id: Optional[str],
+        documents: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        statement = sql.SQL(
+            "COPY {table} (id, content_id, kind, chunk, document, metadata, embedding) "
+            "FROM STDIN"
+        ).format(table=sql.Identifier(self.table))
+        async with connection.cursor() as cursor:
+            async with cursor.copy(statement) as copy:
+                for document, vector in zip(documents, vectors):
+                    metadata = document.metadata
+                    await copy.write_row(
+                        (
+                            str(uuid.uuid4()),
+                            content_id or metadata["content_id"],
+                            metadata.get("kind", "content"),
+                            metadata.get("chunk", 0),
+                            document.page_content,
+                            json.dumps(metadata),
+                            vector_literal(vector),
+                        )
+                    )
+
+    async def search(
+        self,
+        vector: Sequence[float],
+        k: int,
+        content_ids: Optional[Sequence[str]] = None,
+        kind: Optional[str] = None,
+        exact: bool = False,
+    ) -> List[Tuple[Document, float]]:
+        """
+        The k nearest chunks by cosine distance, optionally within some contents. `exact`
+        filters first and compares every remaining row: the ANN index would return its
+        ef_search nearest of all contents and drop those of other contents afterwards.
+        """
+        conditions = []
+        parameters: Dict[str, Any] = {"vector": vector_literal(vector)}
+        if content_ids is not None:
+            conditions.append(sql.SQL("content_id = ANY(%(content_ids)s)"))
+            parameters["content_ids"] = list(content_ids)
+        if kind is not None:
+            conditions.append(sql.SQL("kind = %(kind)s"))
+            parameters["kind"] = kind
+        where = sql.SQL("")
+        if conditions:
+            where = sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        source: sql.Composable = sql.SQL("{table}{where}").format(
+            table=sql.Identifier(self.table), where=where
+        )
+        prefix: sql.Composable = sql.SQL("")
+        if exact:
+            # a materialized CTE is planned on its own, the ANN index cannot order its rows
+            prefix = sql.SQL("WITH candidates AS MATERIALIZED (SELECT * FROM {}) ").format(source)
+            source = sql.SQL("candidates")
+        query = prefix + sql.SQL(
+            "SELECT document, metadata, embedding <=> %(vector)s::{column_type} AS distance "
+            "FROM {source} ORDER BY distance LIMIT {k}"
+        ).format(column_type=self.config.column_type, source=source, k=sql.Literal(k))
+        async with self.lock:
+            connection = await self.ensure_schema()
+            async with connection.transaction():
+                await self._set_search_parameters(connection, k)
+                cursor = await connection.execute(query, parameters)
+                rows = await cursor.fetchall()
+        return [
+            (Document(page_content=document, metadata=metadata), distance)
+            for document, metadata, distance in rows
+        ]
+
+    async def _set_search_parameters(self, connection: psycopg.AsyncConnection, k: int) -> None:
+        if self.config.kind == "hnsw":
+            # an HNSW scan returns at most ef_search rows
+            ef_search = max(self.config.ef_search, k)
+            await connection.execute(
+                sql.SQL("SET LOCAL hnsw.ef_search = {}").format(sql.Literal(ef_search))
+            )
+        elif self.config.kind == "ivfflat":
+            probes = self.config.probes
+            if not probes:
+                current = await self._index_parameters(connection) or {}
+                probes = max(1, int(math.sqrt(current.get("lists", 100))))
+            await connection.execute(
+                sql.SQL("SET LOCAL ivfflat.probes = {}").format(sql.Literal(probes))
+            )
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self.lock:
+            connection = await self.ensure_schema()
+            cursor = await connection.execute(
+                sql.SQL(
+                    "SELECT count(*), pg_table_size(%s), pg_indexes_size(%s), "
+                    "pg_relation_size(to_regclass(%s)) FROM {table}"
+                ).format(table=sql.Identifier(self.table)),
+                (self.table, self.table, self.index_name),
+            )
+            row = await cursor.fetchone()
+            rows, table_bytes, indexes_bytes, ann_bytes = row  # type: ignore[misc]
+            return {
+                "table": self.table,
+                "rows": rows,
+                "column": await self._column_type(connection),
+                "index": await self._index_parameters(connection),
+                "table_bytes": table_bytes,
+                "ann_index_bytes": ann_bytes or 0,
+                "indexes_bytes": indexes_bytes,
+            }
+
+    def _converted_embedding(self, source_dimensions: Optional[int]) -> sql.Composable:
+        """The source embedding as this store's column type, shortened and renormalized."""
+        dimensions = self.config.dimensions
+        if source_dimensions is not None and source_dimensions < dimensions:
+            raise ContentProcessingError(
+                f"Cannot convert {source_dimensions} to {dimensions} dimensions, embed again"
+            )
+        expression = sql.SQL("embedding::vector")
+        if source_dimensions is None or source_dimensions > dimensions:
+            # text-embedding-3 vectors keep their meaning when shortened (pgvector >= 0.7)
+            expression = sql.SQL("l2_normalize(subvector(embedding::vector, 1, {}))").format(
+                sql.Literal(dimensions)
+            )
+        return sql.SQL("({})::{}").format(expression, self.config.column_type)
+
+    async def rebuild(self, source: sql.Composable, source_dimensions: Optional[int]) -> int:
+        """
+        Convert the rows of a query (id, content_id, kind, chunk, document, metadata,
+        embedding) into a new table with this store's configuration, build its index and
+        swap it in place of the current one. All in one transaction that holds a SHARE
+        lock on the current table: searches go on, the embedders' writes wait for the swap
+        instead of landing in the table that is being replaced.
+        """
+        staging = f"{self.table}_staging"
+        staging_index = f"{staging}_embedding_idx"
+        async with self.lock:
+            connection = await self.connect()
+            async with connection.transaction():
+                cursor = await connection.execute("SELECT to_regclass(%s)", (self.table,))
+                if (await cursor.fetchone())[0] is not None:  # type: ignore[index]
+                    await connection.execute(
+                        sql.SQL("LOCK TABLE {} IN SHARE MODE").format(sql.Identifier(self.table))
+                    )
+                await connection.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(staging))
+                )
+                await self._create_table(connection, staging)
+                cursor = await connection.execute(
+                    sql.SQL(
+                        "INSERT INTO {staging} "
+                        "SELECT id, content_id, kind, chunk, document, metadata, {embedding} "
+                        "FROM ({source}) AS source"
+                    ).format(
+                        staging=sql.Identifier(staging),
+                        embedding=self._converted_embedding(source_dimensions),
+                        source=source,
+                    )
+                )
+                rows = cursor.rowcount
+                logger.info(f"Converted {rows} rows into {staging}")
+                if self.config.kind != "none":
+                    await self._create_index(connection, staging, staging_index)
+
+                await connection.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(self.table))
+                )
+                await connection.execute(
+                    sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                        sql.Identifier(staging), sql.Identifier(self.table)
+                    )
+                )
+                for suffix in ("embedding_idx", "content_id_idx", "pkey"):
+                    await connection.execute(
+                        sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+                            sql.Identifier(f"{staging}_{suffix}"),
+                            sql.Identifier(f"{self.table}_{suffix}"),
+                        )
+                    )
+            self.schema_ready = False
+            return rows
+
+    async def rebuild_in_place(self) -> int:
+        """Convert this collection's table to the configured storage and dimensions."""
+        connection = await self.connect()
+        column_type = await self._column_type(connection)
+        if column_type is None:
+            raise ContentProcessingError(f"{self.table} does not exist")
+        match = re.search(r"\((\d+)\)", column_type)
+        source = sql.SQL(
+            "SELECT id, content_id, kind, chunk, document, metadata, embedding FROM {}"
+        ).format(sql.Identifier(self.table))
+        return await self.rebuild(source, int(match.group(1)) if match else None)
+
+    async def migrate_langchain(self) -> int:
+        """
+        Convert the langchain_postgres collection of the same name into this store. The
+        langchain embedder split the summary with the content under the same metadata, so
+        its summary chunks cannot be told apart and are migrated as kind 'content', mixed
+        in with the content chunks until the content is embedded again.
+        """
+        rows = sql.SQL(
+            """
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+            WHERE c.name = {collection}
+            """
+        ).format(collection=sql.Literal(self.collection))
+        connection = await self.connect()
+        # the langchain column has no dimensions, the rows of a collection share them
+        cursor = await connection.execute(
+            sql.SQL("SELECT DISTINCT vector_dims(e.embedding) ") + rows
+        )
+        dimensions = [row[0] for row in await cursor.fetchall()]
+        source = (
+            sql.SQL(
+                """
+                SELECT e.id, coalesce(e.cmetadata->>'content_id', e.id) AS content_id,
+                    coalesce(e.cmetadata->>'kind', 'content') AS kind,
+                    coalesce((e.cmetadata->>'chunk')::integer, 0) AS chunk,
+                    e.document, coalesce(e.cmetadata, '{}'::jsonb) AS metadata, e.embedding
+                """
+            )
+            + rows
+        )
+        return await self.rebuild(source, dimensions[0] if len(dimensions) == 1 else None)
+
+
+_stores: Dict[str, VectorStore] = {}
+
+
+def get_vector_store(collection: Optional[str] = None) -> VectorStore:
+    collection = collection or settings.COLLECTION_NAME
+    if collection not in _stores:
+        _stores[collection] = VectorStore(collection, IndexConfig.from_settings())
+    return _stores[collection]
+
+
+async def _run(command: str, collection: str, force: bool = False) -> None:
+    store = get_vector_store(collection)
+    try:
+        if command == "stats":
+            print(json.dumps(await store.stats(), indent=2))
+        elif command == "reindex":
+            print(json.dumps(await store.reindex(force=force)))
+        elif command == "rebuild":
+            print(f"{await store.rebuild_in_place()} rows converted")
+        elif command == "migrate":
+            print(f"{await store.migrate_langchain()} rows migrated")
+        elif command == "documents":
+            from .retrieval import backfill_documents, get_document_index
+
+            try:
+                print(f"{await backfill_documents(collection)} contents added")
+            finally:
+                await get_document_index(collection).close()
+    finally:
+        await store.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the pgvector tables of the chunks")
+    parser.add_argument("command", choices=["stats", "reindex", "rebuild", "migrate", "documents"])
+    parser.add_argument("--collection", default=settings.COLLECTION_NAME)
+    parser.add_argument(
+        "--force", action="store_true", help="reindex even if the index parameters are unchanged"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_run(args.command, args.collection, args.force))
+
+
+if __name__ == "__main__":
+    main()
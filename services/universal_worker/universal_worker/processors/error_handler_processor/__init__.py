@@ -0,0 +1,3 @@
+from .error_handler_processor import ErrorHandlerProcessor
+
+__all__ = ["ErrorHandlerProcessor"]
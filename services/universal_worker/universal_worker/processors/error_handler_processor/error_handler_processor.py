@@ -0,0 +1,65 @@
+import logging
+import time
+from typing import Any, Dict, Tuple
+
+from pydantic import ValidationError
+
+from universal_worker.config import settings
+from universal_worker.exceptions import ContentProcessingError
+from universal_worker.models import FailedMessage
+from universal_worker.retry import RETRY_COUNT_HEADER, retry_queue, retry_tier
+from universal_worker.utils import metrics
+from universal_worker.utils.notifier import release_in_flight
+from workflow_base import BaseProcessor
+
+from .triage import Verdict, classify
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorHandlerProcessor(BaseProcessor):
+    """
+    Consumes the error queue: transient failures are sent back to their stage through a
+    delay queue (see retry.py), permanent failures and exhausted retries are parked in
+    PARKED_QUEUE with the verdict.
+    """
+
+    async def process_content(
+        self, content: Dict[str, Any]
+    ) -> Tuple[str, Dict[str, Any]] | Tuple[str, Dict[str, Any], Dict[str, Any]]:
+        try:
+            failed = FailedMessage.model_validate(content)
+        except ValidationError as e:
+            raise ContentProcessingError(f"Not a failed message: {str(e)}")
+
+        stage = failed.original_queue
+        verdict, reason = classify(failed)
+        retryable = isinstance(failed.body, dict)
+        if verdict == Verdict.TRANSIENT and retryable:
+            if failed.retry_count < settings.ERROR_MAX_RETRIES:
+                tier = retry_tier(failed.retry_count, failed.retry_after)
+                logger.info(
+                    f"Retrying message of {stage} in {settings.ERROR_RETRY_DELAYS[tier]}s "
+                    f"(attempt {failed.retry_count + 1}, {reason}): {failed.error}"
+                )
+                metrics.increment("failures_retried", stage=stage, reason=reason, tier=tier)
+                return (
+                    retry_queue(stage, tier),
+                    failed.body,
+                    {RETRY_COUNT_HEADER: failed.retry_count + 1},
+                )
+            metrics.increment("retries_exhausted", stage=stage)
+
+        logger.warning(
+            f"Parking message of {stage} ({verdict.value}, {reason}, "
+            f"{failed.retry_count} retries): {failed.error}"
+        )
+        metrics.increment("failures_parked", stage=stage, reason=reason, verdict=verdict.value)
+        if isinstance(failed.body, dict):
+            await release_in_flight(failed.body.get("idempotency_key"))
+        return settings.PARKED_QUEUE, {
+            **content,
+            "verdict": verdict.value,
+            "reason": reason,
+            "parked_at": time.time(),
+        }
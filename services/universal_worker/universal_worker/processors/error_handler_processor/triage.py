@@ -0,0 +1,64 @@
+import re
+from enum import Enum
+from typing import Tuple
+
+from universal_worker.models import FailedMessage
+
+# statuses worth retrying later, any other 4xx will fail the same way again
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_TYPES = {
+    # asyncio / OS
+    "TimeoutError", "ConnectionError", "ConnectionResetError", "ConnectionRefusedError",
+    "ConnectionAbortedError", "BrokenPipeError",
+    # httpx
+    "TimeoutException", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "NetworkError", "ConnectError", "ReadError", "WriteError", "RemoteProtocolError",
+    # openai / google SDKs
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TooManyRequests",
+    # aio_pika / sqlalchemy
+    "AMQPConnectionError", "OperationalError",
+}  # fmt: skip
+PERMANENT_ERROR_TYPES = {
+    "ValidationError", "ContentAlreadyExistsError", "JSONDecodeError", "UnicodeDecodeError",
+    "PdfReadError",
+}  # fmt: skip
+# processors wrap most errors in a ContentProcessingError, leaving only the message
+PERMANENT_PATTERN = re.compile(
+    r"validation failed|unknown content type|not a pdf|larger than|already exists|"
+    r"status: (?:400|401|403|404|410|422)\b",
+    re.IGNORECASE,
+)
+TRANSIENT_PATTERN = re.compile(
+    r"\b(?:429|502|503|504)\b|rate.?limit|resource.?exhausted|quota|timed? ?out|timeout|"
+    r"temporar|unavailable|overloaded|try again|connection (?:reset|refused|closed|error)|"
+    r"network error",
+    re.IGNORECASE,
+)
+
+
+class Verdict(str, Enum):
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+
+def classify(failed: FailedMessage) -> Tuple[Verdict, str]:
+    """Whether the failure is worth retrying, with the reason (used as metric label)."""
+    if failed.status_code is not None:
+        if failed.status_code in TRANSIENT_STATUS_CODES:
+            return Verdict.TRANSIENT, f"status_{failed.status_code}"
+        if 400 <= failed.status_code < 500:
+            return Verdict.PERMANENT, f"status_{failed.status_code}"
+
+    for error_type in failed.error_chain or [failed.error_type]:
+        if error_type in PERMANENT_ERROR_TYPES:
+            return Verdict.PERMANENT, error_type
+        if error_type in TRANSIENT_ERROR_TYPES:
+            return Verdict.TRANSIENT, error_type
+
+    if PERMANENT_PATTERN.search(failed.error):
+        return Verdict.PERMANENT, "message"
+    if TRANSIENT_PATTERN.search(failed.error):
+        return Verdict.TRANSIENT, "message"
+    # unknown failures are parked for a look rather than retried in a loop
+    return Verdict.PERMANENT, "unknown"
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from universal_worker.config import settings
+from universal_worker.exceptions import DeliveryError
+from universal_worker.utils import metrics
+from universal_worker.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+MAX_TELEGRAM_STREAMS = 1000
+
+
+@dataclass
+class TelegramMessage:
+    chat_id: str
+    text: str
+    url: str
+    reply_to_message_id: Optional[str] = None
+    # see NotificationMessage.stream_id / partial
+    stream_id: Optional[str] = None
+    partial: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # resolved once the message is delivered (or skipped), failed with a DeliveryError
+    delivered: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    @property
+    def coalescable(self) -> bool:
+        return self.stream_id is None
+
+
+class TelegramDispatcher:
+    """
+    Delivers Telegram messages through per-chat queues. `send` returns once the message
+    is delivered and raises a DeliveryError if it can't be, so the notifier acks its
+    RabbitMQ message only then and failures go through the error queue's retries.
+
+    - a global and a per-chat token bucket keep us below Telegram's rate limits, a 429
+      drains the chat's bucket for the `retry_after` Telegram asks for before retrying
+    - plain notifications that pile up for the same chat are sent as a single digest
+      message, a burst gets TELEGRAM_COALESCE_WINDOW to pile up (the notifier needs a
+      WORKER_CONCURRENCY above 1 for that, it waits for each delivery)
+    - streamed notifications post one message and edit it; a partial update that is
+      superseded by a newer one still in the queue is skipped
+    - one HTTP client is reused for all requests
+    """
+
+    def __init__(self):
+        self.api_url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}"
+        self.global_bucket = TokenBucket(
+            capacity=settings.TELEGRAM_GLOBAL_RATE, rate=settings.TELEGRAM_GLOBAL_RATE
+        )
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self.queues: Dict[str, Deque[TelegramMessage]] = {}
+        self.workers: Dict[str, asyncio.Task] = {}
+        # stream_id -> (telegram message_id, time of the last edit)
+        self.streams: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self.pending = 0
+        self.has_capacity = asyncio.Event()
+        self.has_capacity.set()
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(30.0))
+        return self._client
+
+    async def send(self, message: TelegramMessage) -> None:
+        """Queue the message and wait until it is delivered."""
+        await self.submit(message)
+        await message.delivered  # type: ignore[misc]
+
+    async def submit(self, message: TelegramMessage) -> asyncio.Future:
+        """
+        Queue the message and return the future of its delivery; waits while too many
+        messages are pending (backpressure).
+        """
+        while self.pending >= settings.TELEGRAM_MAX_PENDING:
+            self.has_capacity.clear()
+            await self.has_capacity.wait()
+
+        message.delivered = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(message.chat_id, deque()).append(message)
+        self.pending += 1
+        self.drained.clear()
+        worker = self.workers.get(message.chat_id)
+        if worker is None or worker.done():
+            self.workers[message.chat_id] = asyncio.create_task(
+                self._run_chat(message.chat_id)
+            )
+        return message.delivered
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far has been delivered."""
+        await self.drained.wait()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+
+    def _done(self, count: int = 1) -> None:
+        self.pending -= count
+        if self.pending < settings.TELEGRAM_MAX_PENDING:
+            self.has_capacity.set()
+        if self.pending == 0:
+            self.drained.set()
+
+    async def _run_chat(self, chat_id: str) -> None:
+        queue = self.queues[chat_id]
+        while queue:
+            message: Optional[TelegramMessage] = queue[0]
+            if queue[0].coalescable:
+                if len(queue) > 1 and queue[1].coalescable:
+                    # a burst for this chat, give it the chance to pile up and send it at once
+                    await asyncio.sleep(settings.TELEGRAM_COALESCE_WINDOW)
+                batch = self._take_coalescable(queue)
+                message = self._digest(batch)
+            else:
+                batch = [queue.popleft()]
+                if batch[0].partial and any(
+                    other.stream_id == batch[0].stream_id for other in queue
+                ):
+                    # a newer update of the same stream is already waiting
+                    metrics.increment("telegram_skipped_updates")
+                    message = None
+
+            try:
+                if message is not None:
+                    await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Error delivering Telegram message to {chat_id}: {e}")
+                error = e if isinstance(e, DeliveryError) else DeliveryError(str(e))
+                self._settle(batch, error)
+            else:
+                self._settle(batch)
+            finally:
+                self._done(len(batch))
+        del self.queues[chat_id]
+        self.workers.pop(chat_id, None)
+
+    @staticmethod
+    def _settle(batch: List[TelegramMessage], error: Optional[Exception] = None) -> None:
+        for message in batch:
+            if message.delivered is None or message.delivered.done():
+                continue
+            if error is None:
+                message.delivered.set_result(None)
+            else:
+                message.delivered.set_exception(error)
+
+    def _take_coalescable(self, queue: Deque[TelegramMessage]) -> List[TelegramMessage]:
+        """The plain messages at the head of the queue, streamed ones keep their place."""
+        batch: List[TelegramMessage] = []
+        length = 0
+        while queue and queue[0].coalescable:
+            message = queue[0]
+            if batch and length + len(message.text) + 2 > TELEGRAM_MAX_MESSAGE_LENGTH:
+                break
+            batch.append(queue.popleft())
+            length += len(message.text) + 2
+        return batch
+
+    def _digest(self, batch: List[TelegramMessage]) -> TelegramMessage:
+        if len(batch) == 1:
+            return batch[0]
+        metrics.increment("telegram_coalesced", len(batch))
+        logger.info(f"Coalescing {len(batch)} notifications for chat {batch[0].chat_id}")
+        text = "\n\n".join(f"{message.url}\n{message.text}" for message in batch)
+        return TelegramMessage(
+            chat_id=batch[0].chat_id,
+            text=f"{len(batch)} updates:\n\n{text}",
+            url=", ".join(message.url for message in batch),
+            reply_to_message_id=batch[0].reply_to_message_id,
+        )
+
+    def _request(self, message: TelegramMessage) -> Tuple[str, Dict[str, Any]]:
+        text = message.text[:TELEGRAM_MAX_MESSAGE_LENGTH]
+        stream = self.streams.get(message.stream_id) if message.stream_id else None
+        if stream is not None:
+            return "editMessageText", {
+                "chat_id": message.chat_id,
+                "message_id": stream[0],
+                "text": text,
+            }
+        payload: Dict[str, Any] = {"chat_id": message.chat_id, "text": text}
+        if message.reply_to_message_id:
+            payload["reply_to_message_id"] = message.reply_to_message_id
+        return "sendMessage", payload
+
+    async def _deliver(self, message: TelegramMessage) -> None:
+        chat_bucket = self.chat_buckets.setdefault(
+            message.chat_id,
+            TokenBucket(capacity=settings.TELEGRAM_CHAT_BURST, rate=settings.TELEGRAM_CHAT_RATE),
+        )
+
+        status_code: Optional[int] = None
+        retry_after: Optional[float] = None
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            method, payload = self._request(message)
+            if method == "editMessageText":
+                # don't edit the same message more often than TELEGRAM_EDIT_INTERVAL
+                _, last_edit_at = self.streams[message.stream_id]  # type: ignore[index]
+                wait = settings.TELEGRAM_EDIT_INTERVAL - (time.monotonic() - last_edit_at)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+            await self.global_bucket.acquire()
+            await chat_bucket.acquire()
+
+            try:
+                response = await self.client.post(f"{self.api_url}/{method}", json=payload)
+            except httpx.RequestError as e:
+                logger.warning(
+                    f"Error sending notification to Telegram (attempt {attempt + 1}): {e}"
+                )
+                await asyncio.sleep(2**attempt)
+                continue
+
+            if response.status_code == 200:
+                self._track_stream(message, method, response)
+                metrics.increment("telegram_sent", method=method)
+                metrics.observe(
+                    "telegram_delivery_seconds", time.monotonic() - message.enqueued_at
+                )
+                logger.info(f"Notification sent to Telegram for content: {message.url}")
+                return
+
+            status_code = response.status_code
+            if response.status_code == 429:
+                retry_after = _retry_after(response)
+                logger.info(
+                    f"Telegram rate limited chat {message.chat_id}, retrying in {retry_after}s"
+                )
+                metrics.increment("telegram_rate_limited")
+                chat_bucket.drain(retry_after)
+                continue
+
+            if "message is not modified" in response.text:
+                return
+
+            metrics.increment("telegram_failed", method=method)
+            raise DeliveryError(
+                f"Failed to send notification to Telegram. Status: {response.status_code}, "
+                f"Error: {response.text}",
+                status_code=response.status_code,
+            )
+
+        metrics.increment("telegram_failed", method="retries_exhausted")
+        raise DeliveryError(
+            f"Giving up on Telegram notification for content: {message.url}, "
+            "Telegram unavailable",
+            status_code=status_code,
+            retry_after=retry_after,
+        )
+
+    def _track_stream(
+        self, message: TelegramMessage, method: str, response: httpx.Response
+    ) -> None:
+        if message.stream_id is None:
+            return
+        if not message.partial:
+            self.streams.pop(message.stream_id, None)
+            return
+        if method == "sendMessage":
+            telegram_message_id = response.json()["result"]["message_id"]
+        else:
+            telegram_message_id = self.streams[message.stream_id][0]
+        self.streams[message.stream_id] = (telegram_message_id, time.monotonic())
+        if len(self.streams) > MAX_TELEGRAM_STREAMS:
+            self.streams.popitem(last=False)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """Seconds Telegram asks to wait after a 429, from the body or the Retry-After header."""
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(response.headers.get("retry-after", 1))
+    except ValueError:
+        return 1.0
+
+
+telegram_dispatcher = TelegramDispatcher()
@@ -2,8 +2,8 @@ import logging
 
 from universal_worker.exceptions import ContentProcessingError
 from universal_worker.models import NotificationMessage
-from universal_worker.config import settings
-import httpx
+
+from .dispatcher import TelegramMessage, telegram_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -29,30 +29,19 @@ async def notify_telegram(message: NotificationMessage) -> None:
 
     telegram_source = message.source.telegram
 
-    logger.info(f"Sending notification to Telegram for content: {message.url}")
-    # Send notification to Telegram
-    url = f"https://api.telegram.org/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
-
-    response_message = build_response_message(message)
-    payload = {
-        "chat_id": telegram_source.chat_id,
-        "reply_to_message_id": telegram_source.message_id,
-        "text": response_message,
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload)
-            if response.status_code == 200:
-                logger.info(f"Notification sent to Telegram for content: {message.url}")
-            else:
-                logger.error(
-                    f"Failed to send notification to Telegram. Status: {response.status_code}, Error: {response.text}"
-                )
-        except httpx.RequestError as e:
-            logger.error(
-                f"An error occurred while sending notification to Telegram: {e}"
-            )
+    logger.info(f"Queueing notification to Telegram for content: {message.url}")
+    # rate limiting, retries and coalescing are handled by the dispatcher, the message is
+    # acked only once it is delivered
+    await telegram_dispatcher.send(
+        TelegramMessage(
+            chat_id=telegram_source.chat_id,
+            reply_to_message_id=telegram_source.message_id,
+            text=build_response_message(message),
+            url=message.url,
+            stream_id=message.stream_id,
+            partial=message.partial,
+        )
+    )
 
 
 notifiers = {
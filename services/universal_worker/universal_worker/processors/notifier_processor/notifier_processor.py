@@ -10,6 +10,7 @@ from universal_worker.exceptions import ContentProcessingError
 from universal_worker.models import NotificationMessage
 from workflow_base import BaseProcessor
 
+from .dispatcher import telegram_dispatcher
 from .notifier import notify
 
 logger = logging.getLogger(__name__)
@@ -39,6 +40,10 @@ class NotifierProcessor(BaseProcessor):
             logger.exception(f"Error processing content: {e}")
             raise ContentProcessingError(f"Error processing content: {str(e)}")
 
+    async def close(self) -> None:
+        """Deliver what is still queued on shutdown."""
+        await telegram_dispatcher.close()
+
     @property
     def handle_error(
         self,
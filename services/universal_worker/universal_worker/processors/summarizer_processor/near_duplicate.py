@@ -0,0 +1,222 @@
+"""
+Near-duplicate detection of content, so syndicated and mirrored copies of an article
+reuse the summary of the first copy instead of being summarized and embedded again.
+
+Documents are compared by MinHash signatures of their word shingles, looked up through
+LSH bands in a local SQLite index. The index can be rebuilt from the db-manager:
+
+    python -m universal_worker.processors.summarizer_processor.near_duplicate rebuild
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from universal_worker.config import settings
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_PATTERN = re.compile(r"!?\[([^\]]*)\]\([^)]*\)|[#*_`>|~-]+")
+WORD_PATTERN = re.compile(r"\w+")
+SIGNATURE_CHUNK = 4096  # shingles hashed at once, 4 MB per 128 permutations
+
+
+def shingles(text: str, size: int) -> np.ndarray:
+    """Hashes of the word n-grams of the text, ignoring markdown syntax and case."""
+    words = WORD_PATTERN.findall(MARKDOWN_PATTERN.sub(r" \1 ", text).lower())
+    grams = {" ".join(words[i : i + size]) for i in range(max(len(words) - size + 1, 1))}
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=4).digest(), "little")
+            for gram in grams
+        ),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class MinHasher:
+    """MinHash with multiply-shift hashing, reproducible through the fixed seed."""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        max_value = np.iinfo(np.uint64).max
+        self.a = rng.integers(1, max_value, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, max_value, size=num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        # (a * x + b) mod 2^64, keeping the high 32 bits; uint64 arithmetic wraps around.
+        # Folded over chunks of the hashes, so a long page never holds num_perm x shingles
+        minimum = np.full(len(self.a), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(hashes), SIGNATURE_CHUNK):
+            chunk = hashes[start : start + SIGNATURE_CHUNK]
+            with np.errstate(over="ignore"):
+                values = (np.outer(self.a, chunk) + self.b[:, None]) >> np.uint64(32)
+            np.minimum(minimum, values.min(axis=1), out=minimum)
+        return minimum.astype(np.uint32)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the documents behind two signatures."""
+    return float(np.mean(first == second))
+
+
+@dataclass
+class Match:
+    content_id: str
+    url: str
+    summary: str
+    similarity: float
+
+
+class NearDuplicateIndex:
+    """
+    LSH index over MinHash signatures: the signature is cut into `bands` bands and two
+    documents become candidates if any band is identical, then their estimated similarity
+    decides. With 16 bands of 8 rows, documents above ~0.7 similar are found reliably.
+    """
+
+    def __init__(self, path: str, num_perm: int, bands: int):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "content_id TEXT PRIMARY KEY, url TEXT NOT NULL, signature BLOB NOT NULL, "
+            "summary TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            "band INTEGER NOT NULL, key BLOB NOT NULL, content_id TEXT NOT NULL, "
+            "PRIMARY KEY (band, key, content_id))"
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(shingles(text, settings.NEAR_DUPLICATE_SHINGLE_SIZE))
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            rows = signature[band * self.rows : (band + 1) * self.rows]
+            yield band, hashlib.blake2b(rows.tobytes(), digest_size=8).digest()
+
+    def query(self, signature: np.ndarray, threshold: float) -> Optional[Match]:
+        """The most similar indexed document at or above the threshold, if any."""
+        with self.lock:
+            candidates = set()
+            for band, key in self._band_keys(signature):
+                rows = self.conn.execute(
+                    "SELECT content_id FROM bands WHERE band = ? AND key = ?", (band, key)
+                )
+                candidates.update(content_id for (content_id,) in rows)
+
+            best: Optional[Match] = None
+            for content_id in candidates:
+                row = self.conn.execute(
+                    "SELECT url, signature, summary FROM documents WHERE content_id = ?",
+                    (content_id,),
+                ).fetchone()
+                if row is None:
+                    continue
+                score = similarity(signature, np.frombuffer(row[1], dtype=np.uint32))
+                if score >= threshold and (best is None or score > best.similarity):
+                    best = Match(content_id, row[0], row[2], score)
+            return best
+
+    def add(self, content_id: str, url: str, signature: np.ndarray, summary: str) -> None:
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (content_id, url, signature.tobytes(), summary, time.time()),
+            )
+            self.conn.execute("DELETE FROM bands WHERE content_id = ?", (content_id,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO bands VALUES (?, ?, ?)",
+                [(band, key, content_id) for band, key in self._band_keys(signature)],
+            )
+            self.conn.execute("COMMIT")
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute("DELETE FROM bands")
+            self.conn.execute("DELETE FROM documents")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+_index: Optional[NearDuplicateIndex] = None
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex(
+            settings.NEAR_DUPLICATE_INDEX_PATH,
+            settings.NEAR_DUPLICATE_NUM_PERM,
+            settings.NEAR_DUPLICATE_BANDS,
+        )
+    return _index
+
+
+def is_indexable(text: Optional[str]) -> bool:
+    if not text:
+        return False
+    return len(WORD_PATTERN.findall(text)) >= settings.NEAR_DUPLICATE_MIN_WORDS
+
+
+async def rebuild(index: NearDuplicateIndex) -> int:
+    """Rebuild the index from all contents stored by the db-manager."""
+    async with httpx.AsyncClient(timeout=httpx.Timeout(300.0)) as client:
+        response = await client.get(f"{settings.DB_MANAGER_URL}/contents/")
+        response.raise_for_status()
+        contents = response.json()
+
+    index.clear()
+    count = 0
+    for content in contents:
+        metadata = content.get("metadata") or {}
+        if metadata.get("duplicate_of") or not content.get("summary"):
+            continue  # duplicates point at an indexed original already
+        if not is_indexable(content.get("raw_content")):
+            continue
+        signature = await asyncio.to_thread(index.signature, content["raw_content"])
+        # contents are stored with their content_id as pid
+        index.add(str(content["pid"]), content["url"], signature, content["summary"])
+        count += 1
+    logger.info(f"Rebuilt the near-duplicate index with {count} of {len(contents)} contents")
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the near-duplicate index")
+    parser.add_argument("command", choices=["rebuild", "stats"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = get_near_duplicate_index()
+    if args.command == "rebuild":
+        asyncio.run(rebuild(index))
+    print(f"{len(index)} documents in {settings.NEAR_DUPLICATE_INDEX_PATH}")
+
+
+if __name__ == "__main__":
+    main()
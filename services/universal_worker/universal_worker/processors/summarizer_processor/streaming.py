@@ -0,0 +1,62 @@
+import logging
+import time
+
+from universal_worker.config import settings
+from universal_worker.models import Content, NotificationMessage, NotificationType
+from universal_worker.utils.notifier import notify
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryStream:
+    """
+    Publishes the summary as it is generated, as partial notifications sharing the
+    content_id as stream_id. The notifier posts the first one and edits that message with
+    the following ones, so the user gets feedback long before the summary is stored.
+    """
+
+    def __init__(self, content: Content):
+        self.content = content
+        self.stream_id = content.content_id
+        self.interval = settings.SUMMARY_STREAM_INTERVAL
+        self.last_published_at = 0.0
+
+    async def _publish(
+        self,
+        text: str,
+        partial: bool = True,
+        notification_type: NotificationType = NotificationType.INFO,
+    ) -> None:
+        try:
+            await notify(
+                NotificationMessage(
+                    url=self.content.url,
+                    status=self.content.status,
+                    notification_type=notification_type,
+                    source=self.content.source,
+                    message=text,
+                    stream_id=self.stream_id,
+                    partial=partial,
+                )
+            )
+        except Exception as e:
+            # progress updates are best effort, the final notification still follows
+            logger.warning(f"Failed to publish summary progress: {e}")
+        self.last_published_at = time.monotonic()
+
+    async def start(self) -> None:
+        await self._publish(f"Summarizing {self.content.title or self.content.url} ...")
+
+    async def update(self, summary: str) -> None:
+        if time.monotonic() - self.last_published_at < self.interval:
+            return
+        await self._publish(f"Summarizing ...\n{summary}")
+
+    async def fail(self, error: Exception) -> None:
+        """End the stream with the failure, instead of leaving the progress message behind."""
+        await self._publish(
+            f"Summarizing {self.content.title or self.content.url} failed, it is retried "
+            f"if the failure is temporary.\n{error}",
+            partial=False,
+            notification_type=NotificationType.ERROR,
+        )
@@ -1,33 +1,30 @@
 import logging
-import re
+from typing import Awaitable, Callable, Optional
 
 import google.generativeai as genai
-from openai import OpenAI
+from openai import NOT_GIVEN, AsyncOpenAI
 
 from universal_worker.config import settings
-from universal_worker.exceptions import ContentProcessingError
+from universal_worker.exceptions import ContentProcessingError, SummarizationError
 from universal_worker.models import Content, ContentType
+from universal_worker.retry import error_status_code
+from universal_worker.utils.provider_scheduler import (
+    ProviderUnavailableError,
+    estimate_tokens,
+    llm_scheduler,
+)
+from universal_worker.utils.rate_limit import parse_rate_limit
+from universal_worker.utils.text import unwrap_first_codeblock
+from universal_worker.utils.tokens import (
+    fit_to_budget,
+    record_gemini_usage,
+    record_openai_usage,
+)
 
 logger = logging.getLogger(__name__)
 
-
-def unwrap_first_codeblock(response_text: str) -> str:
-    """
-    Cleans and unwraps the first code block by removing the first occurrence of code block delimiters.
-    """
-    # Replace the first code block using `re.subn` which allows limiting replacements
-    cleaned_text, num_subs = re.subn(
-        r"```.*?```", "", response_text, count=1, flags=re.DOTALL
-    )
-
-    if num_subs == 0:
-        # If no code block found, return the original text
-        return response_text
-
-    # Strip extra whitespace or newlines
-    cleaned_text = cleaned_text.strip()
-
-    return cleaned_text
+# receives the summary generated so far while it is streamed from the LLM
+SummaryUpdateCallback = Callable[[str], Awaitable[None]]
 
 
 def get_system_prompt(content_type: ContentType) -> str:
@@ -38,7 +35,9 @@ def get_system_prompt(content_type: ContentType) -> str:
             return "# IDENTITY and PURPOSE\n\nYou are an expert content summarizer. You take content in and output a Markdown formatted summary using the format below.\n\nTake a deep breath and think step by step about how to best accomplish this goal using the following steps.\n\n# OUTPUT SECTIONS\n\n- Combine all of your understanding of the content into a single, 20-word sentence in a section called ONE SENTENCE SUMMARY:.\n\n- Output the 10 most important points of the content as a list with no more than 15 words per point into a section called MAIN POINTS:.\n\n- Output a list of the 5 best takeaways from the content in a section called TAKEAWAYS:.\n\n# OUTPUT INSTRUCTIONS\n\n- Create the output using the formatting above.\n-Response using the original language in the input, do not translate or change language back to English.\n- You only output human readable Markdown.\n- Output numbered lists, not bullets.\n- Do not output warnings or notes—just the requested sections.\n- Do not repeat items in the output sections.\n- Do not start items with the same opening words."
 
 
-def summarize_content_gemini(content: Content) -> str:
+async def summarize_content_gemini(
+    content: Content, on_update: Optional[SummaryUpdateCallback] = None
+) -> str:
     logger.info("Summarizing content using Gemini")
     genai.configure(api_key=settings.GEMINI_API_KEY)
 
@@ -58,16 +57,29 @@ def summarize_content_gemini(content: Content) -> str:
     )
 
     chat_session = model.start_chat(history=[])
-    response = chat_session.send_message(content.raw_content)
-    return response.text
+    if on_update is None:
+        response = await chat_session.send_message_async(content.raw_content)
+        record_gemini_usage("summarize", response.usage_metadata)
+        return response.text
 
+    response = await chat_session.send_message_async(content.raw_content, stream=True)
+    summary = ""
+    async for chunk in response:
+        summary += chunk.text
+        await on_update(summary)
+    # the usage of the whole response, aggregated over the chunks
+    record_gemini_usage("summarize", response.usage_metadata)
+    return summary
 
-def summarize_content_openai(content: Content) -> str:
+
+async def summarize_content_openai(
+    content: Content, on_update: Optional[SummaryUpdateCallback] = None
+) -> str:
     logger.info("Summarizing content using OpenAI")
     try:
-        client = OpenAI()
+        client = AsyncOpenAI()
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {
@@ -84,9 +96,22 @@ def summarize_content_openai(content: Content) -> str:
             top_p=1,
             frequency_penalty=0,
             presence_penalty=0,
+            stream=on_update is not None,
+            # the usage of a streamed response comes in a last chunk without choices
+            stream_options={"include_usage": True} if on_update is not None else NOT_GIVEN,
         )
 
-        summarized_content = response.choices[0].message.content
+        if on_update is None:
+            record_openai_usage("summarize", response.usage)
+            summarized_content = response.choices[0].message.content
+        else:
+            summarized_content = ""
+            async for chunk in response:
+                if chunk.usage:
+                    record_openai_usage("summarize", chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    summarized_content += chunk.choices[0].delta.content
+                    await on_update(summarized_content)
         if not summarized_content:
             raise ContentProcessingError("Failed to summarize content")
         return summarized_content
@@ -95,23 +120,45 @@ def summarize_content_openai(content: Content) -> str:
         raise ContentProcessingError(f"Error summarizing content: {str(e)}")
 
 
-async def summarize_content(content: Content) -> str:
+async def summarize_content(
+    content: Content, on_update: Optional[SummaryUpdateCallback] = None
+) -> str:
+    """
+    Summarize the content. With `on_update` the summary is streamed from the LLM and the
+    callback receives the text generated so far; the returned summary is the same.
+    """
     logger.info(f"Summarizing content: {content.url}")
-    summary = ""
+    if content.raw_content:
+        raw_content = fit_to_budget(content.raw_content, "summarize")
+        if len(raw_content) < len(content.raw_content):
+            content = content.model_copy(update={"raw_content": raw_content})
     try:
-        # Try using Gemini first
-        summary = summarize_content_gemini(content)
+        # The scheduler prefers Gemini, but routes straight to OpenAI while Gemini is
+        # rate limited or failing. Streamed summaries are not hedged, two requests would
+        # write into the same stream.
+        summary = await llm_scheduler.call(
+            "summarize",
+            {
+                "gemini": lambda: summarize_content_gemini(content, on_update),
+                "openai": lambda: summarize_content_openai(content, on_update),
+            },
+            estimated_tokens=estimate_tokens(content.raw_content),
+            hedge=on_update is None,
+        )
+    except ProviderUnavailableError as e:
+        # every provider is rate limited or failing, worth retrying once they recover
+        raise SummarizationError(f"All models failed: {e}", 429) from e
     except Exception as e:
-        # Handle rate limit or other exceptions by falling back to OpenAI
-        logger.info(f"Gemini failed with error: {e}. Falling back to OpenAI.")
-        try:  # Try using OpenAI
-            summary = summarize_content_openai(content)
-        except Exception as e:
-            logger.info(f"OpenAI failed with error: {e}.")
-            logger.info("Both models failed. Returning the original markdown.")
-            return ""
+        logger.info(f"All models failed with error: {e}.")
+        raise SummarizationError(
+            f"All models failed: {e}",
+            error_status_code(e),
+            parse_rate_limit(e, default_delay=settings.LLM_CIRCUIT_COOLDOWN),
+        ) from e
 
     # Clean and unwrap only the first code block
     summary = unwrap_first_codeblock(summary)
+    if not summary.strip():
+        raise SummarizationError("The model returned an empty summary", 503)
     logger.info(f"Content summarized: {summary[:100]}")
     return summary
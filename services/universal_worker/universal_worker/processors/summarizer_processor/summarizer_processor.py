@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
 
@@ -8,6 +9,7 @@ from pydantic import ValidationError
 from workflow_base import BaseProcessor
 
 from universal_worker.config import settings
+from universal_worker.consumer import in_flight_key
 from universal_worker.exceptions import (
     ContentAlreadyExistsError,
     ContentProcessingError,
@@ -19,21 +21,33 @@ from universal_worker.models import (
     NotificationMessage,
     NotificationType,
 )
+from universal_worker.utils import metrics
+from universal_worker.utils.checkpoint import Checkpoints, get_checkpoint_store
 from universal_worker.utils.db import check_url_exists, insert_to_db
-from universal_worker.utils.notifier import notify
+from universal_worker.utils.notifier import notify, release_in_flight
+from universal_worker.utils.tokens import track_tokens
 from universal_worker.utils.url import clean_url
 
+from .near_duplicate import Match, get_near_duplicate_index, is_indexable
+from .streaming import SummaryStream
 from .summarizer import summarize_content
 
 logger = logging.getLogger(__name__)
 
 
+async def insert_content(content: Content) -> Optional[str]:
+    """Insert the content, its pid is checkpointed rather than the (raw content) response."""
+    inserted = await insert_to_db(content)
+    return inserted.get("pid")
+
+
 class SummarizerProcessor(BaseProcessor):
     """Processor class for handling crawling content."""
 
-    async def process_content(
-        self, content: Dict[str, Any]
-    ) -> Tuple[str, Dict[str, str | list[str]]]:
+    input_model = Content
+
+    async def process_content(self, content: Dict[str, Any] | Content) -> Tuple[str, Content]:
+        stream: Optional[SummaryStream] = None
         try:
             input_content = Content.model_validate(content)
             url = input_content.url
@@ -50,8 +64,13 @@ class SummarizerProcessor(BaseProcessor):
             if not url:
                 url = input_content.url
 
+            # a redelivered message skips the steps that completed before, including the
+            # check below, which its own insert would fail
+            checkpoints = get_checkpoint_store().of(input_content.content_id, "summarizer")
+            inserted_before = checkpoints.done("insert")
+
             # check if the URL already exists in the database
-            if await check_url_exists(url):
+            if not inserted_before and await check_url_exists(url):
                 logger.info(f"URL already exists in the database: {url}")
 
                 await notify(
@@ -65,10 +84,53 @@ class SummarizerProcessor(BaseProcessor):
                 )
                 raise ContentAlreadyExistsError("URL already exists in the database")
 
-            input_content.summary = await summarize_content(input_content)
+            # stream the summary into the telegram chat while it is being generated, the
+            # near-duplicate check below may take a while on a long page
+            if (
+                not checkpoints.done("summary")
+                and settings.SUMMARY_STREAMING_ENABLED
+                and input_content.source
+                and input_content.source.telegram
+            ):
+                stream = SummaryStream(input_content)
+                await stream.start()
+
+            # a mirrored or syndicated copy of ingested content reuses its summary
+            signature = None
+            if settings.NEAR_DUPLICATE_ENABLED and is_indexable(input_content.raw_content):
+                index = get_near_duplicate_index()
+                # shingling a long page is CPU bound, kept off the event loop
+                signature = await asyncio.to_thread(
+                    index.signature, input_content.raw_content  # type: ignore[arg-type]
+                )
+                # once summarized, the index may hold this very content
+                if not checkpoints.done("summary"):
+                    match = await asyncio.to_thread(
+                        index.query, signature, settings.NEAR_DUPLICATE_THRESHOLD
+                    )
+                    if match is not None:
+                        return await self.link_duplicate(
+                            input_content, match, checkpoints, stream
+                        )
+
+            with track_tokens(input_content):
+                input_content.summary = await checkpoints.run(
+                    "summary",
+                    lambda: summarize_content(
+                        input_content, on_update=stream.update if stream else None
+                    ),
+                )
             input_content.status = ContentStatus.SUMMARIZED
 
-            await insert_to_db(input_content)
+            await checkpoints.run("insert", lambda: insert_content(input_content))
+            if signature is not None:
+                await asyncio.to_thread(
+                    get_near_duplicate_index().add,
+                    input_content.content_id,
+                    url,
+                    signature,
+                    input_content.summary,
+                )
 
             await notify(
                 NotificationMessage(
@@ -77,10 +139,11 @@ class SummarizerProcessor(BaseProcessor):
                     notification_type=NotificationType.INFO,
                     source=input_content.source,
                     message=f"Content has been summarized successfully.\n {input_content.summary}",
+                    stream_id=stream.stream_id if stream else None,
                 )
             )
 
-            return settings.EMBEDDING_QUEUE, input_content.model_dump()
+            return settings.EMBEDDING_QUEUE, input_content
 
         except ValidationError as e:
             logger.error(f"Content validation failed: {e}")
@@ -88,8 +151,41 @@ class SummarizerProcessor(BaseProcessor):
 
         except Exception as e:
             logger.exception(f"Error processing content: {e}")
+            if stream is not None:
+                await stream.fail(e)
             raise ContentProcessingError(f"Error processing content: {str(e)}")
 
+    async def link_duplicate(
+        self,
+        input_content: Content,
+        match: Match,
+        checkpoints: Checkpoints,
+        stream: Optional[SummaryStream] = None,
+    ) -> Tuple[str, Content]:
+        """Store the content as a duplicate of the match, without summary or embedding."""
+        logger.info(
+            f"{input_content.url} is a near duplicate of {match.url} "
+            f"(similarity {match.similarity:.2f})"
+        )
+        metrics.increment("near_duplicates")
+        input_content.summary = match.summary
+        input_content.duplicate_of = match.content_id
+        input_content.status = ContentStatus.COMPLETED
+        await checkpoints.run("insert", lambda: insert_content(input_content))
+
+        await notify(
+            NotificationMessage(
+                url=input_content.url,
+                status=input_content.status,
+                notification_type=NotificationType.INFO,
+                source=input_content.source,
+                message=f"Content is a copy of {match.url}, reusing its summary.\n {match.summary}",
+                stream_id=stream.stream_id if stream else None,
+            )
+        )
+        # the original is embedded already, nothing to hand to the embedding stage
+        return "", input_content
+
     @property
     def handle_error(
         self,
@@ -106,6 +202,8 @@ class SummarizerProcessor(BaseProcessor):
         ) -> None:
             if isinstance(error, ContentAlreadyExistsError):
                 logger.info(f"Content already exists: {str(error)}")
+                # the content leaves the pipeline here, as in the classifier
+                await release_in_flight(in_flight_key(content))
                 await message.ack()
             else:
                 # Re-raise the exception to let the default handler manage it
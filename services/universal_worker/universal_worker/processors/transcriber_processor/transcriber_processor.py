@@ -7,7 +7,8 @@ from pydantic import ValidationError
 
 from universal_worker.config import settings
 from universal_worker.exceptions import ContentProcessingError
-from universal_worker.models import Content, ContentStatus
+from universal_worker.models import Content, ContentStatus, TranscribedContent
+from universal_worker.utils.checkpoint import get_checkpoint_store
 from workflow_base import BaseProcessor
 
 from .transcriber import transcribe_content
@@ -18,14 +19,16 @@ logger = logging.getLogger(__name__)
 class TranscriberProcessor(BaseProcessor):
     """Processor class for handling crawling content."""
 
-    async def process_content(
-        self, content: Dict[str, Any]
-    ) -> Tuple[str, Dict[str, str | list[str]]]:
-        url = content.get("url")
-        logger.info(f"Starting content processing: {url}")
+    input_model = Content
+
+    async def process_content(self, content: Dict[str, Any] | Content) -> Tuple[str, Content]:
         try:
             input_content = Content.model_validate(content)
-            transcribed_content = await transcribe_content(input_content.url)
+            logger.info(f"Starting content processing: {input_content.url}")
+            checkpoints = get_checkpoint_store().of(input_content.content_id, "transcriber")
+            transcribed_content = await checkpoints.run(
+                "transcribe", lambda: transcribe_content(input_content.url), TranscribedContent
+            )
 
             input_content.url = transcribed_content.url
             input_content.raw_content = transcribed_content.raw_content
@@ -35,7 +38,7 @@ class TranscriberProcessor(BaseProcessor):
             input_content.image_url = transcribed_content.image_url
             input_content.status = ContentStatus.TRANSCRIBED
 
-            return settings.SUMMARY_QUEUE, input_content.model_dump()
+            return settings.SUMMARY_QUEUE, input_content
 
         except ValidationError as e:
             logger.error(f"Content validation failed: {e}")
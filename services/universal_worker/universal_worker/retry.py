@@ -0,0 +1,87 @@
+"""
+Delayed retries of failed messages. The error handler re-routes a transient failure into
+a retry queue of its stage; the queue has no consumer, the message expires after the
+tier's TTL and RabbitMQ dead-letters it back into the stage queue (same lane). The tiers
+grow exponentially (ERROR_RETRY_DELAYS) and the x-retry-count header picks the tier.
+"""
+
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import settings
+from .lanes import INTERACTIVE_LANE, lane_queue
+
+RETRY_COUNT_HEADER = "x-retry-count"
+# set on failed messages only, dropped when a stage publishes its output
+ERROR_HEADERS = {
+    "x-original-queue", "x-error", "x-error-type", "x-death", "x-first-death-exchange",
+    "x-first-death-queue", "x-first-death-reason", "x-last-death-exchange",
+    "x-last-death-queue", "x-last-death-reason", RETRY_COUNT_HEADER,
+}  # fmt: skip
+RETRY_QUEUE_PATTERN = re.compile(r"^(?P<stage>.+)\.retry\.(?P<tier>\d+)(?:\.(?P<lane>[^.]+))?$")
+
+
+def retry_tier(retry_count: int, retry_after: Optional[float] = None) -> int:
+    """
+    Delay tier of a message retried `retry_count` times before, the last tier repeats.
+    A Retry-After of the failure moves it up to the first tier waiting at least that long.
+    """
+    delays = settings.ERROR_RETRY_DELAYS
+    tier = min(retry_count, len(delays) - 1)
+    if retry_after:
+        while tier < len(delays) - 1 and delays[tier] < retry_after:
+            tier += 1
+    return tier
+
+
+def retry_queue(stage: str, tier: int) -> str:
+    return f"{stage}.retry.{tier}"
+
+
+def retry_queue_arguments(queue_name: str) -> Optional[Dict[str, Any]]:
+    """Declaration arguments of a retry queue (lane copies included), None for others."""
+    match = RETRY_QUEUE_PATTERN.match(queue_name)
+    if match is None:
+        return None
+    tier = min(int(match["tier"]), len(settings.ERROR_RETRY_DELAYS) - 1)
+    return {
+        "x-message-ttl": int(settings.ERROR_RETRY_DELAYS[tier] * 1000),
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": lane_queue(
+            match["stage"], match["lane"] or INTERACTIVE_LANE
+        ),
+    }
+
+
+def _chain(error: BaseException) -> Iterator[BaseException]:
+    current: Optional[BaseException] = error
+    depth = 0
+    while current is not None and depth < 10:
+        yield current
+        current = current.__cause__ or current.__context__
+        depth += 1
+
+
+def error_chain(error: BaseException) -> List[str]:
+    """Class names of the error and the errors it was raised from, outermost first."""
+    return [type(current).__name__ for current in _chain(error)]
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of the failure (CrawlError, SDK and httpx errors), if any."""
+    for current in _chain(error):
+        for value in (
+            getattr(current, "status_code", None),
+            getattr(getattr(current, "response", None), "status_code", None),
+        ):
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def error_retry_after(error: BaseException) -> Optional[float]:
+    for current in _chain(error):
+        value = getattr(current, "retry_after", None)
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
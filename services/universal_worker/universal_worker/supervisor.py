@@ -0,0 +1,338 @@
+"""
+Autoscaling supervisor: runs `universal_worker.main` processes for one or more processors
+and scales them with the depth of their input queue (all lanes), so a burst is drained
+by up to SUPERVISOR_MAX_WORKERS workers and an idle stage shrinks back to the minimum.
+
+    python -m universal_worker.supervisor crawler summarizer
+
+Queue statistics come from the RabbitMQ management API when RABBITMQ_MANAGEMENT_URL is
+set (ready / unacked counts, consumers and the ack rate), otherwise from a passive queue
+declaration over AMQP (ready count and consumers only).
+
+Per process state is not shared between the workers of a processor: the crawler's host
+politeness and memory crawl cache in particular, which is why SUPERVISOR_BOUNDS keeps a
+single crawler worker by default.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Protocol, Tuple
+from urllib.parse import quote, urlsplit
+
+import aio_pika
+import httpx
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
+from aio_pika.exceptions import ChannelClosed
+
+from .config import settings
+from .utils import metrics
+from .workflow_config import WorkflowConfig
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueStats:
+    ready: int = 0
+    unacked: int = 0
+    consumers: int = 0
+    ack_rate: Optional[float] = None  # messages per second, management API only
+
+    def add(self, other: "QueueStats") -> "QueueStats":
+        """Combine the lane queues of a stage; every worker consumes all of them."""
+        ack_rate = None
+        if self.ack_rate is not None or other.ack_rate is not None:
+            ack_rate = (self.ack_rate or 0.0) + (other.ack_rate or 0.0)
+        return QueueStats(
+            ready=self.ready + other.ready,
+            unacked=self.unacked + other.unacked,
+            consumers=max(self.consumers, other.consumers),
+            ack_rate=ack_rate,
+        )
+
+
+class StatsSource(Protocol):
+    async def queue_stats(self, queue: str) -> QueueStats: ...
+
+    async def close(self) -> None: ...
+
+
+class ManagementApiStats:
+    """Queue statistics from the RabbitMQ management plugin's HTTP API."""
+
+    def __init__(self, management_url: str):
+        parts = urlsplit(management_url)
+        auth = (parts.username or "guest", parts.password or "guest")
+        base_url = f"{parts.scheme}://{parts.hostname}:{parts.port or 15672}"
+        self.vhost = quote(urlsplit(settings.RABBITMQ_URL).path.lstrip("/") or "/", safe="")
+        self.client = httpx.AsyncClient(base_url=base_url, auth=auth, timeout=10.0)
+
+    async def queue_stats(self, queue: str) -> QueueStats:
+        response = await self.client.get(f"/api/queues/{self.vhost}/{quote(queue, safe='')}")
+        if response.status_code == 404:
+            return QueueStats()
+        response.raise_for_status()
+        data = response.json()
+        ack_details = (data.get("message_stats") or {}).get("ack_details") or {}
+        return QueueStats(
+            ready=data.get("messages_ready", 0),
+            unacked=data.get("messages_unacknowledged", 0),
+            consumers=data.get("consumers", 0),
+            ack_rate=ack_details.get("rate"),
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class AmqpStats:
+    """Stand-in without the management plugin: passive declarations over AMQP."""
+
+    def __init__(self, rabbitmq_url: str):
+        self.rabbitmq_url = rabbitmq_url
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channel: Optional[AbstractChannel] = None
+
+    async def queue_stats(self, queue: str) -> QueueStats:
+        if self.connection is None:
+            self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
+        if self.channel is None or self.channel.is_closed:
+            self.channel = await self.connection.channel()
+        try:
+            declared = await self.channel.declare_queue(queue, passive=True)
+        except ChannelClosed:
+            # the queue does not exist (yet), which also closes the channel
+            self.channel = None
+            return QueueStats()
+        result = declared.declaration_result
+        return QueueStats(ready=result.message_count, consumers=result.consumer_count)
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+
+def desired_workers(stats: QueueStats, current: int, bounds: Tuple[int, int]) -> int:
+    """
+    Workers needed to drain the backlog within SUPERVISOR_TARGET_DRAIN seconds at the
+    measured per-worker ack rate, or at SUPERVISOR_MESSAGES_PER_WORKER without a rate.
+    Workers busy with messages are never counted as surplus.
+    """
+    minimum, maximum = bounds
+    slots = max(stats.consumers, 1) * settings.WORKER_CONCURRENCY
+    busy = min(stats.unacked, slots)
+    # prefetched but not yet processing counts as backlog
+    backlog = stats.ready + stats.unacked - busy
+
+    if backlog == 0:
+        wanted = 0
+    elif stats.ack_rate and current > 0:
+        per_worker = stats.ack_rate / current
+        wanted = math.ceil(backlog / (per_worker * settings.SUPERVISOR_TARGET_DRAIN))
+    else:
+        wanted = math.ceil(backlog / settings.SUPERVISOR_MESSAGES_PER_WORKER)
+    wanted = max(wanted, math.ceil(busy / settings.WORKER_CONCURRENCY))
+    return max(minimum, min(maximum, wanted))
+
+
+@dataclass
+class Scaler:
+    """
+    Hysteresis over the desired worker count: scaling up follows SUPERVISOR_SCALE_UP_POLLS
+    polls in a row wanting more, straight to the wanted count; scaling down needs
+    SUPERVISOR_SCALE_DOWN_POLLS polls in a row wanting fewer and retires one worker.
+    """
+
+    bounds: Tuple[int, int]
+    up_streak: int = 0
+    down_streak: int = 0
+
+    def target(self, stats: QueueStats, current: int) -> int:
+        wanted = desired_workers(stats, current, self.bounds)
+        if current < self.bounds[0] or current > self.bounds[1]:
+            return max(self.bounds[0], min(self.bounds[1], current))
+        self.up_streak = self.up_streak + 1 if wanted > current else 0
+        self.down_streak = self.down_streak + 1 if wanted < current else 0
+        if self.up_streak >= settings.SUPERVISOR_SCALE_UP_POLLS:
+            self.up_streak = 0
+            return wanted
+        if self.down_streak >= settings.SUPERVISOR_SCALE_DOWN_POLLS:
+            self.down_streak = 0
+            return current - 1
+        return current
+
+
+@dataclass
+class WorkerPool:
+    """The worker processes of one processor."""
+
+    processor_name: str
+    processes: List[asyncio.subprocess.Process] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.processes)
+
+    async def spawn(self) -> None:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "universal_worker.main",
+            env={**os.environ, "PROCESSOR_NAME": self.processor_name},
+        )
+        self.processes.append(process)
+        logger.info(f"Started {self.processor_name} worker {process.pid}")
+
+    async def retire(self) -> None:
+        """Stop the newest worker, its unacked messages return to the queue."""
+        process = self.processes.pop()
+        await self._terminate(process)
+        logger.info(f"Retired {self.processor_name} worker {process.pid}")
+
+    def reap(self) -> int:
+        """Forget workers that exited on their own, they are replaced on the next scale."""
+        exited = [process for process in self.processes if process.returncode is not None]
+        for process in exited:
+            logger.warning(
+                f"{self.processor_name} worker {process.pid} exited with {process.returncode}"
+            )
+            self.processes.remove(process)
+            metrics.increment("supervisor_worker_exits", processor=self.processor_name)
+        return len(exited)
+
+    async def scale_to(self, count: int) -> None:
+        while len(self) < count:
+            await self.spawn()
+        while len(self) > count:
+            await self.retire()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*(self._terminate(process) for process in self.processes))
+        self.processes.clear()
+
+    @staticmethod
+    async def _terminate(process: asyncio.subprocess.Process) -> None:
+        if process.returncode is not None:
+            return
+        process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), settings.SUPERVISOR_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+class Supervisor:
+    def __init__(self, processor_names: List[str], stats: StatsSource):
+        self.workflow_config = WorkflowConfig()
+        self.stats = stats
+        self.pools = {name: WorkerPool(name) for name in processor_names}
+        self.scalers = {name: Scaler(self.bounds(name)) for name in processor_names}
+        self.stopped = asyncio.Event()
+
+    @staticmethod
+    def bounds(processor_name: str) -> Tuple[int, int]:
+        minimum, maximum = settings.SUPERVISOR_BOUNDS.get(
+            processor_name, [settings.SUPERVISOR_MIN_WORKERS, settings.SUPERVISOR_MAX_WORKERS]
+        )
+        return minimum, max(minimum, maximum)
+
+    async def stage_stats(self, processor_name: str) -> QueueStats:
+        input_queue = self.workflow_config.processor_specs[processor_name].input_queue
+        stats = QueueStats()
+        for queue in self.workflow_config.lane_queues(input_queue):
+            stats = stats.add(await self.stats.queue_stats(queue))
+        return stats
+
+    async def poll(self) -> None:
+        for name, pool in self.pools.items():
+            pool.reap()
+            try:
+                stats = await self.stage_stats(name)
+            except Exception as e:
+                logger.error(f"Could not get queue stats of {name}: {e}")
+                # keep the workers running, replacing crashed ones
+                await pool.scale_to(max(len(pool), self.scalers[name].bounds[0]))
+                continue
+
+            current = len(pool)
+            target = self.scalers[name].target(stats, current)
+            busy = min(stats.unacked, max(current, 1) * settings.WORKER_CONCURRENCY)
+            utilisation = busy / max(current * settings.WORKER_CONCURRENCY, 1)
+            metrics.observe("supervisor_utilisation", utilisation, processor=name)
+            metrics.observe("supervisor_workers", target, processor=name)
+            if target != current:
+                logger.info(
+                    f"Scaling {name} from {current} to {target} workers "
+                    f"(ready {stats.ready}, unacked {stats.unacked}, "
+                    f"ack rate {stats.ack_rate}, utilisation {utilisation:.0%})"
+                )
+                metrics.increment(
+                    "supervisor_scale_events",
+                    processor=name,
+                    direction="up" if target > current else "down",
+                )
+            await pool.scale_to(target)
+
+    async def run(self) -> None:
+        logger.info(f"Supervising {', '.join(self.pools)}")
+        for name, pool in self.pools.items():
+            await pool.scale_to(self.scalers[name].bounds[0])
+        last_metrics_log = time.monotonic()
+        try:
+            while not self.stopped.is_set():
+                await self.poll()
+                if (
+                    settings.METRICS_LOG_INTERVAL > 0
+                    and time.monotonic() - last_metrics_log > settings.METRICS_LOG_INTERVAL
+                ):
+                    metrics.log_snapshot()
+                    last_metrics_log = time.monotonic()
+                try:
+                    await asyncio.wait_for(
+                        self.stopped.wait(), settings.SUPERVISOR_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            logger.info("Stopping workers...")
+            await asyncio.gather(*(pool.stop() for pool in self.pools.values()))
+            await self.stats.close()
+
+
+def stats_source() -> StatsSource:
+    if settings.RABBITMQ_MANAGEMENT_URL:
+        return ManagementApiStats(settings.RABBITMQ_MANAGEMENT_URL)
+    return AmqpStats(settings.RABBITMQ_URL)
+
+
+async def start(processor_names: List[str]) -> None:
+    supervisor = Supervisor(processor_names, stats_source())
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, supervisor.stopped.set)
+    loop.add_signal_handler(signal.SIGINT, supervisor.stopped.set)
+    await supervisor.run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run and autoscale worker processes")
+    parser.add_argument(
+        "processors",
+        nargs="*",
+        default=[settings.PROCESSOR_NAME],
+        help="processor names (default: PROCESSOR_NAME)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(start(args.processors))
+
+
+if __name__ == "__main__":
+    main()
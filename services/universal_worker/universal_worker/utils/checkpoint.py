@@ -0,0 +1,136 @@
+"""
+Checkpoints of the expensive steps of a stage (crawl, clean, summarize, insert, embed),
+keyed by content_id, stage and step in a local SQLite store. A redelivered or retried
+message skips the steps that completed before, so a failure in the last step does not
+repeat the LLM calls or the page render, and side effects (inserts) happen once.
+
+    checkpoints = get_checkpoint_store().of(content.content_id, "summarizer")
+    summary = await checkpoints.run("summary", lambda: summarize_content(content))
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from universal_worker.config import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+PRUNE_INTERVAL = 3600  # seconds
+
+
+class CheckpointStore:
+    def __init__(self, path: str, max_age: float):
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "content_id TEXT NOT NULL, stage TEXT NOT NULL, step TEXT NOT NULL, "
+            "value TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (content_id, stage, step))"
+        )
+        self.pruned_at = 0.0
+        self.prune()
+
+    def get(self, content_id: str, stage: str, step: str) -> Optional[str]:
+        """The JSON value of a completed step, None if it did not complete."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM checkpoints WHERE content_id = ? AND stage = ? AND step = ?",
+                (content_id, stage, step),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, content_id: str, stage: str, step: str, value: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (content_id, stage, step, value, time.time()),
+            )
+        if time.time() - self.pruned_at > PRUNE_INTERVAL:
+            self.prune()
+
+    def clear(self, content_id: str, stage: Optional[str] = None) -> None:
+        with self.lock:
+            if stage is None:
+                self.conn.execute("DELETE FROM checkpoints WHERE content_id = ?", (content_id,))
+            else:
+                self.conn.execute(
+                    "DELETE FROM checkpoints WHERE content_id = ? AND stage = ?",
+                    (content_id, stage),
+                )
+
+    def prune(self) -> int:
+        """Drop checkpoints older than max_age, their messages are long done or parked."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM checkpoints WHERE created_at < ?", (time.time() - self.max_age,)
+            )
+        self.pruned_at = time.time()
+        if cursor.rowcount:
+            logger.info(f"Pruned {cursor.rowcount} checkpoints")
+        return cursor.rowcount
+
+    def of(self, content_id: str, stage: str) -> "Checkpoints":
+        return Checkpoints(self, content_id, stage)
+
+
+class Checkpoints:
+    """The checkpoints of one content in one stage."""
+
+    def __init__(self, store: CheckpointStore, content_id: str, stage: str):
+        self.store = store
+        self.content_id = content_id
+        self.stage = stage
+
+    def done(self, step: str) -> bool:
+        return self.store.get(self.content_id, self.stage, step) is not None
+
+    def mark(self, step: str, value: Any = True) -> None:
+        # models, crawled pages included, are serialized straight to JSON by pydantic-core
+        encoded = value.model_dump_json() if isinstance(value, BaseModel) else json.dumps(value)
+        self.store.put(self.content_id, self.stage, step, encoded)
+
+    async def run(
+        self,
+        step: str,
+        func: Callable[[], Awaitable[T]],
+        model: Optional[Type[BaseModel]] = None,
+    ) -> T:
+        """
+        The result of the step, from its checkpoint if it completed before, otherwise by
+        running it. Results must be JSON serializable, or a pydantic `model`.
+        """
+        value = self.store.get(self.content_id, self.stage, step)
+        if value is not None:
+            logger.info(f"Resuming {self.stage} of {self.content_id} after step {step}")
+            metrics.increment("checkpoint_hits", stage=self.stage, step=step)
+            if model is not None:
+                return model.model_validate_json(value)  # type: ignore[return-value]
+            return json.loads(value)
+
+        result = await func()
+        self.mark(step, result)
+        return result
+
+
+_store: Optional[CheckpointStore] = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _store
+    if _store is None:
+        _store = CheckpointStore(settings.CHECKPOINT_PATH, settings.CHECKPOINT_MAX_AGE)
+    return _store
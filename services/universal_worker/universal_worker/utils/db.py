@@ -1,5 +1,5 @@
 import logging
-from typing import Optional
+from typing import List, Optional
 
 import httpx
 from pydantic import BaseModel
@@ -22,6 +22,7 @@ class InsertContent(BaseModel):
     summary: Optional[str] = None
     metadata: Optional[dict] = None
     content_id: Optional[str] = None
+    pid: Optional[str] = None  # the db-manager's id, the content_id so both name one content
 
 
 async def check_url_exists(url: str) -> bool:
@@ -40,6 +41,20 @@ async def check_url_exists(url: str) -> bool:
             raise ContentProcessingError(f"Error checking URL existence: {str(e)}")
 
 
+async def list_contents() -> List[dict]:
+    """
+    All stored contents, as returned by the db-manager API.
+    """
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        try:
+            response = await client.get(f"{settings.DB_MANAGER_URL}/contents/")
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            logger.error(f"Error listing contents: {e}")
+            raise ContentProcessingError(f"Error listing contents: {str(e)}")
+
+
 async def insert_to_db(content: Content) -> dict:
     """
     Inserts content into the database service and returns the response as a dictionary.
@@ -58,11 +73,14 @@ async def insert_to_db(content: Content) -> dict:
             summary=content.summary,
             image_url=content.image_url,
             content_id=content.content_id if content.content_id else None,
+            pid=content.content_id if content.content_id else None,
             metadata={
                 "canonical_url": content.canonical_url
                 if content.canonical_url
                 else None,
                 "keywords": content.keywords if content.keywords else None,
+                "duplicate_of": content.duplicate_of,
+                "token_usage": content.token_usage,
             },
         )
 
@@ -0,0 +1,76 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# in-process metrics until we have a proper monitoring stack
+# keys are (metric name, sorted label pairs)
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_lock = threading.Lock()
+_counters: Dict[MetricKey, float] = defaultdict(float)
+_observations: Dict[MetricKey, Deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+
+
+def _key(name: str, labels: Dict[str, str]) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record a sample (e.g. a latency in seconds); the last 1000 samples are kept."""
+    with _lock:
+        _observations[_key(name, labels)].append(value)
+
+
+def counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def percentile(name: str, q: float, **labels) -> float | None:
+    """Return the q-th percentile (0..1) of the recorded samples, None without samples."""
+    with _lock:
+        samples = sorted(_observations.get(_key(name, labels), ()))
+    if not samples:
+        return None
+    index = min(len(samples) - 1, int(q * len(samples)))
+    return samples[index]
+
+
+def sample_count(name: str, **labels) -> int:
+    with _lock:
+        return len(_observations.get(_key(name, labels), ()))
+
+
+def format_key(key: MetricKey) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return f"{name}{{{','.join(f'{k}={v}' for k, v in labels)}}}"
+
+
+def snapshot() -> Dict[str, float]:
+    """Flatten counters and p50/p95 of the observations into a printable dict."""
+    with _lock:
+        counters = dict(_counters)
+        observations = {k: sorted(v) for k, v in _observations.items() if v}
+
+    result = {format_key(k): v for k, v in counters.items()}
+    for key, samples in observations.items():
+        name = format_key(key)
+        result[f"{name}:p50"] = samples[int(0.5 * (len(samples) - 1))]
+        result[f"{name}:p95"] = samples[int(0.95 * (len(samples) - 1))]
+        result[f"{name}:count"] = len(samples)
+    return result
+
+
+def log_snapshot() -> None:
+    for name, value in sorted(snapshot().items()):
+        logger.info(f"metric {name} = {value}")
@@ -1,33 +1,58 @@
+from typing import Optional
+
 import aio_pika
 from aio_pika import DeliveryMode, Message
+from aio_pika.abc import AbstractChannel, AbstractRobustConnection
 
 from universal_worker.config import settings
 from universal_worker.models import NotificationMessage
 
+# reused across notifications, streamed summaries publish several updates per content
+_connection: Optional[AbstractRobustConnection] = None
+_channel: Optional[AbstractChannel] = None
+
+
+async def _get_channel() -> AbstractChannel:
+    global _connection, _channel
+
+    if _connection is None or _connection.is_closed:
+        # Establish connection
+        _connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
+        _channel = None
+
+    if _channel is None or _channel.is_closed:
+        # Open a channel and declare the queue
+        _channel = await _connection.channel()
+        await _channel.declare_queue(settings.NOTIFY_QUEUE, durable=True)
+        await _channel.declare_queue(settings.DEDUPE_RELEASE_QUEUE, durable=True)
+
+    return _channel
+
 
 async def notify(notification_message: NotificationMessage) -> None:
-    # Establish connection
-    connection = await aio_pika.connect_robust(
-        settings.RABBITMQ_URL
-    )  # Update with your RabbitMQ credentials
-
-    async with connection:
-        # Open a channel
-        channel = await connection.channel()
-
-        # Declare the queue
-        queue = await channel.declare_queue(settings.NOTIFY_QUEUE, durable=True)
-
-        # Prepare the message content
-        message_body = (
-            notification_message.model_dump_json()
-        )  # Serialize NotificationMessage to JSON
-
-        # Publish message to the queue
-        await channel.default_exchange.publish(
-            Message(
-                body=message_body.encode(),
-                delivery_mode=DeliveryMode.PERSISTENT,  # Makes the message persistent
-            ),
-            routing_key=queue.name,
-        )
+    channel = await _get_channel()
+
+    # Prepare the message content
+    message_body = (
+        notification_message.model_dump_json()
+    )  # Serialize NotificationMessage to JSON
+
+    # Publish message to the queue
+    await channel.default_exchange.publish(
+        Message(
+            body=message_body.encode(),
+            delivery_mode=DeliveryMode.PERSISTENT,  # Makes the message persistent
+        ),
+        routing_key=settings.NOTIFY_QUEUE,
+    )
+
+
+async def release_in_flight(idempotency_key: Optional[str]) -> None:
+    """Let the submission service accept the URL again, its content left the pipeline."""
+    if not idempotency_key:
+        return
+    channel = await _get_channel()
+    await channel.default_exchange.publish(
+        Message(body=idempotency_key.encode(), delivery_mode=DeliveryMode.PERSISTENT),
+        routing_key=settings.DEDUPE_RELEASE_QUEUE,
+    )
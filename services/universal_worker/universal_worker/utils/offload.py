@@ -0,0 +1,144 @@
+"""
+Process pool for CPU-bound transforms (chunking, regexes over whole documents), so
+they do not stall the event loop while other messages are being processed concurrently.
+Only worth it when the work is far more than copying its input and output: decoding or
+validating a message costs about as much as pickling the result back.
+
+    chunks = await run_cpu(chunk_content, text, content_type, size=len(text))
+
+Small inputs run inline, the hop to another process costs more than it saves. Big str
+and bytes arguments and results are handed over through shared memory instead of being
+pickled into the pool's pipe. Functions must be importable at module level; keep them in
+light modules (like utils/text.py) since every pool process imports them.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Optional, TypeVar
+
+from universal_worker.config import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SharedBuffer:
+    """Picklable handle of a str or bytes value copied into a shared memory block."""
+
+    def __init__(self, value: str | bytes):
+        data = value.encode() if isinstance(value, str) else value
+        self.is_text = isinstance(value, str)
+        self.size = len(data)
+        self.shm = SharedMemory(create=True, size=max(self.size, 1))
+        self.shm.buf[: self.size] = data
+        self.name = self.shm.name
+
+    def __getstate__(self):
+        return {"name": self.name, "size": self.size, "is_text": self.is_text}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = None
+
+    def read(self) -> str | bytes:
+        shm = self.shm or SharedMemory(name=self.name)
+        try:
+            data = bytes(shm.buf[: self.size])
+        finally:
+            if shm is not self.shm:
+                shm.close()
+        return data.decode() if self.is_text else data
+
+    def release(self) -> None:
+        """Free the block, by whichever side owns it after the call."""
+        shm = self.shm or SharedMemory(name=self.name)
+        shm.close()
+        shm.unlink()
+
+
+def _size(value: Any) -> int:
+    return len(value) if isinstance(value, (str, bytes)) else 0
+
+
+def _share(value: Any) -> Any:
+    if _size(value) >= settings.OFFLOAD_SHARED_MEMORY_BYTES:
+        return SharedBuffer(value)
+    return value
+
+
+def _unshare(value: Any) -> Any:
+    return value.read() if isinstance(value, SharedBuffer) else value
+
+
+def _call(func: Callable[..., Any], *args: Any) -> Any:
+    """Runs in the pool process: reads shared arguments, shares a big result back."""
+    result = func(*(_unshare(arg) for arg in args))
+    shared = _share(result)
+    if isinstance(shared, SharedBuffer):
+        # the parent reads and unlinks it
+        shared.shm.close()
+        shared.shm = None
+    return shared
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """The shared pool, None when offloading is disabled (OFFLOAD_WORKERS = 0)."""
+    global _pool
+    if _pool is None and settings.OFFLOAD_WORKERS > 0:
+        # forked children would inherit the event loop and the connections' threads
+        context = multiprocessing.get_context(settings.OFFLOAD_START_METHOD)
+        _pool = ProcessPoolExecutor(max_workers=settings.OFFLOAD_WORKERS, mp_context=context)
+        logger.info(f"Started a process pool with {settings.OFFLOAD_WORKERS} workers")
+    return _pool
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, size: Optional[int] = None) -> T:
+    """
+    Run `func(*args)` in the process pool if the input is at least OFFLOAD_MIN_BYTES,
+    inline otherwise. The input size is that of the str / bytes arguments unless given.
+    """
+    global _pool
+    pool = get_process_pool()
+    if size is None:
+        size = sum(_size(arg) for arg in args)
+    if pool is None or size < settings.OFFLOAD_MIN_BYTES:
+        return func(*args)
+
+    name = getattr(func, "__name__", "call")
+    shared = [_share(arg) for arg in args]
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(pool, partial(_call, func, *shared))
+    except BrokenProcessPool:
+        # a pool process died (e.g. OOM killed), start a new pool on the next call
+        _pool = None
+        raise
+    finally:
+        for arg in shared:
+            if isinstance(arg, SharedBuffer):
+                arg.release()
+    metrics.increment("offloaded_calls", function=name)
+    if isinstance(result, SharedBuffer):
+        try:
+            return result.read()  # type: ignore[return-value]
+        finally:
+            result.release()
+    return result
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
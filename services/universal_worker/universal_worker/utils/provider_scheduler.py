@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from universal_worker.config import settings
+from universal_worker.exceptions import ContentProcessingError
+from universal_worker.utils import metrics
+from universal_worker.utils.rate_limit import CircuitBreaker, TokenBucket, parse_rate_limit
+from universal_worker.utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProviderUnavailableError(ContentProcessingError):
+    """Raised when every LLM provider is rate limited or has an open circuit."""
+
+    pass
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return count_tokens(text)
+
+
+class Provider:
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        failure_threshold: int,
+        cooldown: float,
+    ):
+        self.name = name
+        self.requests = TokenBucket.per_minute(requests_per_minute)
+        self.tokens = TokenBucket.per_minute(tokens_per_minute)
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown)
+
+    def wait_time(self, estimated_tokens: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+
+
+class ProviderScheduler:
+    """
+    Picks the LLM provider for each call instead of always trying Gemini first.
+
+    Providers are tried in preference order, skipping the ones whose circuit is open or
+    whose request/token budget is exhausted. A 429 drains the provider's budget for the
+    retry-after period and opens its circuit, so following calls go straight to the
+    healthy provider until a probe request succeeds.
+    """
+
+    def __init__(self, providers: List[Provider], max_wait: float = 60.0):
+        self.providers = {provider.name: provider for provider in providers}
+        self.max_wait = max_wait
+
+    @classmethod
+    def from_settings(cls) -> "ProviderScheduler":
+        limits = {
+            "gemini": (settings.GEMINI_RPM, settings.GEMINI_TPM),
+            "openai": (settings.OPENAI_RPM, settings.OPENAI_TPM),
+        }
+        return cls(
+            [
+                Provider(
+                    name,
+                    requests_per_minute=rpm,
+                    tokens_per_minute=tpm,
+                    failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                    cooldown=settings.LLM_CIRCUIT_COOLDOWN,
+                )
+                for name, (rpm, tpm) in limits.items()
+            ],
+            max_wait=settings.LLM_MAX_WAIT,
+        )
+
+    def _pick(
+        self, names: List[str], estimated_tokens: int
+    ) -> tuple[Optional[Provider], float]:
+        """Return the first usable provider in preference order, or None and how long to wait."""
+        wait = None
+        for name in names:
+            provider = self.providers[name]
+            if not provider.breaker.available():
+                continue
+            provider_wait = provider.wait_time(estimated_tokens)
+            if provider_wait == 0:
+                return provider, 0.0
+            wait = provider_wait if wait is None else min(wait, provider_wait)
+        return None, -1.0 if wait is None else wait
+
+    async def _select(self, stage: str, names: List[str], estimated_tokens: int) -> Provider:
+        waited = 0.0
+        while True:
+            provider, wait = self._pick(names, estimated_tokens)
+            if provider is not None and provider.breaker.allow_request():
+                provider.requests.try_consume(1)
+                provider.tokens.try_consume(estimated_tokens)
+                metrics.increment("llm_provider_selected", stage=stage, provider=provider.name)
+                return provider
+            if provider is None and (wait < 0 or waited + wait > self.max_wait):
+                metrics.increment("llm_provider_unavailable", stage=stage)
+                raise ProviderUnavailableError(
+                    f"No LLM provider available for {stage}: {', '.join(names)}"
+                )
+            logger.info(f"All LLM providers are busy, waiting {wait:.1f}s for {stage}")
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def record_success(self, stage: str, provider: Provider, started_at: float) -> None:
+        provider.breaker.record_success()
+        metrics.increment("llm_calls", stage=stage, provider=provider.name, outcome="success")
+        metrics.observe(
+            "llm_latency_seconds",
+            time.monotonic() - started_at,
+            stage=stage,
+            provider=provider.name,
+        )
+
+    def record_failure(self, stage: str, provider: Provider, error: Exception) -> None:
+        retry_after = parse_rate_limit(error, default_delay=settings.LLM_CIRCUIT_COOLDOWN)
+        if retry_after is not None:
+            logger.info(f"{provider.name} is rate limited, backing off for {retry_after:.0f}s")
+            provider.requests.drain(retry_after)
+            metrics.increment(
+                "llm_calls", stage=stage, provider=provider.name, outcome="rate_limited"
+            )
+        else:
+            metrics.increment("llm_calls", stage=stage, provider=provider.name, outcome="error")
+        provider.breaker.record_failure(retry_after)
+
+    def hedge_delay(self, stage: str, provider: Provider) -> float:
+        """Seconds to wait for the primary before hedging, from its observed latency."""
+        if (
+            metrics.sample_count("llm_latency_seconds", stage=stage, provider=provider.name)
+            < settings.LLM_HEDGE_MIN_SAMPLES
+        ):
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        delay = metrics.percentile(
+            "llm_latency_seconds",
+            settings.LLM_HEDGE_PERCENTILE,
+            stage=stage,
+            provider=provider.name,
+        )
+        return delay or settings.LLM_HEDGE_DEFAULT_DELAY
+
+    async def _attempt(
+        self, stage: str, provider: Provider, func: Callable[[], Awaitable[T]]
+    ) -> T:
+        started_at = time.monotonic()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # lost the hedge race, the circuit is unaffected
+            provider.breaker.probing = False
+            raise
+        except Exception as e:
+            logger.info(f"{provider.name} failed for {stage} with error: {e}")
+            self.record_failure(stage, provider, e)
+            raise
+        self.record_success(stage, provider, started_at)
+        return result
+
+    async def call(
+        self,
+        stage: str,
+        calls: Dict[str, Callable[[], Awaitable[T]]],
+        estimated_tokens: int = 0,
+        hedge: bool = True,
+    ) -> T:
+        """
+        Run `calls[provider]` for the best available provider, in the preference order of
+        `calls`, falling back to the next one on failure. Stages listed in LLM_HEDGE_STAGES
+        are hedged unless `hedge` is False, see `_hedged_call`.
+        """
+        remaining = list(calls)
+        last_error: Optional[Exception] = None
+        while remaining:
+            try:
+                provider = await self._select(stage, remaining, estimated_tokens)
+            except ProviderUnavailableError:
+                if last_error is not None:
+                    raise last_error
+                raise
+            remaining.remove(provider.name)
+            try:
+                if hedge and stage in settings.LLM_HEDGE_STAGES and remaining:
+                    return await self._hedged_call(
+                        stage, provider, calls, remaining, estimated_tokens
+                    )
+                return await self._attempt(stage, provider, calls[provider.name])
+            except Exception as e:
+                last_error = e
+
+        assert last_error is not None
+        raise last_error
+
+    async def _hedged_call(
+        self,
+        stage: str,
+        primary: Provider,
+        calls: Dict[str, Callable[[], Awaitable[T]]],
+        remaining: List[str],
+        estimated_tokens: int,
+    ) -> T:
+        """
+        Start the primary request and, if it hasn't answered within its latency percentile,
+        send a second request to the next available provider. The first valid answer wins
+        and the other request is cancelled.
+        """
+        primary_task = asyncio.create_task(self._attempt(stage, primary, calls[primary.name]))
+        done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay(stage, primary))
+        if done:
+            return primary_task.result()
+
+        hedge, _ = self._pick(remaining, estimated_tokens)
+        if hedge is None or not hedge.breaker.allow_request():
+            # nothing to hedge with right now, keep waiting for the primary
+            return await primary_task
+
+        remaining.remove(hedge.name)
+        hedge.requests.try_consume(1)
+        hedge.tokens.try_consume(estimated_tokens)
+        metrics.increment("llm_hedges", stage=stage, provider=hedge.name)
+        metrics.increment("llm_hedge_tokens", estimated_tokens, stage=stage, provider=hedge.name)
+        logger.info(f"{primary.name} is slow for {stage}, hedging with {hedge.name}")
+
+        hedge_task = asyncio.create_task(self._attempt(stage, hedge, calls[hedge.name]))
+        roles = {primary_task: primary, hedge_task: hedge}
+        pending = set(roles)
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        continue
+                    if not task.result():
+                        last_error = ContentProcessingError(
+                            f"{roles[task].name} returned an empty response for {stage}"
+                        )
+                        continue
+                    metrics.increment(
+                        "llm_hedge_wins",
+                        stage=stage,
+                        provider=roles[task].name,
+                        role="primary" if task is primary_task else "hedge",
+                    )
+                    return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+                # the loser has been billed for its prompt at least
+                metrics.increment(
+                    "llm_hedge_wasted_tokens",
+                    estimated_tokens,
+                    stage=stage,
+                    provider=roles[task].name,
+                )
+
+        assert last_error is not None
+        raise last_error
+
+
+llm_scheduler = ProviderScheduler.from_settings()
@@ -0,0 +1,153 @@
+import asyncio
+import re
+import time
+from enum import Enum
+from typing import Optional
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled at `rate` tokens per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    @classmethod
+    def per_minute(cls, amount: float) -> "TokenBucket":
+        return cls(capacity=amount, rate=amount / 60)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float = 1) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        # a request bigger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def try_consume(self, amount: float = 1) -> bool:
+        if self.wait_time(amount) > 0:
+            return False
+        self.tokens -= min(amount, self.capacity)
+        return True
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket so it only becomes usable again after `seconds`."""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+    async def acquire(self, amount: float = 1) -> None:
+        while not self.try_consume(amount):
+            await asyncio.sleep(self.wait_time(amount))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures (or immediately on a rate limit)
+    and stays open for `cooldown` seconds. Afterwards a single probe request is let through;
+    its success closes the circuit again, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.state = CircuitState.CLOSED
+        self.open_until = 0.0
+        self.probing = False
+
+    def available(self) -> bool:
+        """Whether a request would be let through, without claiming the probe slot."""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN and time.monotonic() < self.open_until:
+            return False
+        return not self.probing
+
+    def allow_request(self) -> bool:
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN and time.monotonic() >= self.open_until:
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.probing = False
+        self.state = CircuitState.CLOSED
+
+    def record_failure(self, retry_after: Optional[float] = None) -> None:
+        self.failures += 1
+        self.probing = False
+        if (
+            retry_after is not None
+            or self.state == CircuitState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self.open_until = time.monotonic() + max(retry_after or 0, self.cooldown)
+
+
+_RETRY_DELAY_PATTERN = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE)
+_RETRY_IN_PATTERN = re.compile(
+    r"(?:retry|try again) (?:after|in) (\d+(?:\.\d+)?)\s*s", re.IGNORECASE
+)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def parse_rate_limit(error: Exception, default_delay: float = 30.0) -> Optional[float]:
+    """
+    Inspect an exception raised by an LLM SDK call. Returns the number of seconds to back
+    off if it is a rate limit / quota error (429 or RESOURCE_EXHAUSTED), None otherwise.
+    Works for both the OpenAI SDK (retry-after headers) and google-generativeai (retry_delay
+    in the error details).
+    """
+    message = str(error)
+    is_rate_limit = _status_code(error) == 429 or any(
+        marker in message.lower()
+        for marker in ("429", "rate limit", "resource exhausted", "resource_exhausted", "quota")
+    )
+    if not is_rate_limit:
+        return None
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+
+    match = _RETRY_DELAY_PATTERN.search(message) or _RETRY_IN_PATTERN.search(message)
+    if match:
+        return float(match.group(1))
+    return default_delay
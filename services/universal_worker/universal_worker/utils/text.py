@@ -0,0 +1,31 @@
+"""
+CPU-bound text transforms, kept free of heavy imports so the offload pool processes
+(utils/offload.py) start quickly.
+"""
+
+import re
+from typing import Optional, Tuple
+
+
+def first_codeblock_span(text: str) -> Optional[Tuple[int, int]]:
+    """Start and end of the first code block, None if there is none."""
+    match = re.search(r"```.*?```", text, flags=re.DOTALL)
+    return match.span() if match else None
+
+
+def remove_span(text: str, span: Optional[Tuple[int, int]]) -> str:
+    if span is None:
+        return text
+    # Strip extra whitespace or newlines
+    return (text[: span[0]] + text[span[1] :]).strip()
+
+
+def unwrap_first_codeblock(response_text: str) -> str:
+    """
+    Cleans and unwraps the first code block by removing the first occurrence of code block delimiters.
+    For big texts, offload the search and slice on the loop, which only copies the text once:
+
+        span = await run_cpu(first_codeblock_span, text)
+        text = remove_span(text, span)
+    """
+    return remove_span(response_text, first_codeblock_span(response_text))
@@ -0,0 +1,203 @@
+"""
+Token budgets and accounting of the LLM and embedding calls.
+
+Inputs are counted with tiktoken before a call and trimmed (or chunked, for the cleaner)
+to the stage's budget in LLM_TOKEN_BUDGETS, so a 500k character page is not sent whole.
+The tokens actually spent, as reported by the provider, are recorded per stage into the
+content being processed (`Content.token_usage`, stored in its metadata) and into the
+`llm_tokens` metric, labeled by content type:
+
+    with track_tokens(content):
+        summary = await summarize_content(content)
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from universal_worker.config import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# gpt-4o-mini; gemini tokenizes differently, its counts are an approximation
+LLM_ENCODING = "o200k_base"
+EMBEDDING_ENCODING = "cl100k_base"  # text-embedding-3-*
+
+
+@lru_cache(maxsize=None)
+def _encoding(name: str) -> Optional[Any]:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # not installed, or the BPE ranks cannot be downloaded
+        logger.warning(f"tiktoken encoding {name} unavailable, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(text: Optional[str], encoding: str = LLM_ENCODING) -> int:
+    if not text:
+        return 0
+    tokenizer = _encoding(encoding)
+    if tokenizer is None:
+        # ~4 characters per token for english text
+        return len(text) // 4 + 1
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+def _head(text: str, max_tokens: int, encoding: str) -> str:
+    """The longest prefix of the text within max_tokens."""
+    tokenizer = _encoding(encoding)
+    if tokenizer is None:
+        return text[: max_tokens * 4]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    return tokenizer.decode(tokens[:max_tokens])
+
+
+def split_tokens(text: str, max_tokens: int, encoding: str = LLM_ENCODING) -> List[str]:
+    """The text cut every max_tokens tokens, for text without a break to cut it at."""
+    tokenizer = _encoding(encoding)
+    if tokenizer is None:
+        step = max(max_tokens - 1, 1) * 4
+        return [text[start : start + step] for start in range(0, len(text), step)]
+    tokens = tokenizer.encode(text, disallowed_special=())
+    return [
+        tokenizer.decode(tokens[start : start + max_tokens])
+        for start in range(0, len(tokens), max_tokens)
+    ]
+
+
+def stage_budget(stage: str) -> Optional[int]:
+    return settings.LLM_TOKEN_BUDGETS.get(stage)
+
+
+def fit_to_budget(text: str, stage: str, encoding: str = LLM_ENCODING) -> str:
+    """
+    The text trimmed to the stage's token budget, cut at a paragraph (or line) break when
+    one is close to the limit. Stages without a budget get the text unchanged.
+    """
+    budget = stage_budget(stage)
+    # a BPE token is at least one byte, short texts fit without tokenizing
+    if budget is None or len(text.encode()) <= budget:
+        return text
+
+    head = _head(text, budget, encoding)
+    if len(head) == len(text):
+        return text
+    for separator in ("\n\n", "\n"):
+        cut = head.rfind(separator)
+        if cut > len(head) * 0.9:
+            head = head[:cut]
+            break
+    logger.info(
+        f"Trimmed {stage} input from {len(text)} to {len(head)} characters "
+        f"({budget} token budget)"
+    )
+    metrics.increment("llm_input_trimmed", stage=stage)
+    return head
+
+
+def split_to_budget(text: str, max_tokens: int, encoding: str = LLM_ENCODING) -> List[str]:
+    """Split the text at paragraph breaks into pieces of at most max_tokens each."""
+    pieces: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for paragraph in text.split("\n\n"):
+        tokens = count_tokens(paragraph, encoding) + 1
+        while tokens > max_tokens:
+            # a paragraph over the limit on its own is cut where the tokens run out
+            head = _head(paragraph, max_tokens, encoding)
+            if current:
+                pieces.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            pieces.append(head)
+            paragraph = paragraph[len(head) :]
+            tokens = count_tokens(paragraph, encoding) + 1
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        if paragraph:
+            current.append(paragraph)
+            current_tokens += tokens
+    if current:
+        pieces.append("\n\n".join(current))
+    return pieces
+
+
+class TokenUsage:
+    """Tokens spent on one item, by stage: {"summarize": {"prompt": 1200, ...}}."""
+
+    def __init__(self, totals: Dict[str, Dict[str, int]], content_type: str):
+        self.totals = totals
+        self.content_type = content_type
+
+    def record(self, stage: str, provider: str, **tokens: Optional[int]) -> None:
+        """Add the tokens of one call, e.g. prompt=..., completion=... or embedding=..."""
+        stage_totals = self.totals.setdefault(stage, {})
+        for kind, amount in tokens.items():
+            if not amount:
+                continue
+            stage_totals[kind] = stage_totals.get(kind, 0) + amount
+            metrics.increment(
+                "llm_tokens",
+                amount,
+                stage=stage,
+                provider=provider,
+                kind=kind,
+                content_type=self.content_type,
+            )
+
+
+_current: contextvars.ContextVar[Optional[TokenUsage]] = contextvars.ContextVar(
+    "token_usage", default=None
+)
+
+
+@contextmanager
+def track_tokens(content: Optional[Any] = None) -> Iterator[TokenUsage]:
+    """
+    Record the tokens of the calls made within the block into `content.token_usage`, or
+    into the yielded TokenUsage's totals when there is no content yet.
+    """
+    if content is not None:
+        usage = TokenUsage(content.token_usage, content.content_type.value)
+    else:
+        usage = TokenUsage({}, "unknown")
+    token = _current.set(usage)
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+
+
+def record_usage(stage: str, provider: str, **tokens: Optional[int]) -> None:
+    """Record the tokens of a call into the tracked item, or only the metric if none."""
+    usage = _current.get()
+    if usage is None:
+        usage = TokenUsage({}, "untracked")
+    usage.record(stage, provider, **tokens)
+
+
+def record_openai_usage(stage: str, usage: Any) -> None:
+    if usage is not None:
+        record_usage(
+            stage,
+            "openai",
+            prompt=getattr(usage, "prompt_tokens", None),
+            completion=getattr(usage, "completion_tokens", None),
+        )
+
+
+def record_gemini_usage(stage: str, usage: Any) -> None:
+    if usage is not None:
+        record_usage(
+            stage,
+            "gemini",
+            prompt=getattr(usage, "prompt_token_count", None),
+            completion=getattr(usage, "candidates_token_count", None),
+        )
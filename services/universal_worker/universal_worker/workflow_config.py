@@ -1,19 +1,64 @@
+import importlib
 import logging
-from typing import Dict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Type
 
-from workflow_base import ProcessorConfig, WorkflowConfigBase
+from workflow_base import BaseProcessor, ProcessorConfig, WorkflowConfigBase
 
-from .processors import (
-    ClassifierProcessor,
-    CrawlerProcessor,
-    EmbeddingProcessor,
-    NotifierProcessor,
-    SummarizerProcessor,
-    TranscriberProcessor,
-)
+from .config import settings
+from .lanes import lane_queue
 
 logger = logging.getLogger(__name__)
 
+PROCESSORS = "universal_worker.processors"
+
+
+def import_class(path: str) -> Type[BaseProcessor]:
+    module_name, _, class_name = path.rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+@dataclass(frozen=True)
+class ProcessorSpec:
+    """A ProcessorConfig with the implementation as a dotted path, imported on use."""
+
+    name: str
+    input_queue: str
+    output_queues: List[str]
+    error_queue: str
+    implementation: str
+
+    def resolve(self) -> ProcessorConfig:
+        return ProcessorConfig(
+            name=self.name,
+            input_queue=self.input_queue,
+            output_queues=self.output_queues,
+            error_queue=self.error_queue,
+            implementation=import_class(self.implementation),
+        )
+
+
+class LazyProcessors(Mapping[str, ProcessorConfig]):
+    """
+    Processor configs by name, importing a processor (and its SDKs: langchain, google,
+    openai, ...) only when its config is looked up, so a worker loads just its own.
+    """
+
+    def __init__(self, specs: Dict[str, ProcessorSpec]):
+        self.specs = specs
+        self.resolved: Dict[str, ProcessorConfig] = {}
+
+    def __getitem__(self, name: str) -> ProcessorConfig:
+        if name not in self.resolved:
+            self.resolved[name] = self.specs[name].resolve()
+        return self.resolved[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        return len(self.specs)
+
 
 class WorkflowConfig(WorkflowConfigBase):
     CLASSIFY_QUEUE: str = "classify_queue"
@@ -23,50 +68,71 @@ class WorkflowConfig(WorkflowConfigBase):
     ERROR_QUEUE: str = "error_queue"
     EMBEDDING_QUEUE: str = "embedding_queue"
     NOTIFY_QUEUE: str = "notify_queue"
+    PARKED_QUEUE: str = settings.PARKED_QUEUE
+
+    # priority lanes (interactive vs. bulk) and the weights consumers drain them with
+    LANE_WEIGHTS: Dict[str, int] = settings.LANE_WEIGHTS
+
+    def lane_queues(self, queue: str) -> List[str]:
+        """All lane copies of a stage queue."""
+        return [lane_queue(queue, lane) for lane in self.LANE_WEIGHTS]
 
     @property
-    def processors(self) -> Dict[str, ProcessorConfig]:
+    def processor_specs(self) -> Dict[str, ProcessorSpec]:
         return {
-            "classifier": ProcessorConfig(
+            "classifier": ProcessorSpec(
                 name="classifier",
                 input_queue=self.CLASSIFY_QUEUE,
                 output_queues=[self.CRAWL_QUEUE, self.TRANSCRIBE_QUEUE],
                 error_queue=self.ERROR_QUEUE,
-                implementation=ClassifierProcessor,
+                implementation=f"{PROCESSORS}.classifier_processor.ClassifierProcessor",
             ),
-            "crawler": ProcessorConfig(
+            "crawler": ProcessorSpec(
                 name="crawler",
                 input_queue=self.CRAWL_QUEUE,
                 output_queues=[self.SUMMARY_QUEUE],
                 error_queue=self.ERROR_QUEUE,
-                implementation=CrawlerProcessor,
+                implementation=f"{PROCESSORS}.crawler_processor.CrawlerProcessor",
             ),
-            "transcriber": ProcessorConfig(
+            "transcriber": ProcessorSpec(
                 name="transcriber",
                 input_queue=self.TRANSCRIBE_QUEUE,
                 output_queues=[self.SUMMARY_QUEUE],
                 error_queue=self.ERROR_QUEUE,
-                implementation=TranscriberProcessor,
+                implementation=f"{PROCESSORS}.transcriber_processor.TranscriberProcessor",
             ),
-            "summarizer": ProcessorConfig(
+            "summarizer": ProcessorSpec(
                 name="summarizer",
                 input_queue=self.SUMMARY_QUEUE,
                 output_queues=[self.EMBEDDING_QUEUE],
                 error_queue=self.ERROR_QUEUE,
-                implementation=SummarizerProcessor,
+                implementation=f"{PROCESSORS}.summarizer_processor.SummarizerProcessor",
             ),
-            "embedding": ProcessorConfig(
+            "embedding": ProcessorSpec(
                 name="embedding",
                 input_queue=self.EMBEDDING_QUEUE,
                 output_queues=[],
                 error_queue=self.ERROR_QUEUE,
-                implementation=EmbeddingProcessor,
+                implementation=f"{PROCESSORS}.embedding_processor.EmbeddingProcessor",
             ),
-            "notifier": ProcessorConfig(
+            "notifier": ProcessorSpec(
                 name="notifier",
                 input_queue=self.NOTIFY_QUEUE,
                 output_queues=[],
                 error_queue=self.ERROR_QUEUE,
-                implementation=NotifierProcessor,
+                implementation=f"{PROCESSORS}.notifier_processor.NotifierProcessor",
+            ),
+            # retries transient failures of the stages above, outputs go to their delay
+            # queues (retry.retry_queue) or the parked queue
+            "error_handler": ProcessorSpec(
+                name="error_handler",
+                input_queue=self.ERROR_QUEUE,
+                output_queues=[self.PARKED_QUEUE],
+                error_queue=self.PARKED_QUEUE,
+                implementation=f"{PROCESSORS}.error_handler_processor.ErrorHandlerProcessor",
             ),
         }
+
+    @property
+    def processors(self) -> Mapping[str, ProcessorConfig]:  # type: ignore[override]
+        return LazyProcessors(self.processor_specs)